@@ -16,6 +16,17 @@ logging.getLogger("tifffile").setLevel(logging.ERROR)
 
 WORLDCLIM_INT16_NODATA_CUTOFF = -30000.0
 KNOWN_NODATA_SENTINELS = (-32768.0, -9999.0)
+RASTER_INTERPOLATION_MODES = ("nearest", "bilinear")
+EARTH_RADIUS_KM = 6371.0088
+RIVER_LINES_FILE = "ne_110m_rivers_lake_centerlines.json"
+EARTH_DATASET_FILES = (
+    "ne_110m_land.json",
+    "ne_110m_lakes.json",
+    RIVER_LINES_FILE,
+    "wc2.1_10m_elev.zip",
+    "wc2.1_10m_tavg.zip",
+    "wc2.1_10m_prec.zip",
+)
 
 
 def wrap_longitude(lon: float) -> float:
@@ -26,6 +37,18 @@ def wrap_longitude(lon: float) -> float:
     return lon
 
 
+def _wrap_longitudes(lons: np.ndarray) -> np.ndarray:
+    # Same stepwise wrapping as wrap_longitude so batched lookups hit identical pixels.
+    wrapped = np.asarray(lons, dtype=np.float64).copy()
+    while True:
+        low = wrapped < -180.0
+        high = wrapped >= 180.0
+        if not (low.any() or high.any()):
+            return wrapped
+        wrapped[low] += 360.0
+        wrapped[high] -= 360.0
+
+
 @dataclass(frozen=True)
 class PolygonShape:
     rings: Tuple[Tuple[Tuple[float, float], ...], ...]
@@ -111,7 +134,11 @@ class GeoRaster:
                 pixel_lat=pixel_lat,
             )
 
-    def sample(self, lon: float, lat: float) -> float | None:
+    def sample(self, lon: float, lat: float, interpolation: str = "nearest") -> float | None:
+        if interpolation != "nearest":
+            value = float(self.sample_batch(np.array([lon]), np.array([lat]), interpolation=interpolation)[0])
+            return None if math.isnan(value) else value
+
         lon = wrap_longitude(lon)
         col = int(math.floor((lon - self.origin_lon) / self.pixel_lon))
         row = int(math.floor((self.origin_lat - lat) / self.pixel_lat))
@@ -127,19 +154,87 @@ class GeoRaster:
             row = self.height - 1
 
         value = float(self.data[row, col])
+        return value if self._is_valid_value(value) else None
+
+    def sample_batch(self, lons: np.ndarray, lats: np.ndarray, interpolation: str = "nearest") -> np.ndarray:
+        """Sample many points at once; nodata results are NaN."""
+        if interpolation not in RASTER_INTERPOLATION_MODES:
+            raise ValueError(f"Unsupported raster interpolation: {interpolation}")
+        lons = _wrap_longitudes(lons)
+        lats = np.asarray(lats, dtype=np.float64)
+        if interpolation == "nearest":
+            cols = np.clip(np.floor((lons - self.origin_lon) / self.pixel_lon), 0, self.width - 1).astype(np.int64)
+            rows = np.clip(np.floor((self.origin_lat - lats) / self.pixel_lat), 0, self.height - 1).astype(np.int64)
+            values = self.data[rows, cols].astype(np.float64)
+            return np.where(self._valid_mask(values), values, np.nan)
+        return self._sample_bilinear(lons, lats)
+
+    def _sample_bilinear(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        # Pixel centers sit half a pixel inside the tie point.
+        fx = (lons - self.origin_lon) / self.pixel_lon - 0.5
+        fy = (self.origin_lat - lats) / self.pixel_lat - 0.5
+        col0 = np.floor(fx)
+        row0 = np.floor(fy)
+        wx = fx - col0
+        wy = fy - row0
+        col0 = col0.astype(np.int64)
+        row0 = row0.astype(np.int64)
+
+        if self.wraps_longitude:
+            cols = np.stack((col0 % self.width, (col0 + 1) % self.width), axis=1)
+        else:
+            cols = np.clip(np.stack((col0, col0 + 1), axis=1), 0, self.width - 1)
+        rows = np.clip(np.stack((row0, row0 + 1), axis=1), 0, self.height - 1)
+
+        values = np.stack(
+            (
+                self.data[rows[:, 0], cols[:, 0]],
+                self.data[rows[:, 0], cols[:, 1]],
+                self.data[rows[:, 1], cols[:, 0]],
+                self.data[rows[:, 1], cols[:, 1]],
+            ),
+            axis=1,
+        ).astype(np.float64)
+        weights = np.stack(
+            ((1.0 - wx) * (1.0 - wy), wx * (1.0 - wy), (1.0 - wx) * wy, wx * wy),
+            axis=1,
+        )
+
+        # Drop nodata neighbors and renormalize the remaining weights.
+        valid = self._valid_mask(values)
+        weights = np.where(valid, weights, 0.0)
+        total = weights.sum(axis=1)
+        weighted = (weights * np.where(valid, values, 0.0)).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(total > 1e-12, weighted / total, np.nan)
+
+    @property
+    def wraps_longitude(self) -> bool:
+        return abs(self.width * self.pixel_lon - 360.0) < 1e-6 * 360.0
+
+    def _is_valid_value(self, value: float) -> bool:
         if not math.isfinite(value):
-            return None
+            return False
         # WorldClim rasters often use extreme sentinels (~-3.4e38) for nodata.
         if abs(value) > 1e20:
-            return None
+            return False
         # Some rasters are stored as int16 with nodata=-32768 (or similar negative sentinels).
         if value <= WORLDCLIM_INT16_NODATA_CUTOFF:
-            return None
+            return False
         if any(math.isclose(value, nodata, rel_tol=0.0, abs_tol=1e-6) for nodata in KNOWN_NODATA_SENTINELS):
-            return None
+            return False
         if self.nodata is not None and math.isclose(value, self.nodata, rel_tol=0.0, abs_tol=1e-6):
-            return None
-        return value
+            return False
+        return True
+
+    def _valid_mask(self, values: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            valid = np.isfinite(values) & (np.abs(values) <= 1e20) & (values > WORLDCLIM_INT16_NODATA_CUTOFF)
+            for nodata in KNOWN_NODATA_SENTINELS:
+                valid &= np.abs(values - nodata) > 1e-6
+            if self.nodata is not None:
+                valid &= np.abs(values - self.nodata) > 1e-6
+        return valid
 
 
 @dataclass
@@ -150,6 +245,8 @@ class EarthDatasets:
     elevation: GeoRaster
     monthly_temperature: List[GeoRaster]
     monthly_precipitation: List[GeoRaster]
+    raster_interpolation: str = "nearest"
+    river_line_lengths_km: np.ndarray | None = None
 
     def point_on_land(self, lon: float, lat: float) -> bool:
         lon = wrap_longitude(lon)
@@ -160,27 +257,57 @@ class EarthDatasets:
         return any(shape.contains(lon, lat) for shape in self.lake_polygons)
 
     def sample_elevation(self, lon: float, lat: float) -> float | None:
-        return self.elevation.sample(lon, lat)
+        return self.elevation.sample(lon, lat, self.raster_interpolation)
 
     def sample_temperature(self, lon: float, lat: float) -> float | None:
-        values = [r.sample(lon, lat) for r in self.monthly_temperature]
+        values = [r.sample(lon, lat, self.raster_interpolation) for r in self.monthly_temperature]
         valid = [v for v in values if v is not None]
         if not valid:
             return None
         return float(sum(valid) / len(valid))
 
     def sample_precipitation(self, lon: float, lat: float) -> float | None:
-        values = [r.sample(lon, lat) for r in self.monthly_precipitation]
+        values = [r.sample(lon, lat, self.raster_interpolation) for r in self.monthly_precipitation]
         valid = [v for v in values if v is not None]
         if not valid:
             return None
         return float(sum(valid))
 
-
-def load_earth_datasets(cache_dir: Path) -> EarthDatasets:
+    def sample_elevation_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        return self.elevation.sample_batch(lons, lats, self.raster_interpolation)
+
+    def sample_temperature_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        total, count = self._monthly_batch(self.monthly_temperature, lons, lats)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def sample_precipitation_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        total, count = self._monthly_batch(self.monthly_precipitation, lons, lats)
+        return np.where(count > 0, total, np.nan)
+
+    def _monthly_batch(
+        self,
+        rasters: Sequence[GeoRaster],
+        lons: np.ndarray,
+        lats: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        total = np.zeros(len(lons), dtype=np.float64)
+        count = np.zeros(len(lons), dtype=np.int64)
+        # Accumulate month by month to match the scalar summation order.
+        for raster in rasters:
+            values = raster.sample_batch(lons, lats, self.raster_interpolation)
+            valid = ~np.isnan(values)
+            total = np.where(valid, total + values, total)
+            count += valid
+        return total, count
+
+
+def load_earth_datasets(cache_dir: Path, raster_interpolation: str = "nearest") -> EarthDatasets:
+    if raster_interpolation not in RASTER_INTERPOLATION_MODES:
+        raise ValueError(f"Unsupported raster interpolation: {raster_interpolation}")
     land = _load_polygons(cache_dir / "ne_110m_land.json")
     lakes = _load_polygons(cache_dir / "ne_110m_lakes.json")
-    rivers = _load_river_lines(cache_dir / "ne_110m_rivers_lake_centerlines.json")
+    rivers = load_river_lines(cache_dir)
 
     elev = _load_single_raster_from_zip(cache_dir / "wc2.1_10m_elev.zip", suffix=".tif")
     tavg = _load_rasters_from_zip(cache_dir / "wc2.1_10m_tavg.zip", prefix="wc2.1_10m_tavg_", suffix=".tif")
@@ -193,9 +320,28 @@ def load_earth_datasets(cache_dir: Path) -> EarthDatasets:
         elevation=elev,
         monthly_temperature=tavg,
         monthly_precipitation=prec,
+        raster_interpolation=raster_interpolation,
+        river_line_lengths_km=polyline_lengths_km(rivers),
     )
 
 
+def load_river_lines(cache_dir: Path) -> List[List[Tuple[float, float]]]:
+    return _load_river_lines(cache_dir / RIVER_LINES_FILE)
+
+
+def dataset_signature(cache_dir: Path) -> str:
+    """Name, size and mtime of every cached dataset file; changes whenever a dataset is refetched."""
+    parts = []
+    for name in EARTH_DATASET_FILES:
+        path = cache_dir / name
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+        else:
+            parts.append(f"{name}:missing")
+    return "|".join(parts)
+
+
 def geodesic_polyline_length_km(points: Sequence[Tuple[float, float]]) -> float:
     if len(points) < 2:
         return 0.0
@@ -205,8 +351,38 @@ def geodesic_polyline_length_km(points: Sequence[Tuple[float, float]]) -> float:
     return total
 
 
+def polyline_lengths_km(lines: Sequence[Sequence[Tuple[float, float]]]) -> np.ndarray:
+    """Geodesic length of every line, from one haversine pass over the flattened coordinates."""
+    sizes = np.array([len(line) for line in lines], dtype=np.int64)
+    lengths = np.zeros(len(sizes), dtype=np.float64)
+    if sizes.sum() == 0:
+        return lengths
+    coords = np.array([pt for line in lines for pt in line], dtype=np.float64).reshape(-1, 2)
+    segment_km = haversine_km_batch(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+
+    # Segment i joins points i and i+1; zero the ones that straddle two lines.
+    offsets = np.cumsum(sizes) - sizes
+    line_starts = offsets[sizes > 0]
+    segment_km[line_starts[1:] - 1] = 0.0
+    multi = sizes > 1
+    if multi.any():
+        lengths[multi] = np.add.reduceat(segment_km, offsets[multi])
+    return lengths
+
+
+def haversine_km_batch(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    p1 = np.radians(lat1)
+    p2 = np.radians(lat2)
+    dl = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    dp = np.radians(np.asarray(lat2) - np.asarray(lat1))
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    r = 6371.0088
+    r = EARTH_RADIUS_KM
     p1 = math.radians(lat1)
     p2 = math.radians(lat2)
     dl = math.radians(lon2 - lon1)
@@ -215,6 +391,23 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return 2 * r * math.asin(min(1.0, math.sqrt(a)))
 
 
+def lonlat_to_unit_vectors(lons: Sequence[float] | np.ndarray, lats: Sequence[float] | np.ndarray) -> np.ndarray:
+    lon_r = np.radians(np.asarray(lons, dtype=np.float64))
+    lat_r = np.radians(np.asarray(lats, dtype=np.float64))
+    return np.stack(
+        (np.cos(lat_r) * np.cos(lon_r), np.cos(lat_r) * np.sin(lon_r), np.sin(lat_r)),
+        axis=-1,
+    )
+
+
+def unit_vectors_to_lonlat(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lons = np.degrees(np.arctan2(vectors[..., 1], vectors[..., 0]))
+    lats = np.degrees(np.arcsin(np.clip(vectors[..., 2], -1.0, 1.0)))
+    # Keep the [-180, 180) convention used by wrap_longitude.
+    lons = np.where(lons >= 180.0, lons - 360.0, lons)
+    return lons, lats
+
+
 def _load_single_raster_from_zip(zip_path: Path, suffix: str) -> GeoRaster:
     rasters = _load_rasters_from_zip(zip_path, prefix="", suffix=suffix)
     if len(rasters) != 1:
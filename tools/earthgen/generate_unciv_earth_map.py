@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import math
+import multiprocessing
 import os
 import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
@@ -16,31 +21,63 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if __package__ in (None, ""):
     sys.path.insert(0, str(REPO_ROOT))
 
-from tools.earthgen.dataset_sampling import EarthDatasets, load_earth_datasets
-from tools.earthgen.river_projection import CanonicalEdge, project_river_lines_to_edges
+from tools.earthgen.dataset_sampling import (
+    RASTER_INTERPOLATION_MODES,
+    EarthDatasets,
+    dataset_signature,
+    load_earth_datasets,
+    load_river_lines,
+    polyline_lengths_km,
+)
+from tools.earthgen.river_flow import DEFAULT_FLOW_THRESHOLD, synthesize_flow_rivers
+from tools.earthgen.river_projection import (
+    RIVER_LOCATORS,
+    CanonicalEdge,
+    RiverChainCache,
+    RiverPathCache,
+    _TileLocator,
+    project_river_lines_to_edges,
+)
 from tools.earthgen.resource_dataset_sampling import build_resource_dataset_layers
-from tools.earthgen.resource_placement import ResourcePlacementResult, place_resources
+from tools.earthgen.resource_placement import (
+    PLACEMENT_ENGINES,
+    ResourcePlacementResult,
+    compare_placement_engines,
+)
 from tools.earthgen.resource_rules_gnk import (
     DEFAULT_RESOURCE_PROFILE_PATH,
     RULESET_TILE_RESOURCES_PATH,
+    ResourceProfile,
+    RulesetResourceDefinition,
     load_resource_profiles,
     load_ruleset_resource_definitions,
 )
-from tools.earthgen.resource_scoring import rank_candidates_by_resource
+from tools.earthgen.resource_scoring import RankedCandidates, rank_candidates_by_resource
 from tools.earthgen.terrain_rules_gnk import (
+    BASE_TERRAIN_CODES,
+    FEATURE_BITS,
     ClimateSample,
     LAND_BASE_TERRAINS,
     WATER_BASE_TERRAINS,
     classify_base_terrain,
     classify_features,
 )
+from tools.earthgen.terrain_lut import (
+    DEFAULT_TERRAIN_RULES_PATH,
+    TerrainLookupTable,
+    compile_terrain_lut,
+    load_terrain_rules,
+)
 from tools.earthgen.topology_io import (
     TopologyDump,
     build_edge_writer_index_from_dump,
     load_topology_dump,
+    neighbor_matrix,
+    topology_fingerprint,
 )
+from tools.earthgen.topology_rings import KRingTable, load_or_build_k_ring_table
 from tools.earthgen.unciv_map_io import write_map_file
-from tools.earthgen.dataset_sampling import wrap_longitude
+from tools.earthgen.dataset_sampling import lonlat_to_unit_vectors, unit_vectors_to_lonlat, wrap_longitude
 
 import numpy as np
 
@@ -53,26 +90,22 @@ PREDEFINED_SIZE_TO_FREQUENCY = {
     "Huge": 22,
 }
 
-VALID_BASE_TERRAINS = {
-    "Ocean",
-    "Coast",
-    "Lakes",
-    "Grassland",
-    "Plains",
-    "Desert",
-    "Tundra",
-    "Snow",
-    "Mountain",
-}
+VALID_BASE_TERRAINS = set(BASE_TERRAIN_CODES)
 
-VALID_FEATURES = {
-    "Hill",
-    "Forest",
-    "Jungle",
-    "Marsh",
-    "Ice",
-}
+VALID_FEATURES = set(FEATURE_BITS)
+# Bump when classification logic changes so stale --classification-cache files are ignored.
+CLASSIFICATION_CACHE_VERSION = 1
 RESOURCE_DENSITY_MODES = ("sparse", "default", "abundant")
+# Natural Earth projection options (flag, args attribute, default) that --river-source flow does not use.
+NATURAL_EARTH_RIVER_OPTIONS = (
+    ("--river-count", "river_count", 20),
+    ("--river-locator", "river_locator", "index"),
+    ("--river-max-path-hops", "river_max_path_hops", 0),
+    ("--river-path-cache", "river_path_cache", None),
+    ("--river-chain-cache", "river_chain_cache", None),
+    ("--river-workers", "river_workers", 1),
+)
+GOLDEN_ANGLE_RAD = math.pi * (3.0 - math.sqrt(5.0))
 
 
 @dataclass
@@ -236,14 +269,140 @@ def load_generation_topology(topology_path: Path, expected_frequency: int | None
     return topology
 
 
+def _coastline_tile_indices(neighbors: np.ndarray, on_land: np.ndarray) -> np.ndarray:
+    valid = neighbors >= 0
+    neighbor_land = on_land[np.where(valid, neighbors, 0)]
+    differs = valid & (neighbor_land != on_land[:, None])
+    return np.flatnonzero(differs.any(axis=1))
+
+
+def _footprint_sample_vectors(
+    centers: np.ndarray,
+    neighbor_vectors: np.ndarray,
+    neighbor_valid: np.ndarray,
+    samples: int,
+) -> np.ndarray:
+    # Hex inradius is roughly half the center-to-neighbor spacing.
+    spacing = np.linalg.norm(neighbor_vectors - centers[:, None, :], axis=2)
+    counts = np.maximum(neighbor_valid.sum(axis=1), 1)
+    radius = 0.5 * np.where(neighbor_valid, spacing, 0.0).sum(axis=1) / counts
+
+    east = np.cross(np.array([0.0, 0.0, 1.0]), centers)
+    polar = np.linalg.norm(east, axis=1) < 1e-8
+    if polar.any():
+        east[polar] = np.cross(np.array([0.0, 1.0, 0.0]), centers[polar])
+    east /= np.linalg.norm(east, axis=1)[:, None]
+    north = np.cross(centers, east)
+
+    # Sunflower layout spreads the sub-points evenly over the disc.
+    steps = np.arange(samples, dtype=np.float64)
+    rho = np.sqrt((steps + 0.5) / samples)
+    theta = steps * GOLDEN_ANGLE_RAD
+    offsets = (
+        (rho * np.cos(theta))[None, :, None] * east[:, None, :]
+        + (rho * np.sin(theta))[None, :, None] * north[:, None, :]
+    )
+    points = centers[:, None, :] + radius[:, None, None] * offsets
+    return points / np.linalg.norm(points, axis=2)[:, :, None]
+
+
+def refine_coastline_land_mask(
+    topology: TopologyDump,
+    datasets: EarthDatasets,
+    coordinates: Sequence[Tuple[float, float]],
+    on_land: np.ndarray,
+    samples: int,
+    land_threshold: float = 0.5,
+) -> np.ndarray:
+    """Resample land/water on tiles whose center sample disagrees with a neighbor.
+
+    Each coastline tile is re-decided from its center plus `samples` sub-points spread
+    across its footprint; the tile is land when the land fraction reaches `land_threshold`.
+    """
+    refined = np.asarray(on_land, dtype=bool).copy()
+    if samples <= 0 or topology.tile_count == 0:
+        return refined
+    neighbors = neighbor_matrix(topology)
+    if neighbors.shape[1] == 0:
+        return refined
+    coastline = _coastline_tile_indices(neighbors, refined)
+    if coastline.size == 0:
+        return refined
+
+    vectors = lonlat_to_unit_vectors([c[0] for c in coordinates], [c[1] for c in coordinates])
+    coast_neighbors = neighbors[coastline]
+    neighbor_valid = coast_neighbors >= 0
+    sub_vectors = _footprint_sample_vectors(
+        vectors[coastline],
+        vectors[np.where(neighbor_valid, coast_neighbors, coastline[:, None])],
+        neighbor_valid,
+        samples,
+    )
+    sub_lons, sub_lats = unit_vectors_to_lonlat(sub_vectors)
+
+    for row, tile_index in enumerate(coastline):
+        land_hits = int(on_land[tile_index])
+        for lon, lat in zip(sub_lons[row], sub_lats[row]):
+            if datasets.point_on_land(float(lon), float(lat)):
+                land_hits += 1
+        refined[tile_index] = land_hits / (samples + 1) >= land_threshold
+    return refined
+
+
+def _optional_value(value: float) -> float | None:
+    return None if math.isnan(value) else float(value)
+
+
+def _sample_climate(
+    datasets: EarthDatasets,
+    coordinates: Sequence[Tuple[float, float]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (temperature, precipitation, elevation) arrays with NaN where data is missing.
+
+    Datasets that offer `sample_*_batch` methods are sampled in one call per layer.
+    """
+    if all(
+        hasattr(datasets, name)
+        for name in ("sample_temperature_batch", "sample_precipitation_batch", "sample_elevation_batch")
+    ):
+        lons = np.array([coord[0] for coord in coordinates], dtype=np.float64)
+        lats = np.array([coord[1] for coord in coordinates], dtype=np.float64)
+        return (
+            datasets.sample_temperature_batch(lons, lats),
+            datasets.sample_precipitation_batch(lons, lats),
+            datasets.sample_elevation_batch(lons, lats),
+        )
+
+    def as_array(values: Iterable[float | None]) -> np.ndarray:
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+    return (
+        as_array(datasets.sample_temperature(lon, lat) for lon, lat in coordinates),
+        as_array(datasets.sample_precipitation(lon, lat) for lon, lat in coordinates),
+        as_array(datasets.sample_elevation(lon, lat) for lon, lat in coordinates),
+    )
+
+
 def classify_tiles(
     topology: TopologyDump,
     cache_dir: Path,
     alignment: EarthAlignment,
     datasets: EarthDatasets | None = None,
     sampling_coordinates: Sequence[Tuple[float, float]] | None = None,
+    coast_supersample: int = 0,
+    coast_land_threshold: float = 0.5,
+    terrain_lut: TerrainLookupTable | None = None,
+    inherited: Mapping[int, TileClassification] | None = None,
 ) -> List[TileClassification]:
+    """Classify every topology tile from the Earth datasets.
+
+    Tiles listed in `inherited` skip dataset sampling and copy terrain and climate from the
+    given (coarser) classification; see classify_tiles_hierarchical. An inherited tile that the
+    coast supersampling flips between land and water is sampled like any other tile, since
+    the stored climate values cannot tell real zeros from missing data.
+    """
     datasets = datasets or load_earth_datasets(cache_dir)
+    inherited = inherited or {}
     classified: List[TileClassification] = []
     coordinates = (
         list(sampling_coordinates)
@@ -251,26 +410,81 @@ def classify_tiles(
         else [alignment.transform(tile.longitude, tile.latitude) for tile in topology.tiles]
     )
 
-    for tile in topology.tiles:
-        sample_lon, sample_lat = coordinates[tile.index]
-        on_land = datasets.point_on_land(sample_lon, sample_lat)
-        in_lake = datasets.point_in_lake(sample_lon, sample_lat)
-
-        temperature = datasets.sample_temperature(sample_lon, sample_lat)
-        precipitation = datasets.sample_precipitation(sample_lon, sample_lat)
-        elevation = datasets.sample_elevation(sample_lon, sample_lat)
-
-        climate = ClimateSample(
-            is_land=on_land,
-            is_lake=in_lake,
-            latitude=sample_lat,
-            temperature_c=temperature,
-            annual_precip_mm=precipitation,
-            elevation_m=elevation,
+    sampled = np.array([index not in inherited for index in range(topology.tile_count)], dtype=bool)
+    sampled_indices = np.flatnonzero(sampled)
+    sampled_coordinates = [coordinates[i] for i in sampled_indices]
+
+    land_mask = np.zeros(topology.tile_count, dtype=bool)
+    lake_mask = np.zeros(topology.tile_count, dtype=bool)
+    temperatures = np.full(topology.tile_count, np.nan, dtype=np.float64)
+    precipitations = np.full(topology.tile_count, np.nan, dtype=np.float64)
+    elevations = np.full(topology.tile_count, np.nan, dtype=np.float64)
+    for index, source in inherited.items():
+        land_mask[index] = source.base_terrain in LAND_BASE_TERRAINS
+        lake_mask[index] = source.base_terrain == "Lakes"
+        temperatures[index] = source.temperature_c
+        precipitations[index] = source.annual_precip_mm
+        elevations[index] = source.elevation_m
+    inherited_land = land_mask.copy()
+
+    land_mask[sampled_indices] = [datasets.point_on_land(lon, lat) for lon, lat in sampled_coordinates]
+    if coast_supersample > 0:
+        land_mask = refine_coastline_land_mask(
+            topology,
+            datasets,
+            coordinates,
+            land_mask,
+            samples=coast_supersample,
+            land_threshold=coast_land_threshold,
         )
+        sampled |= land_mask != inherited_land
+        sampled_indices = np.flatnonzero(sampled)
+        sampled_coordinates = [coordinates[i] for i in sampled_indices]
 
-        base = classify_base_terrain(climate)
-        features = classify_features(climate, base)
+    if sampled_indices.size:
+        (
+            temperatures[sampled_indices],
+            precipitations[sampled_indices],
+            elevations[sampled_indices],
+        ) = _sample_climate(datasets, sampled_coordinates)
+        lake_mask[sampled_indices] = [datasets.point_in_lake(lon, lat) for lon, lat in sampled_coordinates]
+
+    outcome_ids = None
+    if terrain_lut is not None:
+        outcome_ids = terrain_lut.classify(
+            is_land=land_mask,
+            is_lake=lake_mask,
+            latitude=np.array([coord[1] for coord in coordinates], dtype=np.float64),
+            temperature_c=temperatures,
+            annual_precip_mm=precipitations,
+            elevation_m=elevations,
+        )
+
+    for tile in topology.tiles:
+        sample_lon, sample_lat = coordinates[tile.index]
+        temperature = _optional_value(temperatures[tile.index])
+        precipitation = _optional_value(precipitations[tile.index])
+        elevation = _optional_value(elevations[tile.index])
+
+        source = None if sampled[tile.index] else inherited.get(tile.index)
+        if source is not None:
+            # Coast is re-derived by the post pass on this topology.
+            base = "Ocean" if source.base_terrain == "Coast" else source.base_terrain
+            features = list(source.features)
+        elif outcome_ids is not None:
+            base, lut_features = terrain_lut.outcomes[int(outcome_ids[tile.index])]
+            features = list(lut_features)
+        else:
+            climate = ClimateSample(
+                is_land=bool(land_mask[tile.index]),
+                is_lake=bool(lake_mask[tile.index]),
+                latitude=sample_lat,
+                temperature_c=temperature,
+                annual_precip_mm=precipitation,
+                elevation_m=elevation,
+            )
+            base = classify_base_terrain(climate)
+            features = classify_features(climate, base)
 
         classified.append(
             TileClassification(
@@ -289,27 +503,219 @@ def classify_tiles(
         )
 
     # Post pass: convert ocean tiles adjacent to land into coast.
-    land_like = {tile.index for tile in classified if tile.base_terrain in LAND_BASE_TERRAINS}
-    for tile in classified:
-        if tile.base_terrain != "Ocean":
-            continue
-        if any(neighbor in land_like for neighbor in tile.neighbors):
-            tile.base_terrain = "Coast"
-
+    apply_coast_pass(topology, classified)
     return classified
 
 
+def _base_terrain_codes(tiles: Sequence[TileClassification]) -> np.ndarray:
+    return np.array([BASE_TERRAIN_CODES.get(tile.base_terrain, -1) for tile in tiles], dtype=np.int64)
+
+
+def apply_coast_pass(topology: TopologyDump, tiles: Sequence[TileClassification]) -> None:
+    if not tiles:
+        return
+    codes = _base_terrain_codes(tiles)
+    tile_indices = np.array([tile.index for tile in tiles], dtype=np.int64)
+    land_codes = [BASE_TERRAIN_CODES[name] for name in LAND_BASE_TERRAINS]
+    # Trailing False absorbs the -1 padding of the neighbor matrix.
+    land = np.zeros(topology.tile_count + 1, dtype=bool)
+    land[tile_indices] = np.isin(codes, land_codes)
+    neighbors = neighbor_matrix(topology)[tile_indices]
+    coastal = (codes == BASE_TERRAIN_CODES["Ocean"]) & land[neighbors].any(axis=1)
+    for row in np.flatnonzero(coastal):
+        tiles[row].base_terrain = "Coast"
+
+
+def find_classification_errors(tiles: Sequence[TileClassification]) -> Dict[str, np.ndarray]:
+    """Return offending tile indices for every invalid terrain combination, keyed by problem."""
+    tile_indices = np.array([tile.index for tile in tiles], dtype=np.int64)
+    codes = _base_terrain_codes(tiles)
+    feature_bits = np.zeros(len(tiles), dtype=np.int64)
+    feature_counts = np.zeros(len(tiles), dtype=np.int64)
+    unknown_features = np.zeros(len(tiles), dtype=bool)
+    for row, tile in enumerate(tiles):
+        if not tile.features:
+            continue
+        feature_counts[row] = len(tile.features)
+        for feature in tile.features:
+            bit = FEATURE_BITS.get(feature)
+            if bit is None:
+                unknown_features[row] = True
+            else:
+                feature_bits[row] |= bit
+
+    water_codes = [BASE_TERRAIN_CODES[name] for name in WATER_BASE_TERRAINS]
+    checks = {
+        "Unknown base terrain": codes < 0,
+        "Unknown terrain feature": unknown_features,
+        "Invalid water+hill combination": np.isin(codes, water_codes) & ((feature_bits & FEATURE_BITS["Hill"]) != 0),
+        "Mountain tile should not have extra features in v1": (codes == BASE_TERRAIN_CODES["Mountain"])
+        & (feature_counts > 0),
+    }
+    return {problem: tile_indices[mask] for problem, mask in checks.items() if mask.any()}
+
+
 def validate_classification(tiles: Sequence[TileClassification]) -> None:
+    errors = find_classification_errors(tiles)
+    if not errors:
+        return
+    parts = []
+    for problem, indices in errors.items():
+        shown = ", ".join(str(int(i)) for i in indices[:20])
+        more = f", ... (+{len(indices) - 20} more)" if len(indices) > 20 else ""
+        parts.append(f"{problem} on {len(indices)} tile(s): [{shown}{more}]")
+    raise ValueError("Invalid terrain classification: " + "; ".join(parts))
+
+
+def classification_cache_key(
+    topology: TopologyDump,
+    sampling_coordinates: Sequence[Tuple[float, float]],
+    cache_dir: Path,
+    options: Mapping[str, object],
+    coarse_topology: TopologyDump | None = None,
+) -> str:
+    digest = hashlib.sha256(f"v{CLASSIFICATION_CACHE_VERSION}:{topology_fingerprint(topology)}".encode("utf-8"))
+    if coarse_topology is not None:
+        digest.update(f"|coarse:{topology_fingerprint(coarse_topology)}".encode("utf-8"))
+    digest.update(np.asarray(sampling_coordinates, dtype="<f8").tobytes())
+    digest.update(dataset_signature(cache_dir).encode("utf-8"))
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_cached_classification(path: Path, key: str, topology: TopologyDump) -> List[TileClassification] | None:
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if data.get("key") != key or len(data.get("tiles", [])) != topology.tile_count:
+        return None
+    return [
+        TileClassification(
+            index=tile.index,
+            x=tile.x,
+            y=tile.y,
+            latitude=float(lat),
+            longitude=float(lon),
+            neighbors=tile.neighbors,
+            base_terrain=str(base),
+            features=list(features),
+            temperature_c=float(temperature),
+            annual_precip_mm=float(precipitation),
+            elevation_m=float(elevation),
+        )
+        for tile, (lat, lon, base, features, temperature, precipitation, elevation) in zip(
+            sorted(topology.tiles, key=lambda t: t.index), data["tiles"]
+        )
+    ]
+
+
+def save_cached_classification(path: Path, key: str, tiles: Sequence[TileClassification]) -> None:
+    rows = [
+        [t.latitude, t.longitude, t.base_terrain, list(t.features), t.temperature_c, t.annual_precip_mm, t.elevation_m]
+        for t in sorted(tiles, key=lambda t: t.index)
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"key": key, "tiles": rows}, separators=(",", ":")), encoding="utf-8")
+
+
+def _heterogeneous_tiles(topology: TopologyDump, tiles: Sequence[TileClassification]) -> np.ndarray:
+    """Mask of tiles whose terrain (base + features) differs from at least one neighbor."""
+    keys: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+    codes = np.zeros(topology.tile_count + 1, dtype=np.int64)
     for tile in tiles:
-        if tile.base_terrain not in VALID_BASE_TERRAINS:
-            raise ValueError(f"Unknown base terrain on tile {tile.index}: {tile.base_terrain}")
-        for feature in tile.features:
-            if feature not in VALID_FEATURES:
-                raise ValueError(f"Unknown terrain feature on tile {tile.index}: {feature}")
-        if tile.base_terrain in WATER_BASE_TERRAINS and "Hill" in tile.features:
-            raise ValueError(f"Invalid water+hill combination on tile {tile.index}")
-        if tile.base_terrain == "Mountain" and tile.features:
-            raise ValueError(f"Mountain tile should not have extra features in v1: tile={tile.index}")
+        codes[tile.index] = keys.setdefault((tile.base_terrain, tuple(tile.features)), len(keys))
+    codes[-1] = -1
+    neighbors = neighbor_matrix(topology)
+    differs = (neighbors >= 0) & (codes[neighbors] != codes[: topology.tile_count, None])
+    return differs.any(axis=1)
+
+
+def hierarchical_refine_mask(
+    topology: TopologyDump,
+    sampling_coordinates: Sequence[Tuple[float, float]],
+    coarse_topology: TopologyDump,
+    coarse_tiles: Sequence[TileClassification],
+    coarse_sampling_coordinates: Sequence[Tuple[float, float]],
+    refine_margin: int = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (parent coarse tile per tile, mask of tiles that need full dataset sampling)."""
+    locator = _TileLocator(coarse_topology, tile_coordinates=coarse_sampling_coordinates)
+    parents = np.array(locator.nearest_indices(sampling_coordinates), dtype=np.int64)
+    refine = _heterogeneous_tiles(coarse_topology, coarse_tiles)[parents]
+
+    neighbors = neighbor_matrix(topology)
+    for _ in range(max(0, refine_margin)):
+        padded = np.append(refine, False)
+        refine = refine | padded[neighbors].any(axis=1)
+    return parents, refine
+
+
+def classify_tiles_hierarchical(
+    topology: TopologyDump,
+    coarse_topology: TopologyDump,
+    cache_dir: Path,
+    alignment: EarthAlignment,
+    datasets: EarthDatasets | None = None,
+    sampling_coordinates: Sequence[Tuple[float, float]] | None = None,
+    coarse_sampling_coordinates: Sequence[Tuple[float, float]] | None = None,
+    refine_margin: int = 1,
+    coast_supersample: int = 0,
+    coast_land_threshold: float = 0.5,
+    terrain_lut: TerrainLookupTable | None = None,
+) -> List[TileClassification]:
+    """Classify a low-frequency topology first and only sample datasets where it is heterogeneous.
+
+    Tiles whose nearest coarse tile matches all of its coarse neighbors (open ocean, biome
+    interiors) inherit that classification; coastlines, biome borders and mountain fronts,
+    widened by `refine_margin` rings, are sampled at full resolution.
+    """
+    datasets = datasets or load_earth_datasets(cache_dir)
+    coordinates = (
+        list(sampling_coordinates)
+        if sampling_coordinates is not None
+        else [alignment.transform(tile.longitude, tile.latitude) for tile in topology.tiles]
+    )
+    coarse_coordinates = (
+        list(coarse_sampling_coordinates)
+        if coarse_sampling_coordinates is not None
+        else [alignment.transform(tile.longitude, tile.latitude) for tile in coarse_topology.tiles]
+    )
+    options = dict(
+        coast_supersample=coast_supersample,
+        coast_land_threshold=coast_land_threshold,
+        terrain_lut=terrain_lut,
+    )
+
+    coarse_tiles = classify_tiles(
+        coarse_topology,
+        cache_dir=cache_dir,
+        alignment=alignment,
+        datasets=datasets,
+        sampling_coordinates=coarse_coordinates,
+        **options,
+    )
+    parents, refine = hierarchical_refine_mask(
+        topology,
+        coordinates,
+        coarse_topology,
+        coarse_tiles,
+        coarse_coordinates,
+        refine_margin=refine_margin,
+    )
+    coarse_by_index = {tile.index: tile for tile in coarse_tiles}
+    inherited = {
+        int(index): coarse_by_index[int(parents[index])]
+        for index in np.flatnonzero(~refine)
+    }
+    return classify_tiles(
+        topology,
+        cache_dir=cache_dir,
+        alignment=alignment,
+        datasets=datasets,
+        sampling_coordinates=coordinates,
+        inherited=inherited,
+        **options,
+    )
 
 
 def build_map_payload(
@@ -383,6 +789,69 @@ def parse_args() -> argparse.Namespace:
         help="Auto-generate missing topology dump via gradle (default: enabled)",
     )
     parser.add_argument("--river-count", type=int, default=20, help="Number of longest rivers to project")
+    parser.add_argument(
+        "--river-source",
+        choices=("natural-earth", "flow"),
+        default="natural-earth",
+        help="Project Natural Earth centerlines or derive rivers from elevation/precipitation flow; "
+        "flow does not accept the Natural Earth projection options (--river-count, --river-locator, ...)",
+    )
+    parser.add_argument(
+        "--river-flow-threshold",
+        type=float,
+        default=DEFAULT_FLOW_THRESHOLD,
+        help=f"Accumulated upstream precipitation (mm) that makes a tile a river in flow mode (default: {DEFAULT_FLOW_THRESHOLD:g})",
+    )
+    parser.add_argument(
+        "--river-locator",
+        choices=RIVER_LOCATORS,
+        default="index",
+        help="Nearest-tile lookup for river points: global spatial index or neighbor walk (default: index)",
+    )
+    parser.add_argument(
+        "--river-max-path-hops",
+        type=int,
+        default=0,
+        help="Give up on river segments whose tiles are more than this many edges apart (default: 0, unlimited)",
+    )
+    parser.add_argument(
+        "--river-path-cache",
+        default=None,
+        help="Optional JSON file reused across runs for river tile paths (keyed by topology hash)",
+    )
+    parser.add_argument(
+        "--river-chain-cache",
+        default=None,
+        help="Optional JSON file of projected chains per river line; reruns only project new or changed lines",
+    )
+    parser.add_argument(
+        "--classification-cache",
+        default=None,
+        help="Optional JSON file reusing terrain classification when topology, alignment and options match",
+    )
+    parser.add_argument(
+        "--k-ring-cache",
+        default=None,
+        help="Optional .npz file of per-tile k-ring neighborhoods used by resource spacing (keyed by topology hash and k)",
+    )
+    parser.add_argument(
+        "--river-workers",
+        type=int,
+        default=1,
+        help="Worker processes used to project river lines in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--coast-supersample",
+        type=int,
+        default=0,
+        help="Sub-points used to resample land/water on coastline tiles (default: 0, center sample only)",
+    )
+    parser.add_argument(
+        "--coast-land-threshold",
+        type=float,
+        default=0.5,
+        help="Land fraction at which a supersampled coastline tile becomes land (default: 0.5)",
+    )
     resource_toggle = parser.add_mutually_exclusive_group()
     resource_toggle.add_argument(
         "--enable-resources",
@@ -431,6 +900,58 @@ def parse_args() -> argparse.Namespace:
         default=False,
         help="Enable strategic starvation guardrails (default: disabled)",
     )
+    parser.add_argument(
+        "--resource-placement-engine",
+        choices=tuple(PLACEMENT_ENGINES),
+        default="greedy",
+        help="Place resources type by type (greedy) or from one score-ordered heap across all resources (default: greedy)",
+    )
+    parser.add_argument(
+        "--resource-placement-report",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Also run every placement engine and write <output>-placement-report.json comparing them (default: disabled)",
+    )
+    parser.add_argument(
+        "--resource-variants",
+        default=None,
+        help="Comma-separated seed:density[:fair|nofair] resource variants written next to --output from one terrain run",
+    )
+    parser.add_argument(
+        "--resource-variant-workers",
+        type=int,
+        default=1,
+        help="Processes used to place and write --resource-variants in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--hierarchical-coarse-frequency",
+        type=int,
+        default=None,
+        help="Classify this lower frequency first and only sample datasets where it is heterogeneous",
+    )
+    parser.add_argument(
+        "--hierarchical-refine-margin",
+        type=int,
+        default=1,
+        help="Rings added around heterogeneous regions in hierarchical mode (default: 1)",
+    )
+    parser.add_argument(
+        "--terrain-classifier",
+        choices=("rules", "lut"),
+        default="rules",
+        help="Classify with the built-in G&K rules or a lookup table compiled from --terrain-rules (default: rules)",
+    )
+    parser.add_argument(
+        "--terrain-rules",
+        default=str(DEFAULT_TERRAIN_RULES_PATH),
+        help="Climate-to-terrain rule file used by --terrain-classifier lut (JSON-in-YAML format)",
+    )
+    parser.add_argument(
+        "--raster-interpolation",
+        choices=RASTER_INTERPOLATION_MODES,
+        default="nearest",
+        help="Climate/elevation raster interpolation; bilinear wraps across the antimeridian (default: nearest)",
+    )
     parser.add_argument(
         "--longitude-offset",
         type=float,
@@ -486,10 +1007,168 @@ def summarize_resource_counts(result: ResourcePlacementResult, ruleset: Mapping[
     return " ".join(parts)
 
 
+@dataclass(frozen=True)
+class ResourceVariant:
+    seed: int
+    density: str
+    fairness: bool
+
+    @property
+    def suffix(self) -> str:
+        fairness = "-fair" if self.fairness else ""
+        return f"seed{self.seed}-{self.density.strip().lower()}{fairness}"
+
+
+def parse_resource_variants(value: str, default_fairness: bool) -> List[ResourceVariant]:
+    variants: List[ResourceVariant] = []
+    for entry in value.split(","):
+        parts = [part.strip() for part in entry.split(":")]
+        if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+            raise ValueError(f"Invalid --resource-variants entry '{entry}'. Use seed:density[:fair|nofair].")
+        try:
+            seed = int(parts[0])
+        except ValueError as exc:
+            raise ValueError(f"Invalid seed in --resource-variants entry '{entry}'") from exc
+        parse_resource_density(parts[1])
+        fairness = default_fairness
+        if len(parts) == 3:
+            if parts[2] not in ("fair", "nofair"):
+                raise ValueError(f"Invalid fairness in --resource-variants entry '{entry}'. Use fair or nofair.")
+            fairness = parts[2] == "fair"
+        variants.append(ResourceVariant(seed=seed, density=parts[1], fairness=fairness))
+
+    suffixes = [variant.suffix for variant in variants]
+    duplicates = sorted({suffix for suffix in suffixes if suffixes.count(suffix) > 1})
+    if duplicates:
+        raise ValueError(f"--resource-variants repeats variant(s): {', '.join(duplicates)}")
+    return variants
+
+
+def resource_variant_output_path(output_path: Path, variant: ResourceVariant) -> Path:
+    return output_path.with_name(f"{output_path.name}-{variant.suffix}")
+
+
+@dataclass(frozen=True)
+class ResourceVariantContext:
+    """Everything shared by resource variants of one terrain run."""
+
+    topology: TopologyDump
+    tiles: Sequence[TileClassification]
+    ruleset_resources: Mapping[str, RulesetResourceDefinition]
+    profiles: Mapping[str, ResourceProfile]
+    ranked: Mapping[str, RankedCandidates]
+    rings: KRingTable
+    river_edges: Sequence[CanonicalEdge]
+    ruleset_name: str
+    size_name: str | None
+    placement_engine: str = "greedy"
+    placement_report: bool = False
+
+
+def write_resource_variant(
+    context: ResourceVariantContext,
+    variant: ResourceVariant,
+    output_path: Path,
+    map_name: str,
+) -> str:
+    """Place resources for one variant, write its map and return the summary line fragment."""
+    density_mode, density_multiplier = parse_resource_density(variant.density)
+    placement_kwargs = dict(
+        topology=context.topology,
+        tiles=context.tiles,
+        profiles=context.profiles,
+        density_mode=density_mode,
+        density_multiplier=density_multiplier,
+        seed=variant.seed,
+        fairness_mode=variant.fairness,
+        rings=context.rings,
+    )
+    started = time.perf_counter()
+    placement = PLACEMENT_ENGINES[context.placement_engine](
+        ruleset_definitions=context.ruleset_resources,
+        ranked_candidates=context.ranked,
+        **placement_kwargs,
+    )
+    elapsed = time.perf_counter() - started
+    if context.placement_report:
+        report = compare_placement_engines(
+            context.ranked,
+            context.ruleset_resources,
+            precomputed={context.placement_engine: (placement, elapsed)},
+            **placement_kwargs,
+        )
+        report_path = output_path.with_name(f"{output_path.name}-placement-report.json")
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    resource_payload = {
+        tile_index: (placed.resource, placed.amount)
+        for tile_index, placed in placement.placements_by_tile.items()
+    }
+    payload = build_map_payload(
+        topology=context.topology,
+        tiles=context.tiles,
+        ruleset_name=context.ruleset_name,
+        map_name=map_name,
+        river_edges=context.river_edges,
+        size_name=context.size_name,
+        resources=resource_payload,
+    )
+    write_map_file(output_path, payload)
+    return (
+        f"resources={len(resource_payload)} "
+        f"{summarize_resource_counts(placement, context.ruleset_resources)} "
+        f"density={density_mode}x{density_multiplier:g} "
+        f"seed={variant.seed} fairness={variant.fairness} engine={context.placement_engine}"
+    )
+
+
+# Set only while a forked variant pool is running; children inherit it instead of pickling it.
+_VARIANT_CONTEXT: ResourceVariantContext | None = None
+
+
+def _write_resource_variant_in_worker(job: tuple[ResourceVariant, Path, str]) -> str:
+    assert _VARIANT_CONTEXT is not None
+    return write_resource_variant(_VARIANT_CONTEXT, *job)
+
+
+def write_resource_variants(
+    context: ResourceVariantContext,
+    jobs: Sequence[tuple[ResourceVariant, Path, str]],
+    workers: int = 1,
+) -> List[str]:
+    """Write every (variant, output path, map name) job; summaries come back in job order."""
+    if workers <= 1 or len(jobs) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [write_resource_variant(context, *job) for job in jobs]
+
+    global _VARIANT_CONTEXT
+    _VARIANT_CONTEXT = context
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            return list(executor.map(_write_resource_variant_in_worker, jobs))
+    finally:
+        _VARIANT_CONTEXT = None
+
+
 def main() -> int:
     args = parse_args()
     cache_dir = Path(args.cache_dir)
 
+    if args.coast_supersample < 0:
+        raise ValueError("--coast-supersample must be >= 0")
+    if not 0.0 < args.coast_land_threshold <= 1.0:
+        raise ValueError("--coast-land-threshold must be in (0, 1]")
+    if args.river_source == "flow":
+        ignored = [flag for flag, name, default in NATURAL_EARTH_RIVER_OPTIONS if getattr(args, name) != default]
+        if ignored:
+            raise ValueError(f"--river-source flow does not use {', '.join(ignored)}")
+    if not args.enable_resources and args.resource_variants:
+        raise ValueError("--resource-variants requires --enable-resources")
+    if not args.enable_resources and args.resource_variant_workers != 1:
+        raise ValueError("--resource-variant-workers requires --enable-resources")
+
     requested_frequency = resolve_generation_frequency(args.size, args.frequency, None)
     topology_path = resolve_topology_path(args.topology, cache_dir, requested_frequency)
     ensure_topology_dump(
@@ -510,26 +1189,124 @@ def main() -> int:
         pole_alignment=str(args.pole_alignment),
     )
 
-    datasets = load_earth_datasets(cache_dir)
-    tiles = classify_tiles(
-        topology,
-        cache_dir=cache_dir,
-        alignment=alignment,
-        datasets=datasets,
-        sampling_coordinates=sampling_coordinates,
-    )
-    validate_classification(tiles)
+    coarse_topology: TopologyDump | None = None
+    coarse_frequency = args.hierarchical_coarse_frequency
+    if coarse_frequency is not None:
+        if not 0 < coarse_frequency < topology.frequency:
+            raise ValueError("--hierarchical-coarse-frequency must be positive and below the target frequency")
+        coarse_topology_path = resolve_topology_path(None, cache_dir, coarse_frequency)
+        ensure_topology_dump(
+            topology_path=coarse_topology_path,
+            frequency=coarse_frequency,
+            auto_generate=bool(args.auto_generate_topology),
+        )
+        coarse_topology = load_generation_topology(coarse_topology_path, coarse_frequency)
+
+    classification_cache_path = Path(args.classification_cache) if args.classification_cache else None
+    classification_key = ""
+    tiles: List[TileClassification] | None = None
+    if classification_cache_path is not None:
+        rules_path = Path(args.terrain_rules)
+        classification_key = classification_cache_key(
+            topology,
+            sampling_coordinates,
+            cache_dir,
+            {
+                "coast_supersample": int(args.coast_supersample),
+                "coast_land_threshold": float(args.coast_land_threshold),
+                "terrain_classifier": str(args.terrain_classifier),
+                "terrain_rules": (
+                    hashlib.sha256(rules_path.read_bytes()).hexdigest() if args.terrain_classifier == "lut" else None
+                ),
+                "raster_interpolation": str(args.raster_interpolation),
+                "hierarchical_coarse_frequency": args.hierarchical_coarse_frequency,
+                "hierarchical_refine_margin": int(args.hierarchical_refine_margin),
+            },
+            coarse_topology=coarse_topology,
+        )
+        tiles = load_cached_classification(classification_cache_path, classification_key, topology)
+
+    datasets: EarthDatasets | None = None
+    if tiles is None:
+        terrain_lut = None
+        if args.terrain_classifier == "lut":
+            terrain_lut = compile_terrain_lut(load_terrain_rules(Path(args.terrain_rules)))
+
+        datasets = load_earth_datasets(cache_dir, raster_interpolation=str(args.raster_interpolation))
+        classify_options = dict(
+            coast_supersample=int(args.coast_supersample),
+            coast_land_threshold=float(args.coast_land_threshold),
+            terrain_lut=terrain_lut,
+        )
+        if coarse_topology is not None:
+            tiles = classify_tiles_hierarchical(
+                topology,
+                coarse_topology,
+                cache_dir=cache_dir,
+                alignment=alignment,
+                datasets=datasets,
+                sampling_coordinates=sampling_coordinates,
+                coarse_sampling_coordinates=_build_sampling_coordinates(
+                    topology=coarse_topology,
+                    alignment=alignment,
+                    pole_alignment=str(args.pole_alignment),
+                ),
+                refine_margin=int(args.hierarchical_refine_margin),
+                **classify_options,
+            )
+        else:
+            tiles = classify_tiles(
+                topology,
+                cache_dir=cache_dir,
+                alignment=alignment,
+                datasets=datasets,
+                sampling_coordinates=sampling_coordinates,
+                **classify_options,
+            )
+        validate_classification(tiles)
+        if classification_cache_path is not None:
+            save_cached_classification(classification_cache_path, classification_key, tiles)
 
     river_count = max(0, int(args.river_count))
-    river_projection = project_river_lines_to_edges(
-        topology=topology,
-        river_lines=datasets.river_lines,
-        max_rivers=river_count,
-        tile_coordinates=sampling_coordinates,
-    )
+    if args.river_source == "flow":
+        river_projection = synthesize_flow_rivers(
+            topology,
+            elevation_m=[tile.elevation_m for tile in tiles],
+            annual_precip_mm=[tile.annual_precip_mm for tile in tiles],
+            is_water=[tile.base_terrain in WATER_BASE_TERRAINS for tile in tiles],
+            threshold=float(args.river_flow_threshold),
+            tile_coordinates=sampling_coordinates,
+        )
+    else:
+        if datasets is not None:
+            river_lines, river_lengths_km = datasets.river_lines, datasets.river_line_lengths_km
+        else:
+            river_lines = load_river_lines(cache_dir)
+            river_lengths_km = polyline_lengths_km(river_lines)
+        river_path_cache_path = Path(args.river_path_cache) if args.river_path_cache else None
+        river_path_cache = (
+            RiverPathCache.load(river_path_cache_path, topology) if river_path_cache_path is not None else None
+        )
+        river_chain_cache_path = Path(args.river_chain_cache) if args.river_chain_cache else None
+        river_chain_cache = RiverChainCache.load(river_chain_cache_path) if river_chain_cache_path is not None else None
+        river_projection = project_river_lines_to_edges(
+            topology=topology,
+            river_lines=river_lines,
+            max_rivers=river_count,
+            river_lengths_km=river_lengths_km,
+            tile_coordinates=sampling_coordinates,
+            locator=str(args.river_locator),
+            max_path_hops=int(args.river_max_path_hops) or None,
+            path_cache=river_path_cache,
+            workers=max(1, int(args.river_workers)),
+            chain_cache=river_chain_cache,
+        )
+        if river_path_cache is not None and river_path_cache_path is not None:
+            river_path_cache.save(river_path_cache_path)
+        if river_chain_cache is not None and river_chain_cache_path is not None:
+            river_chain_cache.save(river_chain_cache_path)
 
-    resource_payload: Dict[int, tuple[str, int]] | None = None
-    resource_summary = "resources=disabled"
+    output_path = Path(args.output)
     if args.enable_resources:
         ruleset_resources_path = Path(args.ruleset_resources)
         resource_profile_path = Path(args.resource_profile)
@@ -538,7 +1315,20 @@ def main() -> int:
             profile_path=resource_profile_path,
             ruleset_path=ruleset_resources_path,
         )
-        density_mode, density_multiplier = parse_resource_density(str(args.resource_density))
+        if args.resource_variants:
+            variants = parse_resource_variants(str(args.resource_variants), bool(args.resource_fairness))
+            jobs = [
+                (variant, resource_variant_output_path(output_path, variant), f"{args.name}-{variant.suffix}")
+                for variant in variants
+            ]
+        else:
+            parse_resource_density(str(args.resource_density))
+            variant = ResourceVariant(
+                seed=int(args.resource_seed),
+                density=str(args.resource_density),
+                fairness=bool(args.resource_fairness),
+            )
+            jobs = [(variant, output_path, args.name)]
         disabled_resources = set(args.disable_resource or [])
         unknown_disabled = sorted(disabled_resources - set(ruleset_resources.keys()))
         if unknown_disabled:
@@ -556,50 +1346,48 @@ def main() -> int:
             layers=layers,
             disabled_resources=disabled_resources,
         )
-        placement = place_resources(
+        context = ResourceVariantContext(
             topology=topology,
             tiles=tiles,
-            ruleset_definitions=ruleset_resources,
+            ruleset_resources=ruleset_resources,
             profiles=profiles,
-            ranked_candidates=ranked,
-            density_mode=density_mode,
-            density_multiplier=density_multiplier,
-            seed=int(args.resource_seed),
-            fairness_mode=bool(args.resource_fairness),
+            ranked=ranked,
+            rings=load_or_build_k_ring_table(
+                topology,
+                max((profile.min_distance for profile in profiles.values()), default=0),
+                cache_path=Path(args.k_ring_cache) if args.k_ring_cache else None,
+            ),
+            river_edges=river_projection.edges,
+            ruleset_name=args.ruleset,
+            size_name=args.size,
+            placement_engine=str(args.resource_placement_engine),
+            placement_report=bool(args.resource_placement_report),
         )
-        resource_payload = {
-            tile_index: (placed.resource, placed.amount)
-            for tile_index, placed in placement.placements_by_tile.items()
-        }
-        resource_summary = (
-            f"resources={len(resource_payload)} "
-            f"{summarize_resource_counts(placement, ruleset_resources)} "
-            f"density={density_mode}x{density_multiplier:g} "
-            f"seed={args.resource_seed} fairness={bool(args.resource_fairness)}"
+        summaries = write_resource_variants(context, jobs, workers=max(1, int(args.resource_variant_workers)))
+        written = [(job[1], summary) for job, summary in zip(jobs, summaries)]
+    else:
+        payload = build_map_payload(
+            topology=topology,
+            tiles=tiles,
+            ruleset_name=args.ruleset,
+            map_name=args.name,
+            river_edges=river_projection.edges,
+            size_name=args.size,
+            resources=None,
         )
-
-    payload = build_map_payload(
-        topology=topology,
-        tiles=tiles,
-        ruleset_name=args.ruleset,
-        map_name=args.name,
-        river_edges=river_projection.edges,
-        size_name=args.size,
-        resources=resource_payload,
-    )
-
-    output_path = Path(args.output)
-    write_map_file(output_path, payload)
+        write_map_file(output_path, payload)
+        written = [(output_path, "resources=disabled")]
 
     water = sum(1 for tile in tiles if tile.base_terrain in WATER_BASE_TERRAINS)
     land = len(tiles) - water
     mountains = sum(1 for tile in tiles if tile.base_terrain == "Mountain")
-    print(
-        f"Wrote map to {output_path} | tiles={len(tiles)} land={land} water={water} mountains={mountains} "
-        f"frequency={topology.frequency} rivers={len(river_projection.edges)} selectedRivers={len(river_projection.selected_lines)} "
-        f"lonOffset={alignment.longitude_offset_deg} flipLat={alignment.flip_latitude} flipLon={alignment.flip_longitude} "
-        f"poleAlign={args.pole_alignment} {resource_summary}"
-    )
+    for written_path, resource_summary in written:
+        print(
+            f"Wrote map to {written_path} | tiles={len(tiles)} land={land} water={water} mountains={mountains} "
+            f"frequency={topology.frequency} rivers={len(river_projection.edges)} selectedRivers={len(river_projection.selected_lines)} "
+            f"lonOffset={alignment.longitude_offset_deg} flipLat={alignment.flip_latitude} flipLon={alignment.flip_longitude} "
+            f"poleAlign={args.pole_alignment} {resource_summary}"
+        )
     if river_projection.skipped_segments:
         print(f"Warning: skipped {river_projection.skipped_segments} river segments that could not be projected")
     return 0
@@ -1,14 +1,44 @@
 from __future__ import annotations
 
-from collections import deque
 from dataclasses import dataclass
-from typing import Iterable, Mapping, Sequence
+from functools import cached_property
+from typing import Dict, Iterable, Sequence
 
 import numpy as np
 
 from tools.earthgen.river_projection import CanonicalEdge
-from tools.earthgen.terrain_rules_gnk import LAND_BASE_TERRAINS, WATER_BASE_TERRAINS
-from tools.earthgen.topology_io import TopologyDump
+from tools.earthgen.terrain_rules_gnk import BASE_TERRAIN_CODES, FEATURE_BITS, LAND_BASE_TERRAINS, WATER_BASE_TERRAINS
+from tools.earthgen.topology_io import TopologyDump, csr_gather, neighbor_csr, neighbor_matrix
+
+
+METRIC_NAMES = (
+    "land",
+    "water",
+    "warmth",
+    "wetness",
+    "aridity",
+    "elevation",
+    "slope",
+    "coast_proximity",
+    "interiorness",
+    "river_proximity",
+    "hill",
+    "forest",
+    "jungle",
+    "marsh",
+    "polar",
+    "temperate",
+    "tropical",
+    "water_shallow",
+    "water_deep",
+    "desert",
+    "plains",
+    "grassland",
+    "tundra",
+    "snow",
+    "fresh_water",
+)
+METRIC_INDEX: Dict[str, int] = {name: row for row, name in enumerate(METRIC_NAMES)}
 
 
 @dataclass(frozen=True)
@@ -33,6 +63,28 @@ class ResourceDatasetLayers:
     land_distance_to_coast: np.ndarray
     water_distance_to_land: np.ndarray
     river_distance: np.ndarray
+    base_terrain_code: np.ndarray
+    slope_max: np.ndarray
+    slope_std: np.ndarray
+
+    @cached_property
+    def feature_bits(self) -> np.ndarray:
+        """FEATURE_BITS mask per tile, rebuilt from the has_* layers."""
+        bits = np.zeros(len(self.tile_latitude), dtype=np.int64)
+        for name, layer in (
+            ("Hill", self.has_hill),
+            ("Forest", self.has_forest),
+            ("Jungle", self.has_jungle),
+            ("Marsh", self.has_marsh),
+            ("Ice", self.has_ice),
+        ):
+            bits |= np.where(layer, FEATURE_BITS[name], 0)
+        return bits
+
+    @cached_property
+    def metric_matrix(self) -> np.ndarray:
+        """(len(METRIC_NAMES), tile count) matrix of every named metric, rows ordered as METRIC_NAMES."""
+        return _metric_matrix(self)
 
 
 def _normalized(values: np.ndarray, low: float | None = None, high: float | None = None) -> np.ndarray:
@@ -46,49 +98,86 @@ def _normalized(values: np.ndarray, low: float | None = None, high: float | None
     return np.clip(out, 0.0, 1.0)
 
 
+UNREACHED_DISTANCE = 10**9
+
+
+@dataclass(frozen=True)
+class DistanceFieldSpec:
+    seeds: np.ndarray
+    passable_mask: np.ndarray | None = None
+    max_distance: int = 99_999
+
+
+def _bfs_distance_fields(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    fields: Sequence[DistanceFieldSpec],
+) -> np.ndarray:
+    """Hop distances from each field's seeds, all fields expanded together level by level.
+
+    States are (field, tile) pairs flattened to field * count + tile. Seeds are at distance 0
+    whether or not they are passable; a field stops expanding at its max_distance.
+    Returns a (len(fields), count) int array with UNREACHED_DISTANCE where nothing arrived.
+    """
+    count = len(indptr) - 1
+    distances = np.full(len(fields) * count, UNREACHED_DISTANCE, dtype=np.int32)
+    passable = np.ones(len(fields) * count, dtype=bool)
+    limits = np.array([field.max_distance for field in fields], dtype=np.int64)
+    seeds = []
+    for f, field in enumerate(fields):
+        if field.passable_mask is not None:
+            passable[f * count : (f + 1) * count] = field.passable_mask
+        seeds.append(f * count + np.asarray(field.seeds, dtype=np.int64))
+
+    frontier = np.unique(np.concatenate(seeds)) if seeds else np.empty(0, dtype=np.int64)
+    distances[frontier] = 0
+    level = 0
+    while frontier.size:
+        frontier = frontier[level < limits[frontier // count]]
+        tiles = frontier % count
+        degrees = indptr[tiles + 1] - indptr[tiles]
+        reached = np.repeat(frontier - tiles, degrees) + csr_gather(indptr, indices, tiles)
+        frontier = np.unique(reached[passable[reached] & (distances[reached] == UNREACHED_DISTANCE)])
+        level += 1
+        distances[frontier] = level
+    return distances.reshape(len(fields), count)
+
+
 def _bfs_distances(
-    topology: TopologyDump,
-    seeds: Sequence[int],
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    seeds: Sequence[int] | np.ndarray,
     passable_mask: np.ndarray | None = None,
     max_distance: int = 99_999,
 ) -> np.ndarray:
-    count = len(topology.tiles)
-    inf = 10**9
-    distances = np.full(count, inf, dtype=np.int32)
-    q: deque[int] = deque()
-    for idx in seeds:
-        distances[idx] = 0
-        q.append(idx)
-
-    while q:
-        node = q.popleft()
-        distance = int(distances[node])
-        if distance >= max_distance:
-            continue
-        for neighbor in topology.tiles[node].neighbors:
-            if passable_mask is not None and not bool(passable_mask[neighbor]):
-                continue
-            nd = distance + 1
-            if nd < distances[neighbor]:
-                distances[neighbor] = nd
-                q.append(neighbor)
-    return distances
-
-
-def _edge_tiles(topology: TopologyDump, river_edges: Iterable[CanonicalEdge]) -> set[int]:
-    edge_to_tiles: dict[CanonicalEdge, tuple[int, int]] = {}
-    for edge in topology.edges:
-        canonical = (edge.a, edge.b) if edge.a < edge.b else (edge.b, edge.a)
-        edge_to_tiles[canonical] = (edge.a, edge.b)
-
-    touched: set[int] = set()
-    for edge in river_edges:
-        tiles = edge_to_tiles.get(edge)
-        if tiles is None:
-            continue
-        touched.add(tiles[0])
-        touched.add(tiles[1])
-    return touched
+    field = DistanceFieldSpec(seeds=np.asarray(seeds, dtype=np.int64), passable_mask=passable_mask, max_distance=max_distance)
+    return _bfs_distance_fields(indptr, indices, [field])[0]
+
+
+def _river_tile_mask(neighbors: np.ndarray, river_edges: Iterable[CanonicalEdge]) -> np.ndarray:
+    """Scatter the endpoints of river edges that join topology neighbors into a per-tile mask."""
+    on_river = np.zeros(len(neighbors), dtype=bool)
+    endpoints = np.array(list(river_edges), dtype=np.int64).reshape(-1, 2)
+    if not endpoints.size:
+        return on_river
+    in_range = (endpoints >= 0).all(axis=1) & (endpoints < len(neighbors)).all(axis=1)
+    endpoints = endpoints[in_range]
+    adjacent = (neighbors[endpoints[:, 0]] == endpoints[:, 1:2]).any(axis=1)
+    on_river[endpoints[adjacent].reshape(-1)] = True
+    return on_river
+
+
+def _slope_statistics(neighbors: np.ndarray, elevation: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mean, max and standard deviation of |elevation difference| to each tile's neighbors."""
+    valid = neighbors >= 0
+    degree = valid.sum(axis=1)
+    differences = np.where(valid, np.abs(elevation[np.maximum(neighbors, 0)] - elevation[:, None]), 0.0)
+    safe_degree = np.maximum(degree, 1)
+    mean = differences.sum(axis=1) / safe_degree
+    spread = np.where(valid, (differences - mean[:, None]) ** 2, 0.0)
+    std = np.sqrt(spread.sum(axis=1) / safe_degree)
+    maximum = differences.max(axis=1, initial=0.0)
+    return mean, maximum, std
 
 
 def build_resource_dataset_layers(
@@ -96,8 +185,6 @@ def build_resource_dataset_layers(
     classified_tiles: Sequence[object],
     river_edges: Iterable[CanonicalEdge],
 ) -> ResourceDatasetLayers:
-    count = len(classified_tiles)
-
     lat = np.array([float(getattr(tile, "latitude")) for tile in classified_tiles], dtype=np.float64)
     lon = np.array([float(getattr(tile, "longitude")) for tile in classified_tiles], dtype=np.float64)
     temp = np.array([float(getattr(tile, "temperature_c")) for tile in classified_tiles], dtype=np.float64)
@@ -118,40 +205,27 @@ def build_resource_dataset_layers(
     has_marsh = np.array(["Marsh" in features for features in feature_sets], dtype=bool)
     has_ice = np.array(["Ice" in features for features in feature_sets], dtype=bool)
 
-    slope = np.zeros(count, dtype=np.float64)
-    for i, tile in enumerate(topology.tiles):
-        neighbors = tile.neighbors
-        if not neighbors:
-            continue
-        neigh_elev = np.array([elev[n] for n in neighbors], dtype=np.float64)
-        slope[i] = float(np.mean(np.abs(neigh_elev - elev[i])))
-
-    river_tiles = _edge_tiles(topology, river_edges)
-    on_river = np.array([i in river_tiles for i in range(count)], dtype=bool)
-
-    freshwater = np.zeros(count, dtype=bool)
-    for i, tile in enumerate(topology.tiles):
-        if not is_land[i]:
-            continue
-        if on_river[i]:
-            freshwater[i] = True
-            continue
-        if any(is_lake[n] for n in tile.neighbors):
-            freshwater[i] = True
-
-    coast_seed = [i for i, val in enumerate(is_coast) if bool(val)]
-    coast_dist = _bfs_distances(topology, coast_seed, passable_mask=is_land) if coast_seed else np.full(count, 10**9)
+    neighbors = neighbor_matrix(topology)
+    slope, slope_max, slope_std = _slope_statistics(neighbors, elev)
+    on_river = _river_tile_mask(neighbors, river_edges)
+    lake_neighbor = ((neighbors >= 0) & is_lake[np.maximum(neighbors, 0)]).any(axis=1)
+    freshwater = is_land & (on_river | lake_neighbor)
 
-    land_seed = [i for i, val in enumerate(is_land) if bool(val)]
-    water_dist = _bfs_distances(topology, land_seed, passable_mask=is_water) if land_seed else np.full(count, 10**9)
-
-    river_seed = [i for i, value in enumerate(on_river) if bool(value)]
-    river_dist = _bfs_distances(topology, river_seed, passable_mask=None, max_distance=24) if river_seed else np.full(count, 10**9)
+    indptr, indices = neighbor_csr(topology)
+    coast_dist, water_dist, river_dist = _bfs_distance_fields(
+        indptr,
+        indices,
+        [
+            DistanceFieldSpec(seeds=np.flatnonzero(is_coast), passable_mask=is_land),
+            DistanceFieldSpec(seeds=np.flatnonzero(is_land), passable_mask=is_water),
+            DistanceFieldSpec(seeds=np.flatnonzero(on_river), max_distance=24),
+        ],
+    )
 
     # Clamp unreachable nodes to conservative finite values for downstream normalization.
-    coast_dist = np.where(coast_dist >= 10**9, 999, coast_dist)
-    water_dist = np.where(water_dist >= 10**9, 999, water_dist)
-    river_dist = np.where(river_dist >= 10**9, 999, river_dist)
+    coast_dist = np.where(coast_dist >= UNREACHED_DISTANCE, 999, coast_dist)
+    water_dist = np.where(water_dist >= UNREACHED_DISTANCE, 999, water_dist)
+    river_dist = np.where(river_dist >= UNREACHED_DISTANCE, 999, river_dist)
 
     return ResourceDatasetLayers(
         tile_longitude=lon,
@@ -174,47 +248,54 @@ def build_resource_dataset_layers(
         land_distance_to_coast=coast_dist.astype(np.float64),
         water_distance_to_land=water_dist.astype(np.float64),
         river_distance=river_dist.astype(np.float64),
+        base_terrain_code=np.array([BASE_TERRAIN_CODES.get(b, -1) for b in base], dtype=np.int64),
+        slope_max=slope_max,
+        slope_std=slope_std,
     )
 
 
-def metric_value(metric: str, tile_index: int, layers: ResourceDatasetLayers) -> float:
-    abs_lat = abs(float(layers.tile_latitude[tile_index]))
-    warmth = _normalized(np.array([layers.temperature_c[tile_index]]), low=-20.0, high=35.0)[0]
-    wetness = _normalized(np.array([layers.precipitation_mm[tile_index]]), low=0.0, high=3500.0)[0]
-    aridity = float(np.clip(1.0 - wetness, 0.0, 1.0))
-    elevation = _normalized(np.array([layers.elevation_m[tile_index]]), low=0.0, high=4500.0)[0]
-    slope = _normalized(np.array([layers.slope[tile_index]]), low=0.0, high=800.0)[0]
-    coast_proximity = float(np.clip(1.0 - layers.land_distance_to_coast[tile_index] / 12.0, 0.0, 1.0))
-    interiorness = float(np.clip(layers.land_distance_to_coast[tile_index] / 12.0, 0.0, 1.0))
-    river_proximity = float(np.clip(1.0 - layers.river_distance[tile_index] / 7.0, 0.0, 1.0))
-    water_shallow = float(np.clip(1.0 - layers.water_distance_to_land[tile_index] / 4.0, 0.0, 1.0))
-    water_deep = float(np.clip(layers.water_distance_to_land[tile_index] / 6.0, 0.0, 1.0))
-
-    lookup: Mapping[str, float] = {
-        "land": 1.0 if bool(layers.is_land[tile_index]) else 0.0,
-        "water": 1.0 if bool(layers.is_water[tile_index]) else 0.0,
-        "warmth": float(warmth),
-        "wetness": float(wetness),
+def _metric_matrix(layers: ResourceDatasetLayers) -> np.ndarray:
+    abs_lat = np.abs(layers.tile_latitude.astype(np.float64))
+    is_land = layers.is_land.astype(bool)
+    is_water = layers.is_water.astype(bool)
+    wetness = _normalized(layers.precipitation_mm, low=0.0, high=3500.0)
+    aridity = np.clip(1.0 - wetness, 0.0, 1.0)
+
+    rows = {
+        "land": is_land,
+        "water": is_water,
+        "warmth": _normalized(layers.temperature_c, low=-20.0, high=35.0),
+        "wetness": wetness,
         "aridity": aridity,
-        "elevation": float(elevation),
-        "slope": float(slope),
-        "coast_proximity": coast_proximity,
-        "interiorness": interiorness,
-        "river_proximity": river_proximity,
-        "hill": 1.0 if bool(layers.has_hill[tile_index]) else 0.0,
-        "forest": 1.0 if bool(layers.has_forest[tile_index]) else 0.0,
-        "jungle": 1.0 if bool(layers.has_jungle[tile_index]) else 0.0,
-        "marsh": 1.0 if bool(layers.has_marsh[tile_index]) else 0.0,
-        "polar": float(np.clip((abs_lat - 55.0) / 35.0, 0.0, 1.0)),
-        "temperate": float(np.clip(1.0 - abs(abs_lat - 38.0) / 32.0, 0.0, 1.0)),
-        "tropical": float(np.clip(1.0 - abs_lat / 28.0, 0.0, 1.0)),
-        "water_shallow": water_shallow,
-        "water_deep": water_deep,
-        "desert": 1.0 if not bool(layers.is_water[tile_index]) and aridity > 0.72 else 0.0,
-        "plains": 1.0 if not bool(layers.is_water[tile_index]) and 0.55 <= aridity <= 0.78 else 0.0,
-        "grassland": 1.0 if bool(layers.is_land[tile_index]) and aridity < 0.55 else 0.0,
-        "tundra": 1.0 if bool(layers.is_land[tile_index]) and abs_lat >= 58.0 and abs_lat < 74.0 else 0.0,
-        "snow": 1.0 if bool(layers.is_land[tile_index]) and abs_lat >= 74.0 else 0.0,
-        "fresh_water": 1.0 if bool(layers.fresh_water[tile_index]) else 0.0,
+        "elevation": _normalized(layers.elevation_m, low=0.0, high=4500.0),
+        "slope": _normalized(layers.slope, low=0.0, high=800.0),
+        "coast_proximity": np.clip(1.0 - layers.land_distance_to_coast / 12.0, 0.0, 1.0),
+        "interiorness": np.clip(layers.land_distance_to_coast / 12.0, 0.0, 1.0),
+        "river_proximity": np.clip(1.0 - layers.river_distance / 7.0, 0.0, 1.0),
+        "hill": layers.has_hill,
+        "forest": layers.has_forest,
+        "jungle": layers.has_jungle,
+        "marsh": layers.has_marsh,
+        "polar": np.clip((abs_lat - 55.0) / 35.0, 0.0, 1.0),
+        "temperate": np.clip(1.0 - np.abs(abs_lat - 38.0) / 32.0, 0.0, 1.0),
+        "tropical": np.clip(1.0 - abs_lat / 28.0, 0.0, 1.0),
+        "water_shallow": np.clip(1.0 - layers.water_distance_to_land / 4.0, 0.0, 1.0),
+        "water_deep": np.clip(layers.water_distance_to_land / 6.0, 0.0, 1.0),
+        "desert": ~is_water & (aridity > 0.72),
+        "plains": ~is_water & (aridity >= 0.55) & (aridity <= 0.78),
+        "grassland": is_land & (aridity < 0.55),
+        "tundra": is_land & (abs_lat >= 58.0) & (abs_lat < 74.0),
+        "snow": is_land & (abs_lat >= 74.0),
+        "fresh_water": layers.fresh_water,
     }
-    return float(lookup.get(metric, 0.0))
+    matrix = np.empty((len(METRIC_NAMES), len(abs_lat)), dtype=np.float64)
+    for row, name in enumerate(METRIC_NAMES):
+        matrix[row] = rows[name]
+    return matrix
+
+
+def metric_value(metric: str, tile_index: int, layers: ResourceDatasetLayers) -> float:
+    row = METRIC_INDEX.get(metric)
+    if row is None:
+        return 0.0
+    return float(layers.metric_matrix[row, tile_index])
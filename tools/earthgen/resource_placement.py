@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from collections import deque
 from dataclasses import dataclass
+import heapq
 import random
-from typing import Dict, Iterable, Mapping, Sequence
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+import numpy as np
 
 from tools.earthgen.resource_rules_gnk import ResourceProfile, RulesetResourceDefinition
-from tools.earthgen.resource_scoring import RankedCandidate
+from tools.earthgen.resource_scoring import RankedCandidate, RankedCandidates
 from tools.earthgen.topology_io import TopologyDump
+from tools.earthgen.topology_rings import KRingTable, build_k_ring_table
 
 
 RESOURCE_PLACEMENT_ORDER = ("Strategic", "Luxury", "Bonus")
@@ -16,6 +20,8 @@ RESOURCE_DENSITY_MULTIPLIER = {
     "default": 1.0,
     "abundant": 1.35,
 }
+# Extra candidates ordered up front to absorb occupied-tile and min-distance rejections.
+PLACEMENT_BATCH_OVERFLOW = 32
 
 
 @dataclass(frozen=True)
@@ -30,25 +36,90 @@ class ResourcePlacementResult:
     counts_by_resource: Dict[str, int]
 
 
-def _is_within_distance(topology: TopologyDump, start: int, targets: set[int], max_distance: int) -> bool:
-    if not targets or max_distance <= 0:
-        return start in targets
-    if start in targets:
-        return True
-    visited = {start}
-    q: deque[tuple[int, int]] = deque([(start, 0)])
-    while q:
-        node, distance = q.popleft()
-        if distance >= max_distance:
-            continue
-        for neighbor in topology.tiles[node].neighbors:
-            if neighbor in visited:
-                continue
-            if neighbor in targets:
-                return True
-            visited.add(neighbor)
-            q.append((neighbor, distance + 1))
-    return False
+def _rings_for_profiles(
+    topology: TopologyDump,
+    profiles: Mapping[str, ResourceProfile],
+    rings: KRingTable | None,
+) -> KRingTable:
+    max_distance = max((profile.min_distance for profile in profiles.values()), default=0)
+    if rings is None or rings.max_k < max_distance:
+        return build_k_ring_table(topology, max_distance)
+    return rings
+
+
+def _block_around(blocked: np.ndarray, rings: KRingTable, tile: int, distance: int) -> None:
+    blocked[tile] = True
+    blocked[rings.within(tile, distance)] = True
+
+
+def _seeded_candidate_order(
+    candidates: RankedCandidates | Sequence[RankedCandidate],
+    rng: random.Random,
+    batch_size: int,
+) -> Iterator[int]:
+    """Yield tile indices in the order of a seeded shuffle followed by a stable sort on score.
+
+    The shuffle draws from `rng` exactly as shuffling the ranked list would, but only the
+    tie-closed top `batch_size` scores are ordered up front; the next batch (twice as large)
+    is partitioned off the remainder when the consumer runs past the current one.
+    """
+    tile_indices, _, entries = _seeded_candidate_entries(candidates, rng, batch_size)
+    return (int(tile_indices[entry]) for entry in entries)
+
+
+def _seeded_candidate_entries(
+    candidates: RankedCandidates | Sequence[RankedCandidate],
+    rng: random.Random,
+    batch_size: int,
+) -> tuple[np.ndarray, np.ndarray, Iterator[int]]:
+    """(tile indices, scores, lazily ordered entry positions) for _seeded_candidate_order."""
+    if isinstance(candidates, RankedCandidates):
+        tile_indices, scores, presorted = candidates.tile_indices, candidates.scores, False
+    else:
+        tile_indices = np.array([item.tile_index for item in candidates], dtype=np.int64)
+        scores = np.array([item.score for item in candidates], dtype=np.float64)
+        presorted = True
+
+    count = len(tile_indices)
+    permutation = list(range(count))
+    rng.shuffle(permutation)
+    # Position each rank-order entry lands at after the shuffle: the tie-break among equal scores.
+    shuffled_position = np.empty(count, dtype=np.int64)
+    shuffled_position[permutation] = np.arange(count, dtype=np.int64)
+    return tile_indices, scores, _ordered_batches(tile_indices, scores, shuffled_position, presorted, batch_size)
+
+
+def _ordered_batches(
+    tile_indices: np.ndarray,
+    scores: np.ndarray,
+    shuffled_position: np.ndarray,
+    presorted: bool,
+    batch_size: int,
+) -> Iterator[int]:
+    remaining = np.arange(len(tile_indices), dtype=np.int64)
+    ranked_so_far = 0
+    batch_size = max(1, batch_size)
+    while remaining.size:
+        if batch_size < remaining.size:
+            remaining_scores = scores[remaining]
+            kth = remaining.size - batch_size
+            cutoff = np.partition(remaining_scores, kth)[kth]
+            chosen = remaining_scores >= cutoff
+            batch, remaining = remaining[chosen], remaining[~chosen]
+        else:
+            batch, remaining = remaining, remaining[:0]
+
+        if presorted:
+            rank_positions = batch
+        else:
+            # Every higher score was emitted in an earlier batch, so ranks continue from there.
+            batch = batch[np.lexsort((tile_indices[batch], -scores[batch]))]
+            rank_positions = ranked_so_far + np.arange(batch.size, dtype=np.int64)
+        ranked_so_far += batch.size
+
+        for entry in batch[np.lexsort((shuffled_position[rank_positions], -scores[batch]))]:
+            yield int(entry)
+        batch_size *= 2
 
 
 def _target_count(
@@ -100,11 +171,12 @@ def place_resources(
     tiles: Sequence[object],
     ruleset_definitions: Mapping[str, RulesetResourceDefinition],
     profiles: Mapping[str, ResourceProfile],
-    ranked_candidates: Mapping[str, Sequence[RankedCandidate]],
+    ranked_candidates: Mapping[str, RankedCandidates | Sequence[RankedCandidate]],
     density_mode: str,
     density_multiplier: float,
     seed: int,
     fairness_mode: bool = False,
+    rings: KRingTable | None = None,
 ) -> ResourcePlacementResult:
     if density_mode not in RESOURCE_DENSITY_MULTIPLIER:
         raise ValueError(f"Unsupported resource density mode: {density_mode}")
@@ -113,27 +185,29 @@ def place_resources(
     tile_count = len(tiles)
     placement: Dict[int, PlacedResource] = {}
     counts: Dict[str, int] = {}
-    per_resource_tiles: Dict[str, set[int]] = {name: set() for name in profiles.keys()}
+    # Tiles within min_distance of an existing deposit of the same resource.
+    blocked: Dict[str, np.ndarray] = {name: np.zeros(topology.tile_count, dtype=bool) for name in profiles.keys()}
+    rings = _rings_for_profiles(topology, profiles, rings)
     tile_by_index = {int(getattr(tile, "index")): tile for tile in tiles}
     grouped = _resources_by_type(ruleset_definitions, profiles)
 
     for resource_type in RESOURCE_PLACEMENT_ORDER:
         for resource_name in grouped[resource_type]:
             profile = profiles[resource_name]
-            candidates = list(ranked_candidates.get(resource_name, []))
-            rng.shuffle(candidates)
-            # Preserve seeded shuffle order for equal-score candidates.
-            candidates.sort(key=lambda item: -item.score)
-
             target_count = _target_count(profile, tile_count, density_mode=density_mode, density_multiplier=density_multiplier)
+            # Equal-score candidates keep their seeded shuffle order.
+            candidates = _seeded_candidate_order(
+                ranked_candidates.get(resource_name, ()),
+                rng,
+                batch_size=2 * target_count + PLACEMENT_BATCH_OVERFLOW,
+            )
             placed = 0
-            for candidate in candidates:
+            for idx in candidates:
                 if placed >= target_count:
                     break
-                idx = candidate.tile_index
                 if idx in placement:
                     continue
-                if _is_within_distance(topology, idx, per_resource_tiles[resource_name], profile.min_distance):
+                if blocked[resource_name][idx]:
                     continue
                 tile = tile_by_index[idx]
                 base_terrain = str(getattr(tile, "base_terrain"))
@@ -148,40 +222,214 @@ def place_resources(
                         rng=rng,
                     )
                 placement[idx] = PlacedResource(resource=resource_name, amount=amount)
-                per_resource_tiles[resource_name].add(idx)
+                _block_around(blocked[resource_name], rings, idx, profile.min_distance)
                 placed += 1
             counts[resource_name] = placed
 
     if fairness_mode:
-        for resource_name, profile in profiles.items():
-            if ruleset_definitions[resource_name].resource_type != "Strategic":
-                continue
-            if counts.get(resource_name, 0) > 0:
-                continue
-            fairness_candidates = list(ranked_candidates.get(resource_name, []))
-            rng.shuffle(fairness_candidates)
-            fairness_candidates.sort(key=lambda item: -item.score)
-            for candidate in fairness_candidates:
-                idx = candidate.tile_index
-                if idx in placement:
-                    continue
-                tile = tile_by_index[idx]
+        _place_fairness_deposits(placement, counts, ruleset_definitions, profiles, ranked_candidates, tile_by_index, density_mode, rng)
+    _validate_strategic_amounts(placement, ruleset_definitions)
+    return ResourcePlacementResult(placements_by_tile=placement, counts_by_resource=counts)
+
+
+def place_resources_heap(
+    topology: TopologyDump,
+    tiles: Sequence[object],
+    ruleset_definitions: Mapping[str, RulesetResourceDefinition],
+    profiles: Mapping[str, ResourceProfile],
+    ranked_candidates: Mapping[str, RankedCandidates | Sequence[RankedCandidate]],
+    density_mode: str,
+    density_multiplier: float,
+    seed: int,
+    fairness_mode: bool = False,
+    rings: KRingTable | None = None,
+) -> ResourcePlacementResult:
+    """Place every resource from one heap keyed by (score, seeded tie-break) across resources.
+
+    Each resource walks its own seeded candidate order and keeps only its best remaining
+    candidate in the heap. A popped tile that is already occupied or blocked is dropped and
+    the resource's next candidate is pushed, so contested tiles go to the highest score rather
+    than to whichever resource type is placed first. Target counts match place_resources.
+    """
+    if density_mode not in RESOURCE_DENSITY_MULTIPLIER:
+        raise ValueError(f"Unsupported resource density mode: {density_mode}")
+
+    rng = random.Random(seed)
+    tile_count = len(tiles)
+    placement: Dict[int, PlacedResource] = {}
+    blocked: Dict[str, np.ndarray] = {name: np.zeros(topology.tile_count, dtype=bool) for name in profiles.keys()}
+    rings = _rings_for_profiles(topology, profiles, rings)
+    tile_by_index = {int(getattr(tile, "index")): tile for tile in tiles}
+    grouped = _resources_by_type(ruleset_definitions, profiles)
+    names = [name for resource_type in RESOURCE_PLACEMENT_ORDER for name in grouped[resource_type]]
+
+    counts: Dict[str, int] = {name: 0 for name in names}
+    targets: List[int] = []
+    cursors: List[tuple[np.ndarray, np.ndarray, Iterator[int]]] = []
+    for name in names:
+        target = _target_count(profiles[name], tile_count, density_mode=density_mode, density_multiplier=density_multiplier)
+        targets.append(target)
+        cursors.append(
+            _seeded_candidate_entries(
+                ranked_candidates.get(name, ()),
+                rng,
+                batch_size=2 * target + PLACEMENT_BATCH_OVERFLOW,
+            )
+        )
+
+    heap: List[tuple[float, float, int, int]] = []
+
+    def push_next(rank: int) -> None:
+        tile_indices, scores, entries = cursors[rank]
+        entry = next(entries, None)
+        if entry is not None:
+            heapq.heappush(heap, (-float(scores[entry]), rng.random(), rank, int(tile_indices[entry])))
+
+    for rank, target in enumerate(targets):
+        if target > 0:
+            push_next(rank)
+
+    while heap:
+        _, _, rank, idx = heapq.heappop(heap)
+        name = names[rank]
+        if idx not in placement and not blocked[name][idx]:
+            profile = profiles[name]
+            amount = 0
+            if ruleset_definitions[name].resource_type == "Strategic":
                 amount = _strategic_amount(
-                    resource_name,
-                    ruleset_definitions[resource_name],
+                    name,
+                    ruleset_definitions[name],
                     profile=profile,
                     density_mode=density_mode,
-                    tile_base_terrain=str(getattr(tile, "base_terrain")),
+                    tile_base_terrain=str(getattr(tile_by_index[idx], "base_terrain")),
                     rng=rng,
                 )
-                placement[idx] = PlacedResource(resource=resource_name, amount=amount)
-                per_resource_tiles[resource_name].add(idx)
-                counts[resource_name] = 1
-                break
+            placement[idx] = PlacedResource(resource=name, amount=amount)
+            _block_around(blocked[name], rings, idx, profile.min_distance)
+            counts[name] += 1
+        if counts[name] < targets[rank]:
+            push_next(rank)
+
+    if fairness_mode:
+        _place_fairness_deposits(placement, counts, ruleset_definitions, profiles, ranked_candidates, tile_by_index, density_mode, rng)
+    _validate_strategic_amounts(placement, ruleset_definitions)
+    return ResourcePlacementResult(placements_by_tile=placement, counts_by_resource=counts)
+
+
+PLACEMENT_ENGINES: Dict[str, Callable[..., ResourcePlacementResult]] = {
+    "greedy": place_resources,
+    "heap": place_resources_heap,
+}
+
+
+def compare_placement_engines(
+    ranked_candidates: Mapping[str, RankedCandidates | Sequence[RankedCandidate]],
+    ruleset_definitions: Mapping[str, RulesetResourceDefinition],
+    *,
+    precomputed: Mapping[str, Tuple[ResourcePlacementResult, float]] | None = None,
+    **placement_kwargs: Any,
+) -> Dict[str, Any]:
+    """Run every placement engine on the same inputs and summarize how their placements differ.
+
+    `precomputed` maps engine names to (result, seconds) from runs the caller already made
+    with the same inputs; those engines are reported without being run again.
+    """
+    results: Dict[str, ResourcePlacementResult] = {}
+    report: Dict[str, Any] = {"engines": {}}
+    for engine, place in PLACEMENT_ENGINES.items():
+        if precomputed is not None and engine in precomputed:
+            result, elapsed = precomputed[engine]
+        else:
+            started = time.perf_counter()
+            result = place(ranked_candidates=ranked_candidates, ruleset_definitions=ruleset_definitions, **placement_kwargs)
+            elapsed = time.perf_counter() - started
+        results[engine] = result
+        total_score = sum(
+            _candidate_score(ranked_candidates.get(placed.resource, ()), tile_index)
+            for tile_index, placed in result.placements_by_tile.items()
+        )
+        placed_count = len(result.placements_by_tile)
+        report["engines"][engine] = {
+            "seconds": round(elapsed, 6),
+            "placed": placed_count,
+            "totalScore": round(total_score, 6),
+            "meanScore": round(total_score / placed_count, 6) if placed_count else 0.0,
+            "countsByType": {
+                resource_type: sum(
+                    count
+                    for name, count in result.counts_by_resource.items()
+                    if ruleset_definitions[name].resource_type == resource_type
+                )
+                for resource_type in RESOURCE_PLACEMENT_ORDER
+            },
+        }
+
+    greedy, heap_result = results["greedy"], results["heap"]
+    report["sharedPlacements"] = sum(
+        1
+        for tile_index, placed in greedy.placements_by_tile.items()
+        if getattr(heap_result.placements_by_tile.get(tile_index), "resource", None) == placed.resource
+    )
+    report["countDifferences"] = {
+        name: {"greedy": greedy.counts_by_resource.get(name, 0), "heap": heap_result.counts_by_resource.get(name, 0)}
+        for name in sorted(set(greedy.counts_by_resource) | set(heap_result.counts_by_resource))
+        if greedy.counts_by_resource.get(name, 0) != heap_result.counts_by_resource.get(name, 0)
+    }
+    return report
+
+
+def _candidate_score(candidates: RankedCandidates | Sequence[RankedCandidate], tile_index: int) -> float:
+    if isinstance(candidates, RankedCandidates):
+        position = int(np.searchsorted(candidates.tile_indices, tile_index))
+        if position < len(candidates.tile_indices) and candidates.tile_indices[position] == tile_index:
+            return float(candidates.scores[position])
+        return 0.0
+    return next((item.score for item in candidates if item.tile_index == tile_index), 0.0)
+
+
+def _place_fairness_deposits(
+    placement: Dict[int, PlacedResource],
+    counts: Dict[str, int],
+    ruleset_definitions: Mapping[str, RulesetResourceDefinition],
+    profiles: Mapping[str, ResourceProfile],
+    ranked_candidates: Mapping[str, RankedCandidates | Sequence[RankedCandidate]],
+    tile_by_index: Mapping[int, object],
+    density_mode: str,
+    rng: random.Random,
+) -> None:
+    """Give every strategic resource that placed nothing its best free tile, ignoring spacing."""
+    for resource_name, profile in profiles.items():
+        if ruleset_definitions[resource_name].resource_type != "Strategic":
+            continue
+        if counts.get(resource_name, 0) > 0:
+            continue
+        fairness_candidates = _seeded_candidate_order(
+            ranked_candidates.get(resource_name, ()),
+            rng,
+            batch_size=PLACEMENT_BATCH_OVERFLOW,
+        )
+        for idx in fairness_candidates:
+            if idx in placement:
+                continue
+            tile = tile_by_index[idx]
+            amount = _strategic_amount(
+                resource_name,
+                ruleset_definitions[resource_name],
+                profile=profile,
+                density_mode=density_mode,
+                tile_base_terrain=str(getattr(tile, "base_terrain")),
+                rng=rng,
+            )
+            placement[idx] = PlacedResource(resource=resource_name, amount=amount)
+            counts[resource_name] = 1
+            break
+
 
+def _validate_strategic_amounts(
+    placement: Mapping[int, PlacedResource],
+    ruleset_definitions: Mapping[str, RulesetResourceDefinition],
+) -> None:
     # Ensure all strategic deposits have positive amount
     for idx, placed in placement.items():
         if ruleset_definitions[placed.resource].resource_type == "Strategic" and placed.amount <= 0:
             raise ValueError(f"Strategic resource {placed.resource} at tile {idx} has invalid amount={placed.amount}")
-
-    return ResourcePlacementResult(placements_by_tile=placement, counts_by_resource=counts)
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Iterable, Mapping, Sequence
+from functools import cached_property
+from typing import Dict, Iterable, Iterator, Mapping, Sequence
 
-from tools.earthgen.resource_dataset_sampling import ResourceDatasetLayers, metric_value
+import numpy as np
+
+from tools.earthgen.resource_dataset_sampling import METRIC_INDEX, ResourceDatasetLayers, metric_value
 from tools.earthgen.resource_rules_gnk import ResourceProfile, RulesetResourceDefinition
+from tools.earthgen.terrain_rules_gnk import BASE_TERRAIN_CODES, FEATURE_BITS
+
+BASE_TERRAIN_TOKENS = ("Grassland", "Plains", "Desert", "Tundra", "Snow", "Coast")
+FEATURE_TOKENS = ("Forest", "Jungle", "Marsh", "Hill")
 
 
 @dataclass(frozen=True)
@@ -13,6 +20,37 @@ class RankedCandidate:
     score: float
 
 
+@dataclass(frozen=True, eq=False)
+class RankedCandidates:
+    """Eligible tiles and their scores as parallel arrays, in tile order.
+
+    Iterating or indexing walks the full rank order (-score, tile_index), which is only
+    sorted on first use; placement orders just the prefix it consumes.
+    """
+
+    tile_indices: np.ndarray
+    scores: np.ndarray
+
+    @classmethod
+    def empty(cls) -> RankedCandidates:
+        return cls(tile_indices=np.empty(0, dtype=np.int64), scores=np.empty(0, dtype=np.float64))
+
+    @cached_property
+    def rank_order(self) -> np.ndarray:
+        return np.lexsort((self.tile_indices, -self.scores))
+
+    def __len__(self) -> int:
+        return len(self.tile_indices)
+
+    def __iter__(self) -> Iterator[RankedCandidate]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def __getitem__(self, position: int) -> RankedCandidate:
+        entry = self.rank_order[position]
+        return RankedCandidate(tile_index=int(self.tile_indices[entry]), score=float(self.scores[entry]))
+
+
 def _token_matches_tile(
     terrain_token: str,
     tile: object,
@@ -22,9 +60,9 @@ def _token_matches_tile(
     base_terrain = str(getattr(tile, "base_terrain"))
     features = set(str(v) for v in getattr(tile, "features"))
 
-    if terrain_token in {"Grassland", "Plains", "Desert", "Tundra", "Snow", "Coast"}:
+    if terrain_token in BASE_TERRAIN_TOKENS:
         return base_terrain == terrain_token
-    if terrain_token in {"Forest", "Jungle", "Marsh", "Hill"}:
+    if terrain_token in FEATURE_TOKENS:
         return terrain_token in features
     if terrain_token == "Flood plains":
         return base_terrain == "Desert" and bool(layers.fresh_water[tile_index])
@@ -67,6 +105,54 @@ def is_tile_eligible(
     return True
 
 
+def _feature_mask(layers: ResourceDatasetLayers, feature: str) -> np.ndarray:
+    bit = FEATURE_BITS.get(feature)
+    if bit is None:
+        return np.zeros(len(layers.tile_latitude), dtype=bool)
+    return (layers.feature_bits & bit) != 0
+
+
+def _terrain_token_mask(terrain_token: str, layers: ResourceDatasetLayers) -> np.ndarray:
+    if terrain_token in BASE_TERRAIN_TOKENS:
+        return layers.base_terrain_code == BASE_TERRAIN_CODES[terrain_token]
+    if terrain_token in FEATURE_TOKENS:
+        return _feature_mask(layers, terrain_token)
+    if terrain_token == "Flood plains":
+        return (layers.base_terrain_code == BASE_TERRAIN_CODES["Desert"]) & layers.fresh_water.astype(bool)
+    return np.zeros(len(layers.tile_latitude), dtype=bool)
+
+
+def eligibility_mask(
+    profile: ResourceProfile,
+    ruleset_def: RulesetResourceDefinition,
+    layers: ResourceDatasetLayers,
+) -> np.ndarray:
+    """is_tile_eligible for every tile at once, indexed by tile index."""
+    count = len(layers.tile_latitude)
+    if not profile.enabled:
+        return np.zeros(count, dtype=bool)
+
+    latitude = layers.tile_latitude
+    mask = np.ones(count, dtype=bool)
+    if profile.latitude_min is not None:
+        mask &= ~(latitude < profile.latitude_min)
+    if profile.latitude_max is not None:
+        mask &= ~(latitude > profile.latitude_max)
+
+    for feature in profile.required_features:
+        mask &= _feature_mask(layers, feature)
+    for feature in profile.forbidden_features:
+        mask &= ~_feature_mask(layers, feature)
+
+    allowed_tokens = profile.allowed_terrains or ruleset_def.terrains_can_be_found_on
+    if allowed_tokens:
+        allowed = np.zeros(count, dtype=bool)
+        for token in allowed_tokens:
+            allowed |= _terrain_token_mask(token, layers)
+        mask &= allowed
+    return mask
+
+
 def _region_boost(profile: ResourceProfile, lon: float, lat: float) -> float:
     boost = 0.0
     for region in profile.region_boosts:
@@ -86,21 +172,112 @@ def score_tile_for_resource(profile: ResourceProfile, tile: object, layers: Reso
     return float(score)
 
 
+def resource_scores(
+    profile: ResourceProfile,
+    layers: ResourceDatasetLayers,
+    tile_indices: np.ndarray | None = None,
+) -> np.ndarray:
+    """score_tile_for_resource for many tiles at once, read from the precomputed metric matrix."""
+    if tile_indices is None:
+        tile_indices = np.arange(len(layers.tile_latitude))
+    matrix = layers.metric_matrix
+    # Accumulate weight by weight, in profile order, so scores match the scalar path exactly.
+    scores = np.full(len(tile_indices), 0.2, dtype=np.float64)
+    for metric_name, weight in profile.dataset_weights.items():
+        row = METRIC_INDEX.get(metric_name)
+        if row is not None:
+            scores += weight * matrix[row, tile_indices]
+
+    lon = layers.tile_longitude[tile_indices]
+    lat = layers.tile_latitude[tile_indices]
+    boost = np.zeros(len(tile_indices), dtype=np.float64)
+    for region in profile.region_boosts:
+        inside = (region.min_lon <= lon) & (lon <= region.max_lon) & (region.min_lat <= lat) & (lat <= region.max_lat)
+        boost += np.where(inside, region.boost, 0.0)
+    return scores + boost
+
+
 def rank_candidates_for_resource(
     profile: ResourceProfile,
     ruleset_def: RulesetResourceDefinition,
     tiles: Sequence[object],
     layers: ResourceDatasetLayers,
-) -> list[RankedCandidate]:
-    ranked: list[RankedCandidate] = []
-    for tile in tiles:
-        index = int(getattr(tile, "index"))
-        if not is_tile_eligible(profile, ruleset_def, tile, layers, index):
-            continue
-        score = score_tile_for_resource(profile, tile, layers, index)
-        ranked.append(RankedCandidate(tile_index=index, score=score))
-    ranked.sort(key=lambda value: (-value.score, value.tile_index))
-    return ranked
+) -> RankedCandidates:
+    tile_indices = np.array([int(getattr(tile, "index")) for tile in tiles], dtype=np.int64)
+    eligible = np.sort(tile_indices[eligibility_mask(profile, ruleset_def, layers)[tile_indices]])
+    return RankedCandidates(tile_indices=eligible, scores=resource_scores(profile, layers, eligible))
+
+
+@dataclass(frozen=True, eq=False)
+class ResourceWeightTable:
+    """Profiles compiled into padded per-resource arrays, one row per resource.
+
+    Slot j of a row holds the profile's j-th known dataset weight (or region boost) in
+    profile order; unused slots have metric row -1 / region_used False.
+    """
+
+    names: tuple[str, ...]
+    metric_rows: np.ndarray
+    weights: np.ndarray
+    region_bounds: np.ndarray
+    region_boosts: np.ndarray
+    region_used: np.ndarray
+
+
+def compile_resource_weights(profiles: Mapping[str, ResourceProfile]) -> ResourceWeightTable:
+    names = tuple(profiles.keys())
+    weighted = [
+        [(METRIC_INDEX[metric], weight) for metric, weight in profiles[name].dataset_weights.items() if metric in METRIC_INDEX]
+        for name in names
+    ]
+    weight_slots = max((len(entries) for entries in weighted), default=0)
+    region_slots = max((len(profiles[name].region_boosts) for name in names), default=0)
+
+    metric_rows = np.full((len(names), weight_slots), -1, dtype=np.int64)
+    weights = np.zeros((len(names), weight_slots), dtype=np.float64)
+    region_bounds = np.zeros((len(names), region_slots, 4), dtype=np.float64)
+    region_boosts = np.zeros((len(names), region_slots), dtype=np.float64)
+    region_used = np.zeros((len(names), region_slots), dtype=bool)
+    for r, name in enumerate(names):
+        for slot, (row, weight) in enumerate(weighted[r]):
+            metric_rows[r, slot] = row
+            weights[r, slot] = weight
+        for slot, region in enumerate(profiles[name].region_boosts):
+            region_bounds[r, slot] = (region.min_lon, region.max_lon, region.min_lat, region.max_lat)
+            region_boosts[r, slot] = region.boost
+            region_used[r, slot] = True
+    return ResourceWeightTable(
+        names=names,
+        metric_rows=metric_rows,
+        weights=weights,
+        region_bounds=region_bounds,
+        region_boosts=region_boosts,
+        region_used=region_used,
+    )
+
+
+def resource_score_matrix(table: ResourceWeightTable, layers: ResourceDatasetLayers) -> np.ndarray:
+    """resource_scores for every compiled resource and every tile, as a (resources, tiles) array.
+
+    Weights are applied slot by slot across all resources at once rather than as one matrix
+    product, so each resource still accumulates in profile order and matches the per-resource
+    scores bit for bit (a BLAS product reorders the sums and can flip exact score ties).
+    """
+    matrix = layers.metric_matrix
+    scores = np.full((len(table.names), matrix.shape[1]), 0.2, dtype=np.float64)
+    for slot in range(table.metric_rows.shape[1]):
+        rows = np.flatnonzero(table.metric_rows[:, slot] >= 0)
+        scores[rows] += table.weights[rows, slot, None] * matrix[table.metric_rows[rows, slot]]
+
+    lon = layers.tile_longitude
+    lat = layers.tile_latitude
+    boost = np.zeros_like(scores)
+    for slot in range(table.region_used.shape[1]):
+        rows = np.flatnonzero(table.region_used[:, slot])
+        min_lon, max_lon, min_lat, max_lat = (table.region_bounds[rows, slot, i, None] for i in range(4))
+        inside = (min_lon <= lon) & (lon <= max_lon) & (min_lat <= lat) & (lat <= max_lat)
+        boost[rows] += np.where(inside, table.region_boosts[rows, slot, None], 0.0)
+    return scores + boost
 
 
 def rank_candidates_by_resource(
@@ -109,13 +286,20 @@ def rank_candidates_by_resource(
     tiles: Sequence[object],
     layers: ResourceDatasetLayers,
     disabled_resources: Iterable[str] = (),
-) -> Dict[str, list[RankedCandidate]]:
+) -> Dict[str, RankedCandidates]:
+    """Rank every enabled resource from one batched score matrix."""
     disabled = set(disabled_resources)
-    ranked: Dict[str, list[RankedCandidate]] = {}
+    table = compile_resource_weights({name: profile for name, profile in profiles.items() if name not in disabled})
+    scores = resource_score_matrix(table, layers)
+    score_row = {name: row for row, name in enumerate(table.names)}
+    tile_indices = np.array([int(getattr(tile, "index")) for tile in tiles], dtype=np.int64)
+
+    ranked: Dict[str, RankedCandidates] = {}
     for resource_name, profile in profiles.items():
         if resource_name in disabled:
-            ranked[resource_name] = []
+            ranked[resource_name] = RankedCandidates.empty()
             continue
-        ruleset_def = ruleset_definitions[resource_name]
-        ranked[resource_name] = rank_candidates_for_resource(profile, ruleset_def, tiles, layers)
+        mask = eligibility_mask(profile, ruleset_definitions[resource_name], layers)
+        eligible = np.sort(tile_indices[mask[tile_indices]])
+        ranked[resource_name] = RankedCandidates(tile_indices=eligible, scores=scores[score_row[resource_name], eligible])
     return ranked
@@ -0,0 +1,182 @@
+"""Synthesize rivers from sampled elevation and precipitation on the topology graph.
+
+Priority-flood fills depressions from every water tile, land tiles drain along the
+steepest descent of the filled surface (or to the tile they were flooded from on flats),
+and precipitation accumulates downstream. Tiles whose accumulated flow reaches the
+threshold become river chains ending at the coast or a lake.
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from tools.earthgen.river_projection import (
+    CanonicalEdge,
+    LonLat,
+    RiverPathCache,
+    RiverProjectionResult,
+    _NeighborCycle,
+    _bridge_chain_for_corner_continuity,
+    _build_adjacency,
+    _shortest_path,
+    canonical_edge,
+)
+from tools.earthgen.topology_io import TopologyDump, build_edge_writer_index_from_dump, neighbor_csr
+
+DEFAULT_FLOW_THRESHOLD = 20000.0
+# Non-representable steps are rerouted over at most this many representable edges.
+MAX_REROUTE_HOPS = 4
+
+
+def priority_flood(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    elevation_m: np.ndarray,
+    is_water: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fill depressions outward from water tiles.
+
+    Returns (filled elevation, flood parent, pop order). Tiles are popped in non-decreasing
+    filled elevation, so every tile's parent and lower neighbors precede it in pop order.
+    Land that no water reaches is flooded from its own lowest tile, which becomes a sink.
+    """
+    count = len(elevation_m)
+    elevation = np.nan_to_num(np.asarray(elevation_m, dtype=np.float64))
+    filled = elevation.copy()
+    parent = np.full(count, -1, dtype=np.int64)
+    visited = np.zeros(count, dtype=bool)
+    order = np.empty(count, dtype=np.int64)
+    popped = 0
+
+    heap: List[Tuple[float, int]] = [(float(filled[i]), int(i)) for i in np.flatnonzero(is_water)]
+    heapq.heapify(heap)
+    visited[is_water] = True
+    unvisited_by_height = iter(np.argsort(elevation, kind="stable"))
+
+    while popped < count:
+        if not heap:
+            seed = next(i for i in unvisited_by_height if not visited[i])
+            visited[seed] = True
+            heap.append((float(filled[seed]), int(seed)))
+        level, tile = heapq.heappop(heap)
+        order[popped] = tile
+        popped += 1
+        for neighbor in indices[indptr[tile] : indptr[tile + 1]]:
+            if visited[neighbor]:
+                continue
+            visited[neighbor] = True
+            parent[neighbor] = tile
+            filled[neighbor] = max(filled[neighbor], level)
+            heapq.heappush(heap, (float(filled[neighbor]), int(neighbor)))
+
+    return filled, parent, order
+
+
+def flow_receivers(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    filled: np.ndarray,
+    parent: np.ndarray,
+    is_water: np.ndarray,
+) -> np.ndarray:
+    """Downstream tile for each land tile: lowest strictly-lower neighbor, else the flood parent."""
+    degrees = np.diff(indptr)
+    owners = np.repeat(np.arange(len(filled)), degrees)
+    neighbor_filled = filled[indices]
+    # Sort each tile's neighbors by (filled, index); the first of each run is the steepest.
+    order = np.lexsort((indices, neighbor_filled, owners))
+    starts = indptr[:-1][degrees > 0]
+    lowest = np.full(len(filled), -1, dtype=np.int64)
+    lowest[degrees > 0] = indices[order[starts]]
+
+    has_lower = (lowest >= 0) & (filled[np.maximum(lowest, 0)] < filled)
+    receivers = np.where(has_lower, lowest, parent)
+    receivers[is_water] = -1
+    return receivers
+
+
+def flow_accumulation(order: np.ndarray, receivers: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    accumulation = np.asarray(weights, dtype=np.float64).copy()
+    # Reverse pop order visits every donor before its receiver.
+    for tile in order[::-1]:
+        receiver = receivers[tile]
+        if receiver >= 0:
+            accumulation[receiver] += accumulation[tile]
+    return accumulation
+
+
+def synthesize_flow_rivers(
+    topology: TopologyDump,
+    elevation_m: Sequence[float] | np.ndarray,
+    annual_precip_mm: Sequence[float] | np.ndarray,
+    is_water: Sequence[bool] | np.ndarray,
+    threshold: float = DEFAULT_FLOW_THRESHOLD,
+    tile_coordinates: Sequence[LonLat] | None = None,
+) -> RiverProjectionResult:
+    """Emit river chains for land tiles whose precipitation-weighted flow reaches `threshold`."""
+    water = np.asarray(is_water, dtype=bool)
+    elevation = np.asarray(elevation_m, dtype=np.float64)
+    precip = np.nan_to_num(np.asarray(annual_precip_mm, dtype=np.float64))
+    if not len(water) == len(elevation) == len(precip) == topology.tile_count:
+        raise ValueError("Flow inputs must have one value per topology tile")
+
+    indptr, indices = neighbor_csr(topology)
+    filled, parent, order = priority_flood(indptr, indices, elevation, water)
+    receivers = flow_receivers(indptr, indices, filled, parent, water)
+    accumulation = flow_accumulation(order, receivers, np.where(water, 0.0, np.maximum(precip, 0.0)))
+
+    river = ~water & (receivers >= 0) & (accumulation >= threshold)
+    has_river_donor = np.zeros(topology.tile_count, dtype=bool)
+    has_river_donor[receivers[river]] = True
+    sources = np.flatnonzero(river & ~has_river_donor)
+
+    writer_map = build_edge_writer_index_from_dump(topology)
+    adjacency = _build_adjacency(topology.tile_count, writer_map.keys())
+    neighbor_cycle = _NeighborCycle(topology, tile_coordinates=tile_coordinates)
+    path_cache = RiverPathCache()
+
+    done = np.zeros(topology.tile_count, dtype=bool)
+    unique_edges: Set[CanonicalEdge] = set()
+    chains: List[Tuple[CanonicalEdge, ...]] = []
+    skipped_segments = 0
+    for source in sources:
+        chain_raw: List[CanonicalEdge] = []
+        tile = int(source)
+        # Follow the flow until it reaches water, a sink, or a river already traced.
+        while river[tile] and not done[tile]:
+            done[tile] = True
+            receiver = int(receivers[tile])
+            edges, skipped = _flow_step_edges(tile, receiver, writer_map, adjacency, path_cache)
+            chain_raw.extend(edges)
+            skipped_segments += skipped
+            tile = receiver
+        if chain_raw:
+            chain = _bridge_chain_for_corner_continuity(chain_raw, neighbor_cycle, writer_map)
+            unique_edges.update(chain)
+            chains.append(tuple(chain))
+
+    return RiverProjectionResult(
+        selected_lines=tuple(),
+        chains=tuple(chains),
+        edges=tuple(sorted(unique_edges)),
+        skipped_segments=skipped_segments,
+    )
+
+
+def _flow_step_edges(
+    tile: int,
+    receiver: int,
+    writer_map: Dict[CanonicalEdge, Tuple[int, str]],
+    adjacency: Sequence[Sequence[int]],
+    path_cache: RiverPathCache,
+) -> Tuple[List[CanonicalEdge], int]:
+    edge = canonical_edge(tile, receiver)
+    if edge in writer_map:
+        return [edge], 0
+    path = _shortest_path(tile, receiver, adjacency, path_cache, max_hops=MAX_REROUTE_HOPS)
+    if path is None or len(path) < 2:
+        return [], 1
+    return [canonical_edge(a, b) for a, b in zip(path, path[1:])], 0
@@ -1,18 +1,36 @@
 from __future__ import annotations
 
-from collections import deque
+import hashlib
+import json
+import math
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Dict, Iterable, List, Sequence, Set, Tuple
 
 import numpy as np
 
-from tools.earthgen.dataset_sampling import geodesic_polyline_length_km, haversine_km, wrap_longitude
-from tools.earthgen.topology_io import TopologyDump, build_edge_writer_index_from_dump
+from tools.earthgen.dataset_sampling import (
+    EARTH_RADIUS_KM,
+    lonlat_to_unit_vectors,
+    polyline_lengths_km,
+    unit_vectors_to_lonlat,
+)
+from tools.earthgen.topology_io import (
+    TopologyDump,
+    build_edge_writer_index_from_dump,
+    neighbor_matrix,
+    topology_fingerprint,
+)
 
 
 CanonicalEdge = Tuple[int, int]
 LonLat = Tuple[float, float]
 
+RIVER_LOCATORS = ("index", "walk")
+
 
 @dataclass(frozen=True)
 class RiverProjectionResult:
@@ -26,16 +44,201 @@ def canonical_edge(a: int, b: int) -> CanonicalEdge:
     return (a, b) if a < b else (b, a)
 
 
-def select_longest_river_lines(river_lines: Sequence[Sequence[LonLat]], count: int) -> List[List[LonLat]]:
+class RiverPathCache:
+    """Bounded LRU of shortest tile paths, shared across projections on one topology.
+
+    Entries are keyed by the unordered tile pair and stored in ascending-endpoint order, so a
+    lookup in either direction hits. A failed search records the hop limit it ran under and
+    only answers later lookups whose limit is no larger.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, max_entries: int = 200_000, topology_key: str | None = None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.topology_key = topology_key
+        self.hits = 0
+        self.misses = 0
+        # Value is the path from the lower to the higher tile, or the failing hop limit (-1 = unlimited).
+        self._entries: OrderedDict[CanonicalEdge, Tuple[int, ...] | int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def bind(self, topology: TopologyDump) -> None:
+        key = topology_fingerprint(topology)
+        if self.topology_key is None:
+            self.topology_key = key
+        elif self.topology_key != key:
+            raise ValueError("River path cache was built for a different topology")
+
+    def lookup(self, start: int, end: int, max_hops: int | None) -> Tuple[bool, Tuple[int, ...] | None]:
+        key = canonical_edge(start, end)
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return False, None
+        if isinstance(value, int):
+            if value >= 0 and (max_hops is None or max_hops > value):
+                # Failed under a tighter limit; a longer search might still succeed.
+                self.misses += 1
+                return False, None
+            path: Tuple[int, ...] | None = None
+        elif max_hops is not None and len(value) - 1 > max_hops:
+            path = None
+        else:
+            path = value if start == key[0] else tuple(reversed(value))
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, path
+
+    def store(self, start: int, end: int, path: Tuple[int, ...] | None, max_hops: int | None) -> None:
+        key = canonical_edge(start, end)
+        if path is None:
+            value: Tuple[int, ...] | int = -1 if max_hops is None else max_hops
+        else:
+            value = path if start == key[0] else tuple(reversed(path))
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "version": self.CACHE_VERSION,
+            "topology": self.topology_key,
+            "entries": [[a, b, value if isinstance(value, int) else list(value)] for (a, b), value in self._entries.items()],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, topology: TopologyDump, max_entries: int = 200_000) -> "RiverPathCache":
+        """Load a saved cache, starting empty when the file is missing or for another topology."""
+        cache = cls(max_entries=max_entries, topology_key=topology_fingerprint(topology))
+        if not path.exists():
+            return cache
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != cls.CACHE_VERSION or data.get("topology") != cache.topology_key:
+            return cache
+        for a, b, value in data.get("entries", []):
+            cache._entries[(int(a), int(b))] = int(value) if isinstance(value, int) else tuple(int(v) for v in value)
+        while len(cache._entries) > cache.max_entries:
+            cache._entries.popitem(last=False)
+        return cache
+
+
+class RiverChainCache:
+    """Projected chain per river line, reused when only river selection or density changes.
+
+    Entries are keyed by a projection context (topology hash, tile coordinates, densification
+    and path settings) and a hash of the line geometry, so a rerun only projects lines that
+    are new or were projected under different settings. Binding to a new context drops the
+    entries of every other context, so the cache (and its saved file) holds one run's lines.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self) -> None:
+        self.context_key: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[Tuple[CanonicalEdge, ...], int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def context_key_for(
+        topology: TopologyDump,
+        tile_coordinates: Sequence[LonLat] | None,
+        max_segment_km: float,
+        locator: str,
+        max_path_hops: int | None,
+    ) -> str:
+        if tile_coordinates is None:
+            coordinates = np.array([(tile.longitude, tile.latitude) for tile in topology.tiles], dtype="<f8")
+        else:
+            coordinates = np.asarray(tile_coordinates, dtype="<f8")
+        digest = hashlib.sha256(topology_fingerprint(topology).encode("utf-8"))
+        digest.update(np.ascontiguousarray(coordinates).tobytes())
+        digest.update(f"|{max_segment_km!r}|{locator}|{max_path_hops!r}".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def line_key(line: Sequence[LonLat]) -> str:
+        return hashlib.sha256(np.asarray(line, dtype="<f8").tobytes()).hexdigest()
+
+    def bind(self, context_key: str) -> None:
+        if context_key != self.context_key:
+            prefix = f"{context_key}:"
+            self._entries = {key: entry for key, entry in self._entries.items() if key.startswith(prefix)}
+            self.context_key = context_key
+
+    def _entry_key(self, line_key: str) -> str:
+        if self.context_key is None:
+            raise ValueError("River chain cache must be bound to a projection context first")
+        return f"{self.context_key}:{line_key}"
+
+    def get(self, line_key: str) -> _LineProjection | None:
+        entry = self._entries.get(self._entry_key(line_key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _LineProjection(chain=entry[0], skipped_segments=entry[1], paths=tuple())
+
+    def put(self, line_key: str, projection: _LineProjection) -> None:
+        self._entries[self._entry_key(line_key)] = (projection.chain, projection.skipped_segments)
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "version": self.CACHE_VERSION,
+            "entries": {
+                key: [[list(edge) for edge in chain], skipped] for key, (chain, skipped) in self._entries.items()
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "RiverChainCache":
+        cache = cls()
+        if not path.exists():
+            return cache
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != cls.CACHE_VERSION:
+            return cache
+        for key, (chain, skipped) in data.get("entries", {}).items():
+            cache._entries[key] = (tuple((int(a), int(b)) for a, b in chain), int(skipped))
+        return cache
+
+
+def select_longest_river_lines(
+    river_lines: Sequence[Sequence[LonLat]],
+    count: int,
+    lengths_km: Sequence[float] | np.ndarray | None = None,
+) -> List[List[LonLat]]:
     if count <= 0:
         return []
-    weighted = []
-    for line in river_lines:
-        if len(line) < 2:
-            continue
-        weighted.append((geodesic_polyline_length_km(line), list(line)))
-    weighted.sort(key=lambda pair: pair[0], reverse=True)
-    return [line for _, line in weighted[:count]]
+    if lengths_km is None:
+        lengths_km = polyline_lengths_km(river_lines)
+    lengths = np.asarray(lengths_km, dtype=np.float64)
+    if len(lengths) != len(river_lines):
+        raise ValueError(f"lengths_km length mismatch: expected {len(river_lines)}, got {len(lengths)}")
+
+    candidates = np.flatnonzero([len(line) >= 2 for line in river_lines])
+    if len(candidates) > count:
+        # Partial selection; lines tied at the cutoff keep input order like a stable sort.
+        candidate_lengths = lengths[candidates]
+        cutoff = candidate_lengths[np.argpartition(-candidate_lengths, count - 1)[count - 1]]
+        longer = candidates[candidate_lengths > cutoff]
+        tied = candidates[candidate_lengths == cutoff][: count - len(longer)]
+        candidates = np.concatenate((longer, tied))
+    order = candidates[np.lexsort((candidates, -lengths[candidates]))]
+    return [list(river_lines[i]) for i in order]
 
 
 def project_river_lines_to_edges(
@@ -44,60 +247,164 @@ def project_river_lines_to_edges(
     max_rivers: int,
     tile_coordinates: Sequence[LonLat] | None = None,
     max_segment_km: float = 120.0,
+    locator: str = "index",
+    max_path_hops: int | None = None,
+    path_cache: RiverPathCache | None = None,
+    river_lengths_km: Sequence[float] | np.ndarray | None = None,
+    workers: int = 1,
+    chain_cache: RiverChainCache | None = None,
 ) -> RiverProjectionResult:
-    selected_raw = select_longest_river_lines(river_lines, max_rivers)
-    selected = [densify_line(line, max_segment_km=max_segment_km) for line in selected_raw]
-    if not selected:
+    if locator not in RIVER_LOCATORS:
+        raise ValueError(f"Unsupported river locator: {locator} (expected one of {', '.join(RIVER_LOCATORS)})")
+    selected_raw = select_longest_river_lines(river_lines, max_rivers, lengths_km=river_lengths_km)
+    if not selected_raw:
         return RiverProjectionResult(selected_lines=tuple(), chains=tuple(), edges=tuple(), skipped_segments=0)
 
-    writer_map = build_edge_writer_index_from_dump(topology)
-    adjacency = _build_adjacency(topology.tile_count, writer_map.keys())
-    locator = _TileLocator(topology, tile_coordinates=tile_coordinates)
-    neighbor_cycle = _NeighborCycle(topology, tile_coordinates=tile_coordinates)
-    path_cache: Dict[Tuple[int, int], Tuple[int, ...] | None] = {}
+    projections: List[_LineProjection | None] = [None] * len(selected_raw)
+    line_keys: List[str] = []
+    if chain_cache is not None:
+        chain_cache.bind(
+            RiverChainCache.context_key_for(topology, tile_coordinates, max_segment_km, locator, max_path_hops)
+        )
+        line_keys = [RiverChainCache.line_key(line) for line in selected_raw]
+        projections = [chain_cache.get(key) for key in line_keys]
+
+    missing = [i for i, projection in enumerate(projections) if projection is None]
+    if missing:
+        if path_cache is None:
+            path_cache = RiverPathCache()
+        path_cache.bind(topology)
+        context = _build_projection_context(topology, tile_coordinates, locator, path_cache, max_path_hops)
+        selected = [densify_line_vectors(selected_raw[i], max_segment_km=max_segment_km) for i in missing]
+        if workers > 1 and len(selected) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            projected = _project_lines_parallel(selected, context, workers)
+            # Workers filled copies of the cache; fold their paths back in for later runs.
+            for projection in projected:
+                for start, end, path in projection.paths:
+                    path_cache.store(start, end, path, max_path_hops)
+        else:
+            projected = [_project_line(vectors, context) for vectors in selected]
+        for i, projection in zip(missing, projected):
+            projections[i] = projection
+            if chain_cache is not None:
+                chain_cache.put(line_keys[i], projection)
 
     unique_edges: Set[CanonicalEdge] = set()
     chains: List[Tuple[CanonicalEdge, ...]] = []
     skipped_segments = 0
+    for projection in projections:
+        assert projection is not None
+        skipped_segments += projection.skipped_segments
+        if projection.chain:
+            unique_edges.update(projection.chain)
+            chains.append(projection.chain)
+
+    return RiverProjectionResult(
+        selected_lines=tuple(tuple(line) for line in selected_raw),
+        chains=tuple(chains),
+        edges=tuple(sorted(unique_edges)),
+        skipped_segments=skipped_segments,
+    )
+
+
+def _build_projection_context(
+    topology: TopologyDump,
+    tile_coordinates: Sequence[LonLat] | None,
+    locator: str,
+    path_cache: RiverPathCache,
+    max_path_hops: int | None,
+) -> _ProjectionContext:
+    writer_map = build_edge_writer_index_from_dump(topology)
+    tile_locator: _TileLocator | _NeighborWalkLocator
+    if locator == "walk":
+        tile_locator = _NeighborWalkLocator(topology, tile_coordinates=tile_coordinates)
+    else:
+        tile_locator = _TileLocator(topology, tile_coordinates=tile_coordinates)
+    return _ProjectionContext(
+        writer_map=writer_map,
+        adjacency=_build_adjacency(topology.tile_count, writer_map.keys()),
+        locator=tile_locator,
+        neighbor_cycle=_NeighborCycle(topology, tile_coordinates=tile_coordinates),
+        path_cache=path_cache,
+        max_path_hops=max_path_hops,
+    )
+
+
+@dataclass(frozen=True)
+class _ProjectionContext:
+    writer_map: Dict[CanonicalEdge, Tuple[int, str]]
+    adjacency: List[List[int]]
+    locator: _TileLocator | _NeighborWalkLocator
+    neighbor_cycle: _NeighborCycle
+    path_cache: RiverPathCache
+    max_path_hops: int | None
+
 
-    for line in selected:
-        tile_seq = _dedupe_consecutive(locator.nearest_indices(line))
-        if len(tile_seq) < 2:
+@dataclass(frozen=True)
+class _LineProjection:
+    chain: Tuple[CanonicalEdge, ...]
+    skipped_segments: int
+    paths: Tuple[Tuple[int, int, Tuple[int, ...] | None], ...]
+
+
+def _project_line(vectors: np.ndarray, context: _ProjectionContext) -> _LineProjection:
+    tile_seq = _dedupe_consecutive(context.locator.nearest_to_vectors(vectors).tolist())
+    if len(tile_seq) < 2:
+        return _LineProjection(chain=tuple(), skipped_segments=0, paths=tuple())
+
+    chain_raw: List[CanonicalEdge] = []
+    paths: List[Tuple[int, int, Tuple[int, ...] | None]] = []
+    skipped_segments = 0
+    current = tile_seq[0]
+    for nxt in tile_seq[1:]:
+        if nxt == current:
+            continue
+        path = _shortest_path(current, nxt, context.adjacency, context.path_cache, max_hops=context.max_path_hops)
+        paths.append((current, nxt, path))
+        if path is None or len(path) < 2:
+            skipped_segments += 1
+            current = nxt
             continue
 
-        chain_raw: List[CanonicalEdge] = []
-        current = tile_seq[0]
-        for nxt in tile_seq[1:]:
-            if nxt == current:
-                continue
-            path = _shortest_path(current, nxt, adjacency, path_cache)
-            if path is None or len(path) < 2:
+        for a, b in zip(path, path[1:]):
+            edge = canonical_edge(a, b)
+            if edge not in context.writer_map:
+                # This should be impossible if shortest_path uses representable adjacency,
+                # but keep the guard to avoid malformed writes.
                 skipped_segments += 1
-                current = nxt
                 continue
+            chain_raw.append(edge)
+        current = nxt
 
-            for a, b in zip(path, path[1:]):
-                edge = canonical_edge(a, b)
-                if edge not in writer_map:
-                    # This should be impossible if shortest_path uses representable adjacency,
-                    # but keep the guard to avoid malformed writes.
-                    skipped_segments += 1
-                    continue
-                chain_raw.append(edge)
-            current = nxt
+    chain: Tuple[CanonicalEdge, ...] = tuple()
+    if chain_raw:
+        chain = tuple(_bridge_chain_for_corner_continuity(chain_raw, context.neighbor_cycle, context.writer_map))
+    return _LineProjection(chain=chain, skipped_segments=skipped_segments, paths=tuple(paths))
 
-        if chain_raw:
-            chain = _bridge_chain_for_corner_continuity(chain_raw, neighbor_cycle, writer_map)
-            for edge in chain:
-                unique_edges.add(edge)
-            chains.append(tuple(chain))
 
-    return RiverProjectionResult(
-        selected_lines=tuple(tuple(line) for line in selected_raw),
-        chains=tuple(chains),
-        edges=tuple(sorted(unique_edges)),
-        skipped_segments=skipped_segments,
-    )
+# Set only while a forked worker pool is running; children inherit it instead of pickling it.
+_WORKER_CONTEXT: _ProjectionContext | None = None
+
+
+def _project_line_in_worker(vectors: np.ndarray) -> _LineProjection:
+    assert _WORKER_CONTEXT is not None
+    return _project_line(vectors, _WORKER_CONTEXT)
+
+
+def _project_lines_parallel(
+    lines: Sequence[np.ndarray],
+    context: _ProjectionContext,
+    workers: int,
+) -> List[_LineProjection]:
+    global _WORKER_CONTEXT
+    _WORKER_CONTEXT = context
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            chunksize = max(1, len(lines) // (workers * 4))
+            # map() yields in submission order, keeping chains in river-length order.
+            return list(executor.map(_project_line_in_worker, lines, chunksize=chunksize))
+    finally:
+        _WORKER_CONTEXT = None
 
 
 def _build_adjacency(tile_count: int, edges: Iterable[CanonicalEdge]) -> List[List[int]]:
@@ -108,6 +415,101 @@ def _build_adjacency(tile_count: int, edges: Iterable[CanonicalEdge]) -> List[Li
     return [sorted(neighbors) for neighbors in adjacency]
 
 
+class _UnitVectorIndex:
+    """Exact nearest-neighbor index over unit vectors using a uniform 3D voxel grid.
+
+    Nearest by maximum dot product equals nearest by chord length on the unit sphere. A tile in
+    a voxel more than `r` cells away from the query voxel is farther than `r * cell_size`, so a
+    best match within that distance after scanning the (2r+1)^3 block is exact. Equal dot
+    products resolve to the lowest tile index, matching np.argmax over a dense dot matrix.
+    """
+
+    MAX_BLOCK_RADIUS = 4
+    DENSE_BUDGET = 2_000_000
+
+    def __init__(self, vectors: np.ndarray, cell_size: float | None = None):
+        self._vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+        count = len(self._vectors)
+        self._cell_size = float(cell_size) if cell_size is not None else max(math.sqrt(4.0 * math.pi / max(count, 1)), 1e-4)
+        self._dims = int(math.ceil(2.0 / self._cell_size)) + 1
+
+        keys = self._cell_keys(self._cell_coords(self._vectors))
+        # Stable sort keeps ascending tile indices inside each cell.
+        self._sorted_tiles = np.argsort(keys, kind="stable")
+        self._keys, starts = np.unique(keys[self._sorted_tiles], return_index=True)
+        self._starts = starts.astype(np.int64)
+        self._ends = np.append(self._starts[1:], count).astype(np.int64)
+
+    def _cell_coords(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor((vectors + 1.0) / self._cell_size), 0, self._dims - 1).astype(np.int64)
+
+    def _cell_keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[..., 0] * self._dims + cells[..., 1]) * self._dims + cells[..., 2]
+
+    def nearest(self, points: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        out = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), chunk_size):
+            out[start : start + chunk_size] = self._nearest_chunk(points[start : start + chunk_size])
+        return out
+
+    def _nearest_chunk(self, points: np.ndarray) -> np.ndarray:
+        result = np.full(len(points), -1, dtype=np.int64)
+        pending = np.arange(len(points))
+        radius = 1
+        while pending.size and radius <= self.MAX_BLOCK_RADIUS:
+            best, best_dot = self._search_block(points[pending], radius)
+            distance = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * best_dot))
+            done = (best >= 0) & (distance <= radius * self._cell_size - 1e-12)
+            result[pending[done]] = best[done]
+            pending = pending[~done]
+            radius *= 2
+        if pending.size:
+            # Sparse or very uneven tile sets: fall back to bounded dense blocks.
+            result[pending] = self._dense_nearest(points[pending])
+        return result
+
+    def _search_block(self, points: np.ndarray, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        span = np.arange(-radius, radius + 1)
+        offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+        cells = self._cell_coords(points)[:, None, :] + offsets[None, :, :]
+        inside = ((cells >= 0) & (cells < self._dims)).all(axis=2)
+        keys = self._cell_keys(np.clip(cells, 0, self._dims - 1))
+
+        slots = np.searchsorted(self._keys, keys)
+        slots = np.minimum(slots, len(self._keys) - 1)
+        hit = inside & (self._keys[slots] == keys)
+        counts = np.where(hit, self._ends[slots] - self._starts[slots], 0).reshape(-1)
+        starts = self._starts[slots].reshape(-1)
+
+        total = int(counts.sum())
+        best = np.full(len(points), -1, dtype=np.int64)
+        best_dot = np.full(len(points), -2.0, dtype=np.float64)
+        if total == 0:
+            return best, best_dot
+
+        owners = np.repeat(np.repeat(np.arange(len(points)), offsets.shape[0]), counts)
+        run_starts = np.cumsum(counts) - counts
+        positions = np.repeat(starts, counts) + (np.arange(total) - np.repeat(run_starts, counts))
+        candidates = self._sorted_tiles[positions]
+        dots = np.einsum("ij,ij->i", points[owners], self._vectors[candidates])
+
+        order = np.lexsort((candidates, -dots, owners))
+        first = np.unique(owners[order], return_index=True)[1]
+        winners = order[first]
+        best[owners[winners]] = candidates[winners]
+        best_dot[owners[winners]] = dots[winners]
+        return best, best_dot
+
+    def _dense_nearest(self, points: np.ndarray) -> np.ndarray:
+        step = max(1, self.DENSE_BUDGET // max(len(self._vectors), 1))
+        out = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), step):
+            dots = points[start : start + step] @ self._vectors.T
+            out[start : start + step] = np.argmax(dots, axis=1)
+        return out
+
+
 class _TileLocator:
     def __init__(self, topology: TopologyDump, tile_coordinates: Sequence[LonLat] | None = None):
         if tile_coordinates is None:
@@ -121,29 +523,84 @@ class _TileLocator:
             coord_lons = [coord[0] for coord in tile_coordinates]
             coord_lats = [coord[1] for coord in tile_coordinates]
 
-        lats = np.radians(np.array(coord_lats, dtype=np.float64))
-        lons = np.radians(np.array(coord_lons, dtype=np.float64))
-        x = np.cos(lats) * np.cos(lons)
-        y = np.cos(lats) * np.sin(lons)
-        z = np.sin(lats)
-        self._tile_vectors = np.stack((x, y, z), axis=1)
+        self.tile_vectors = lonlat_to_unit_vectors(coord_lons, coord_lats)
+        self._index = _UnitVectorIndex(self.tile_vectors)
 
     def nearest_indices(self, points: Sequence[LonLat]) -> List[int]:
         if not points:
             return []
-        lons = np.radians(np.array([p[0] for p in points], dtype=np.float64))
-        lats = np.radians(np.array([p[1] for p in points], dtype=np.float64))
-        px = np.cos(lats) * np.cos(lons)
-        py = np.cos(lats) * np.sin(lons)
-        pz = np.sin(lats)
-        vectors = np.stack((px, py, pz), axis=1)
+        vectors = lonlat_to_unit_vectors([p[0] for p in points], [p[1] for p in points])
+        return [int(i) for i in self.nearest_to_vectors(vectors)]
 
+    def nearest_to_vectors(self, vectors: np.ndarray) -> np.ndarray:
         # Max dot product = minimum angular distance on unit sphere.
-        dots = vectors @ self._tile_vectors.T
-        return [int(i) for i in np.argmax(dots, axis=1)]
+        return self._index.nearest(vectors)
+
+
+class _NeighborWalkLocator:
+    """Nearest-tile lookup that walks the neighbor graph from the previous point's tile.
+
+    Densified river points are close together, so most lookups settle within a step or two.
+    The global index resolves the first point of each line and any walk that exceeds
+    `max_steps`.
+    """
+
+    def __init__(
+        self,
+        topology: TopologyDump,
+        tile_coordinates: Sequence[LonLat] | None = None,
+        max_steps: int = 32,
+    ):
+        self._global = _TileLocator(topology, tile_coordinates=tile_coordinates)
+        self._tile_vectors = self._global.tile_vectors
+        self._neighbors = neighbor_matrix(topology)
+        self._max_steps = max_steps
+        self.fallbacks = 0
+
+    def nearest_indices(self, points: Sequence[LonLat]) -> List[int]:
+        if not points:
+            return []
+        vectors = lonlat_to_unit_vectors([p[0] for p in points], [p[1] for p in points])
+        return [int(i) for i in self.nearest_to_vectors(vectors)]
+
+    def nearest_to_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        out = np.empty(len(vectors), dtype=np.int64)
+        current = -1
+        for i, vector in enumerate(vectors):
+            if current >= 0:
+                current = self._walk(current, vector)
+            if current < 0:
+                current = int(self._global.nearest_to_vectors(vector[None, :])[0])
+            out[i] = current
+        return out
+
+    def _walk(self, start: int, vector: np.ndarray) -> int:
+        current = start
+        current_dot = float(self._tile_vectors[current] @ vector)
+        for _ in range(self._max_steps):
+            neighbors = self._neighbors[current]
+            neighbors = neighbors[neighbors >= 0]
+            if neighbors.size == 0:
+                return current
+            dots = self._tile_vectors[neighbors] @ vector
+            best_dot = float(dots.max())
+            best = int(neighbors[dots == best_dot].min())
+            # Order by (dot, -index) so the walk is strictly monotone and matches argmax ties.
+            if best_dot < current_dot or (best_dot == current_dot and best > current):
+                return current
+            current, current_dot = best, best_dot
+        self.fallbacks += 1
+        return -1
 
 
 class _NeighborCycle:
+    """Neighbors of every tile in angular order, plus the arc between any two of them.
+
+    Arcs depend only on the ring degree and the two slots, so one small (from-slot,
+    to-slot) table per degree covers every tile: the signed number of ring steps on the
+    shorter side (positive clockwise, ties preferring clockwise).
+    """
+
     def __init__(self, topology: TopologyDump, tile_coordinates: Sequence[LonLat] | None = None):
         if tile_coordinates is None:
             coord_lons = [tile.longitude for tile in topology.tiles]
@@ -156,65 +613,61 @@ class _NeighborCycle:
             coord_lons = [coord[0] for coord in tile_coordinates]
             coord_lats = [coord[1] for coord in tile_coordinates]
 
-        lats = np.radians(np.array(coord_lats, dtype=np.float64))
-        lons = np.radians(np.array(coord_lons, dtype=np.float64))
-        vectors = np.stack(
-            (np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)),
-            axis=1,
-        )
-
-        self._order: List[List[int]] = []
-        self._index: List[Dict[int, int]] = []
-        global_z = np.array([0.0, 0.0, 1.0], dtype=np.float64)
-        global_y = np.array([0.0, 1.0, 0.0], dtype=np.float64)
-
-        for tile in topology.tiles:
-            idx = tile.index
-            up = vectors[idx]
-            east = np.cross(global_z, up)
-            east_norm = np.linalg.norm(east)
-            if east_norm < 1e-8:
-                east = np.cross(global_y, up)
-                east_norm = np.linalg.norm(east)
-            east /= east_norm
-            north = np.cross(up, east)
-
-            angle_neighbors: List[Tuple[float, int]] = []
-            for neighbor in tile.neighbors:
-                delta = vectors[neighbor] - up * np.dot(vectors[neighbor], up)
-                angle = float(np.arctan2(np.dot(delta, east), np.dot(delta, north)))
-                angle_neighbors.append((angle, neighbor))
-            angle_neighbors.sort(key=lambda pair: pair[0])
-            ordered_neighbors = [neighbor for _, neighbor in angle_neighbors]
-            self._order.append(ordered_neighbors)
-            self._index.append({neighbor: local for local, neighbor in enumerate(ordered_neighbors)})
+        up = lonlat_to_unit_vectors(coord_lons, coord_lats).reshape(-1, 3)
+        east = np.cross(np.array([0.0, 0.0, 1.0]), up)
+        polar = np.linalg.norm(east, axis=1) < 1e-8
+        east[polar] = np.cross(np.array([0.0, 1.0, 0.0]), up[polar])
+        east /= np.linalg.norm(east, axis=1, keepdims=True)
+        north = np.cross(up, east)
+
+        neighbors = neighbor_matrix(topology)
+        valid = neighbors >= 0
+        neighbor_vectors = up[np.maximum(neighbors, 0)]
+        delta = neighbor_vectors - up[:, None, :] * np.einsum("ndk,nk->nd", neighbor_vectors, up)[:, :, None]
+        angles = np.arctan2(np.einsum("ndk,nk->nd", delta, east), np.einsum("ndk,nk->nd", delta, north))
+        angles[~valid] = np.inf
+        # Stable sort on angle alone: equal angles keep the topology's neighbor order.
+        order = np.argsort(angles, axis=1, kind="stable")
+        self._ring = np.take_along_axis(neighbors, order, axis=1)
+        self._degree = valid.sum(axis=1)
+        self._arc_steps = _arc_step_table(neighbors.shape[1])
+
+    def slots(self, tiles: np.ndarray, neighbors: np.ndarray) -> np.ndarray:
+        """Ring slot of each neighbor around its tile, or -1 when it is not a neighbor."""
+        matches = self._ring[tiles] == np.asarray(neighbors)[:, None]
+        return np.where(matches.any(axis=1), matches.argmax(axis=1), -1)
+
+    def arc_steps(self, tiles: np.ndarray, neighbors_from: np.ndarray, neighbors_to: np.ndarray) -> np.ndarray:
+        tiles = np.asarray(tiles, dtype=np.int64)
+        from_slots = self.slots(tiles, neighbors_from)
+        to_slots = self.slots(tiles, neighbors_to)
+        found = (from_slots >= 0) & (to_slots >= 0)
+        steps = self._arc_steps[self._degree[tiles], np.maximum(from_slots, 0), np.maximum(to_slots, 0)]
+        return np.where(found, steps, 0)
+
+    def arc(self, tile: int, neighbor_from: int, steps: int) -> List[int]:
+        degree = int(self._degree[tile])
+        start = int(self.slots(np.array([tile]), np.array([neighbor_from]))[0])
+        direction = 1 if steps > 0 else -1
+        return [int(self._ring[tile, (start + direction * k) % degree]) for k in range(1, abs(steps) + 1)]
 
     def intermediate_neighbors(self, tile: int, neighbor_from: int, neighbor_to: int) -> List[int]:
-        ordered = self._order[tile]
-        if len(ordered) < 3:
-            return []
-        index_map = self._index[tile]
-        if neighbor_from not in index_map or neighbor_to not in index_map:
-            return []
+        steps = int(self.arc_steps(np.array([tile]), np.array([neighbor_from]), np.array([neighbor_to]))[0])
+        return self.arc(tile, neighbor_from, steps) if steps else []
 
-        from_i = index_map[neighbor_from]
-        to_i = index_map[neighbor_to]
-        if from_i == to_i:
-            return []
-
-        cw: List[int] = []
-        i = (from_i + 1) % len(ordered)
-        while i != to_i:
-            cw.append(ordered[i])
-            i = (i + 1) % len(ordered)
-
-        ccw: List[int] = []
-        i = (from_i - 1) % len(ordered)
-        while i != to_i:
-            ccw.append(ordered[i])
-            i = (i - 1) % len(ordered)
 
-        return cw if len(cw) <= len(ccw) else ccw
+def _arc_step_table(max_degree: int) -> np.ndarray:
+    """table[degree, from, to] = signed ring steps strictly between the two slots."""
+    table = np.zeros((max_degree + 1, max(max_degree, 1), max(max_degree, 1)), dtype=np.int64)
+    for degree in range(3, max_degree + 1):
+        slots = np.arange(degree)
+        from_slots, to_slots = np.meshgrid(slots, slots, indexing="ij")
+        cw = (to_slots - from_slots - 1) % degree
+        ccw = (from_slots - to_slots - 1) % degree
+        steps = np.where(cw <= ccw, cw, -ccw)
+        steps[from_slots == to_slots] = 0
+        table[degree, :degree, :degree] = steps
+    return table
 
 
 def _dedupe_consecutive(indices: Sequence[int]) -> List[int]:
@@ -233,86 +686,183 @@ def _bridge_chain_for_corner_continuity(
     if len(chain) < 2:
         return list(chain)
 
-    bridged: List[CanonicalEdge] = [chain[0]]
-    for edge in chain[1:]:
-        previous = bridged[-1]
-        shared_tiles = set(previous) & set(edge)
-        if len(shared_tiles) == 1:
-            shared = next(iter(shared_tiles))
-            prev_other = previous[0] if previous[1] == shared else previous[1]
-            next_other = edge[0] if edge[1] == shared else edge[1]
-            for intermediate_neighbor in neighbor_cycle.intermediate_neighbors(shared, prev_other, next_other):
-                bridge_edge = canonical_edge(shared, intermediate_neighbor)
-                if bridge_edge in writer_map and bridged[-1] != bridge_edge:
-                    bridged.append(bridge_edge)
-        if bridged[-1] != edge:
-            bridged.append(edge)
-    return bridged
+    edges = np.asarray(chain, dtype=np.int64)
+    previous, following = edges[:-1], edges[1:]
+    share_first = (previous[:, 0] == following[:, 0]) | (previous[:, 0] == following[:, 1])
+    share_second = (previous[:, 1] == following[:, 0]) | (previous[:, 1] == following[:, 1])
+    # Only consecutive edges meeting at exactly one tile turn a corner.
+    corner = np.flatnonzero(share_first ^ share_second)
+    shared = np.where(share_first, previous[:, 0], previous[:, 1])[corner]
+    prev_other = np.where(share_first, previous[:, 1], previous[:, 0])[corner]
+    next_other = np.where(following[corner, 0] == shared, following[corner, 1], following[corner, 0])
+    steps = neighbor_cycle.arc_steps(shared, prev_other, next_other)
+
+    # Bridges are rare, so only the corners that need them touch Python objects.
+    inserts: Dict[int, List[CanonicalEdge]] = {}
+    for k in np.flatnonzero(steps):
+        tile = int(shared[k])
+        bridges = [
+            canonical_edge(tile, neighbor)
+            for neighbor in neighbor_cycle.arc(tile, int(prev_other[k]), int(steps[k]))
+        ]
+        bridges = [edge for edge in bridges if edge in writer_map]
+        if bridges:
+            inserts[int(corner[k])] = bridges
+
+    counts = np.zeros(len(edges), dtype=np.int64)
+    for k, bridges in inserts.items():
+        counts[k + 1] = len(bridges)
+    positions = np.arange(len(edges)) + np.cumsum(counts)
+    bridged = np.empty((len(edges) + int(counts.sum()), 2), dtype=np.int64)
+    bridged[positions] = edges
+    for k, bridges in inserts.items():
+        bridged[positions[k + 1] - len(bridges) : positions[k + 1]] = bridges
+
+    keep = np.ones(len(bridged), dtype=bool)
+    keep[1:] = (bridged[1:] != bridged[:-1]).any(axis=1)
+    return [(a, b) for a, b in bridged[keep].tolist()]
 
 
 def _shortest_path(
     start: int,
     end: int,
     adjacency: Sequence[Sequence[int]],
-    path_cache: Dict[Tuple[int, int], Tuple[int, ...] | None],
+    path_cache: RiverPathCache,
+    max_hops: int | None = None,
 ) -> Tuple[int, ...] | None:
     if start == end:
         return (start,)
-    cached = path_cache.get((start, end))
-    if cached is not None:
+    found, cached = path_cache.lookup(start, end, max_hops)
+    if found:
         return cached
 
+    # Always search from the lower tile so the chosen path never depends on cache history.
+    low, high = canonical_edge(start, end)
+    path = _bidirectional_bfs(low, high, adjacency, max_hops)
+    path_cache.store(low, high, path, max_hops)
+    if path is None or start == low:
+        return path
+    return tuple(reversed(path))
+
+
+def _bidirectional_bfs(
+    start: int,
+    end: int,
+    adjacency: Sequence[Sequence[int]],
+    max_hops: int | None,
+) -> Tuple[int, ...] | None:
+    # Grow whole BFS levels from both ends, always expanding the smaller frontier. Searching
+    # stops once the two depths add up to max_hops, so unreachable pairs fail fast. Levels are
+    # finished before checking for a meeting, so the first meeting length is the distance.
+    depths = ({start: 0}, {end: 0})
+    frontiers: Tuple[List[int], List[int]] = ([start], [end])
+    level = [0, 0]
+
+    while frontiers[0] and frontiers[1]:
+        if max_hops is not None and level[0] + level[1] >= max_hops:
+            return None
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        own_depths, other_depths = depths[side], depths[1 - side]
+        level[side] += 1
+
+        next_frontier: List[int] = []
+        met = False
+        for current in frontiers[side]:
+            for neighbor in adjacency[current]:
+                if neighbor in own_depths:
+                    continue
+                own_depths[neighbor] = level[side]
+                next_frontier.append(neighbor)
+                met = met or neighbor in other_depths
+
+        if met:
+            length = level[0] + level[1]
+            if max_hops is not None and length > max_hops:
+                return None
+            return _first_queued_path(start, end, adjacency, depths, level[0], length)
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+
+    return None
+
+
+def _first_queued_path(
+    start: int,
+    end: int,
+    adjacency: Sequence[Sequence[int]],
+    depths: Tuple[Dict[int, int], Dict[int, int]],
+    start_level: int,
+    length: int,
+) -> Tuple[int, ...]:
+    """The path a plain BFS from `start` over sorted adjacency would return.
+
+    Every predecessor of a tile on a shortest start-end path is on one too, so a plain BFS
+    restricted to those tiles queues them in the same relative order and picks the same
+    parents. Both searches finished whole levels summing to `length`, so such tiles at depth
+    `start_level` carry both depths; the rest are reached through the start side (shallower)
+    or the end side (deeper).
+    """
+    from_start, from_end = depths
+    middle = {
+        tile
+        for tile, depth in from_start.items()
+        if depth == start_level and from_end.get(tile) == length - start_level
+    }
+    on_path = set(middle)
+    layer = middle
+    for depth in range(start_level, 0, -1):
+        layer = {neighbor for tile in layer for neighbor in adjacency[tile] if from_start.get(neighbor) == depth - 1}
+        on_path |= layer
+    layer = middle
+    for depth in range(start_level + 1, length + 1):
+        layer = {neighbor for tile in layer for neighbor in adjacency[tile] if from_end.get(neighbor) == length - depth}
+        on_path |= layer
+
     parents = {start: -1}
     queue = deque([start])
-    found = False
     while queue:
         current = queue.popleft()
         if current == end:
-            found = True
             break
         for neighbor in adjacency[current]:
-            if neighbor in parents:
-                continue
-            parents[neighbor] = current
-            queue.append(neighbor)
+            if neighbor in on_path and neighbor not in parents:
+                parents[neighbor] = current
+                queue.append(neighbor)
 
-    if not found:
-        path_cache[(start, end)] = None
-        return None
+    path = [end]
+    while path[-1] != start:
+        path.append(parents[path[-1]])
+    path.reverse()
+    return tuple(path)
 
-    path_nodes = [end]
-    while path_nodes[-1] != start:
-        path_nodes.append(parents[path_nodes[-1]])
-    path_nodes.reverse()
 
-    path = tuple(path_nodes)
-    reverse_path = tuple(reversed(path))
-    path_cache[(start, end)] = path
-    path_cache[(end, start)] = reverse_path
-    return path
+def densify_line(line: Sequence[LonLat], max_segment_km: float) -> List[LonLat]:
+    lons, lats = unit_vectors_to_lonlat(densify_line_vectors(line, max_segment_km))
+    return [(float(lon), float(lat)) for lon, lat in zip(lons, lats)]
 
 
-def densify_line(line: Sequence[LonLat], max_segment_km: float) -> List[LonLat]:
+def densify_line_vectors(line: Sequence[LonLat], max_segment_km: float) -> np.ndarray:
+    """Return unit vectors along the great-circle path through `line`, at most `max_segment_km` apart."""
+    vectors = lonlat_to_unit_vectors([p[0] for p in line], [p[1] for p in line]).reshape(-1, 3)
     if len(line) < 2 or max_segment_km <= 0:
-        return list(line)
-
-    densified: List[LonLat] = [line[0]]
-    for (lon1, lat1), (lon2, lat2) in zip(line, line[1:]):
-        segment_km = haversine_km(lat1, lon1, lat2, lon2)
-        steps = max(1, int(np.ceil(segment_km / max_segment_km)))
-        lon2_unwrapped = _unwrap_lon_delta(lon1, lon2)
-        for step in range(1, steps + 1):
-            t = step / steps
-            lon = wrap_longitude(lon1 + (lon2_unwrapped - lon1) * t)
-            lat = lat1 + (lat2 - lat1) * t
-            densified.append((lon, lat))
-    return densified
-
-
-def _unwrap_lon_delta(lon_from: float, lon_to: float) -> float:
-    delta = lon_to - lon_from
-    if delta > 180.0:
-        return lon_to - 360.0
-    if delta < -180.0:
-        return lon_to + 360.0
-    return lon_to
+        return vectors
+
+    starts, ends = vectors[:-1], vectors[1:]
+    angles = np.arctan2(np.linalg.norm(np.cross(starts, ends), axis=1), np.einsum("ij,ij->i", starts, ends))
+    steps = np.maximum(1, np.ceil(angles * EARTH_RADIUS_KM / max_segment_km)).astype(np.int64)
+
+    segment = np.repeat(np.arange(len(steps)), steps)
+    step = np.arange(int(steps.sum())) - np.repeat(np.cumsum(steps) - steps, steps) + 1
+    t = step / steps[segment]
+    theta = angles[segment]
+    sin_theta = np.sin(theta)
+    # Slerp; nearly coincident (or antipodal) endpoints fall back to normalized lerp.
+    small = sin_theta < 1e-12
+    safe = np.where(small, 1.0, sin_theta)
+    w_start = np.where(small, 1.0 - t, np.sin((1.0 - t) * theta) / safe)
+    w_end = np.where(small, t, np.sin(t * theta) / safe)
+    points = w_start[:, None] * starts[segment] + w_end[:, None] * ends[segment]
+    norms = np.linalg.norm(points, axis=1, keepdims=True)
+    points = np.where(norms > 1e-12, points / np.maximum(norms, 1e-300), starts[segment])
+    last = step == steps[segment]
+    points[last] = ends[segment[last]]
+    return np.vstack((vectors[:1], points))
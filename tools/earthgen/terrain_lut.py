@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Lookup-table terrain classifier compiled from declarative climate rules.
+
+Rules are threshold comparisons on (temperature, precipitation, elevation, |latitude|).
+Every threshold becomes a bin edge, so each bin has a single outcome and classifying a
+tile is one table gather.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from tools.earthgen.jsonc import parse_jsonc_file
+from tools.earthgen.terrain_rules_gnk import (
+    BASE_TERRAIN_CODES,
+    FEATURE_BITS,
+    LAND_BASE_TERRAINS,
+    ClimateSample,
+    _default_precip,
+    _default_temperature,
+    classify_base_terrain,
+    classify_features,
+)
+
+
+DEFAULT_TERRAIN_RULES_PATH = Path("tools/earthgen/terrain_rules_gnk.yaml")
+RULE_VARIABLES = ("temperature_c", "annual_precip_mm", "elevation_m", "abs_latitude")
+RULE_OPERATORS = (">=", ">", "<=", "<")
+# Surface axis of the lookup table; lakes take precedence over the land mask like classify_base_terrain.
+SURFACE_OCEAN = 0
+SURFACE_LAKE = 1
+SURFACE_LAND = 2
+
+Condition = Tuple[str, str, float]
+Clause = Tuple[Condition, ...]
+Outcome = Tuple[str, Tuple[str, ...]]
+
+
+@dataclass(frozen=True)
+class BaseTerrainRule:
+    terrain: str
+    when: Tuple[Clause, ...]
+
+
+@dataclass(frozen=True)
+class FeatureRule:
+    feature: str
+    on: Tuple[str, ...]
+    when: Tuple[Clause, ...]
+    group: str | None
+
+
+@dataclass(frozen=True)
+class TerrainRuleSet:
+    base_rules: Tuple[BaseTerrainRule, ...]
+    feature_rules: Tuple[FeatureRule, ...]
+
+    def thresholds(self) -> Dict[str, List[Tuple[str, float]]]:
+        found: Dict[str, List[Tuple[str, float]]] = {variable: [] for variable in RULE_VARIABLES}
+        clauses = [c for rule in self.base_rules for c in rule.when] + [c for rule in self.feature_rules for c in rule.when]
+        for clause in clauses:
+            for variable, op, threshold in clause:
+                if (op, threshold) not in found[variable]:
+                    found[variable].append((op, threshold))
+        return found
+
+    def evaluate(self, sample: ClimateSample) -> Outcome:
+        values = _resolved_values(sample)
+        if sample.is_lake:
+            base = "Lakes"
+        elif not sample.is_land:
+            base = "Ocean"
+        else:
+            base = next((rule.terrain for rule in self.base_rules if _matches(rule.when, values)), "Grassland")
+
+        features: List[str] = []
+        used_groups = set()
+        for rule in self.feature_rules:
+            if base not in rule.on or (rule.group is not None and rule.group in used_groups):
+                continue
+            if _matches(rule.when, values):
+                features.append(rule.feature)
+                if rule.group is not None:
+                    used_groups.add(rule.group)
+        return base, tuple(features)
+
+
+def _resolved_values(sample: ClimateSample) -> Dict[str, float]:
+    return {
+        "temperature_c": sample.temperature_c if sample.temperature_c is not None else _default_temperature(sample.latitude),
+        "annual_precip_mm": (
+            sample.annual_precip_mm if sample.annual_precip_mm is not None else _default_precip(sample.latitude)
+        ),
+        "elevation_m": sample.elevation_m if sample.elevation_m is not None else 0.0,
+        "abs_latitude": abs(sample.latitude),
+    }
+
+
+def _compare(value: float, op: str, threshold: float) -> bool:
+    if op == ">=":
+        return value >= threshold
+    if op == ">":
+        return value > threshold
+    if op == "<=":
+        return value <= threshold
+    return value < threshold
+
+
+def _matches(when: Sequence[Clause], values: Mapping[str, float]) -> bool:
+    if not when:
+        return True
+    return any(all(_compare(values[variable], op, threshold) for variable, op, threshold in clause) for clause in when)
+
+
+def _parse_clause(raw: Mapping[str, Any], context: str) -> Clause:
+    conditions: List[Condition] = []
+    for variable, spec in raw.items():
+        if variable not in RULE_VARIABLES:
+            raise ValueError(f"{context} references unknown variable: {variable}")
+        pairs = [spec] if spec and isinstance(spec[0], str) else list(spec)
+        for pair in pairs:
+            op, threshold = str(pair[0]), float(pair[1])
+            if op not in RULE_OPERATORS:
+                raise ValueError(f"{context} uses unsupported operator: {op}")
+            conditions.append((str(variable), op, threshold))
+    return tuple(conditions)
+
+
+def _parse_when(raw: Any, context: str) -> Tuple[Clause, ...]:
+    if raw is None:
+        return tuple()
+    if not isinstance(raw, list):
+        raise ValueError(f"{context} field 'when' must be a list of condition objects")
+    return tuple(_parse_clause(clause, context) for clause in raw)
+
+
+def parse_terrain_rules(raw: Mapping[str, Any]) -> TerrainRuleSet:
+    base_rules: List[BaseTerrainRule] = []
+    for entry in raw.get("base_terrain", []):
+        terrain = str(entry["terrain"])
+        if terrain not in LAND_BASE_TERRAINS:
+            raise ValueError(f"Terrain rule produces unsupported land base terrain: {terrain}")
+        base_rules.append(BaseTerrainRule(terrain=terrain, when=_parse_when(entry.get("when"), f"Terrain rule {terrain}")))
+    if not base_rules:
+        raise ValueError("Terrain rules must define at least one base_terrain rule")
+
+    feature_rules: List[FeatureRule] = []
+    for entry in raw.get("features", []):
+        feature = str(entry["feature"])
+        if feature not in FEATURE_BITS:
+            raise ValueError(f"Feature rule produces unknown feature: {feature}")
+        on = tuple(str(v) for v in entry.get("on", []))
+        for base in on:
+            if base not in BASE_TERRAIN_CODES:
+                raise ValueError(f"Feature rule {feature} references unknown base terrain: {base}")
+        group = entry.get("group")
+        feature_rules.append(
+            FeatureRule(
+                feature=feature,
+                on=on,
+                when=_parse_when(entry.get("when"), f"Feature rule {feature}"),
+                group=str(group) if group is not None else None,
+            )
+        )
+    return TerrainRuleSet(base_rules=tuple(base_rules), feature_rules=tuple(feature_rules))
+
+
+def load_terrain_rules(path: Path = DEFAULT_TERRAIN_RULES_PATH) -> TerrainRuleSet:
+    raw = parse_jsonc_file(path)
+    if not isinstance(raw, dict):
+        raise ValueError(f"Terrain rules must be a mapping: {path}")
+    return parse_terrain_rules(raw)
+
+
+def _bin_edges(thresholds: Sequence[Tuple[str, float]]) -> np.ndarray:
+    # Bins are [edge_i, edge_i+1); "<=" and ">" split just above the threshold so it lands in the lower bin.
+    edges = {
+        float(np.nextafter(threshold, np.inf)) if op in ("<=", ">") else float(threshold)
+        for op, threshold in thresholds
+    }
+    return np.array(sorted(edges), dtype=np.float64)
+
+
+def _bin_representatives(edges: np.ndarray) -> np.ndarray:
+    if edges.size == 0:
+        return np.zeros(1, dtype=np.float64)
+    return np.concatenate(([edges[0] - 1.0], edges))
+
+
+@dataclass(frozen=True)
+class TerrainLookupTable:
+    rules: TerrainRuleSet
+    edges: Tuple[np.ndarray, ...]
+    table: np.ndarray
+    outcomes: Tuple[Outcome, ...]
+
+    def bin_indices(
+        self,
+        latitude: np.ndarray,
+        temperature_c: np.ndarray,
+        annual_precip_mm: np.ndarray,
+        elevation_m: np.ndarray,
+    ) -> Tuple[np.ndarray, ...]:
+        latitude = np.asarray(latitude, dtype=np.float64)
+        temperature_c = _fill_missing(temperature_c, latitude, _default_temperature)
+        annual_precip_mm = _fill_missing(annual_precip_mm, latitude, _default_precip)
+        elevation_m = np.nan_to_num(np.asarray(elevation_m, dtype=np.float64), nan=0.0)
+        values = (temperature_c, annual_precip_mm, elevation_m, np.abs(latitude))
+        return tuple(np.searchsorted(edges, axis_values, side="right") for edges, axis_values in zip(self.edges, values))
+
+    def classify(
+        self,
+        is_land: np.ndarray,
+        is_lake: np.ndarray,
+        latitude: np.ndarray,
+        temperature_c: np.ndarray,
+        annual_precip_mm: np.ndarray,
+        elevation_m: np.ndarray,
+    ) -> np.ndarray:
+        """Return outcome ids (indices into `outcomes`); missing climate values are NaN."""
+        surface = np.where(np.asarray(is_lake, dtype=bool), SURFACE_LAKE, np.where(np.asarray(is_land, dtype=bool), SURFACE_LAND, SURFACE_OCEAN))
+        bins = self.bin_indices(latitude, temperature_c, annual_precip_mm, elevation_m)
+        return self.table[(surface,) + bins]
+
+
+def _fill_missing(values: np.ndarray, latitude: np.ndarray, fallback: Callable[[float], float]) -> np.ndarray:
+    filled = np.asarray(values, dtype=np.float64).copy()
+    missing = np.flatnonzero(np.isnan(filled))
+    for i in missing:
+        filled[i] = fallback(float(latitude[i]))
+    return filled
+
+
+def compile_terrain_lut(rules: TerrainRuleSet) -> TerrainLookupTable:
+    thresholds = rules.thresholds()
+    edges = tuple(_bin_edges(thresholds[variable]) for variable in RULE_VARIABLES)
+    representatives = [_bin_representatives(axis_edges) for axis_edges in edges]
+
+    outcome_ids: Dict[Outcome, int] = {}
+    table = np.zeros((3,) + tuple(len(r) for r in representatives), dtype=np.int32)
+    for surface in (SURFACE_OCEAN, SURFACE_LAKE, SURFACE_LAND):
+        for bins in itertools.product(*(range(len(r)) for r in representatives)):
+            temp, precip, elev, abs_lat = (representatives[axis][b] for axis, b in enumerate(bins))
+            sample = ClimateSample(
+                is_land=surface == SURFACE_LAND,
+                is_lake=surface == SURFACE_LAKE,
+                latitude=float(abs_lat),
+                temperature_c=float(temp),
+                annual_precip_mm=float(precip),
+                elevation_m=float(elev),
+            )
+            outcome = rules.evaluate(sample)
+            table[(surface,) + bins] = outcome_ids.setdefault(outcome, len(outcome_ids))
+
+    outcomes = tuple(sorted(outcome_ids, key=outcome_ids.__getitem__))
+    return TerrainLookupTable(rules=rules, edges=edges, table=table, outcomes=outcomes)
+
+
+def gnk_reference(sample: ClimateSample) -> Outcome:
+    base = classify_base_terrain(sample)
+    return base, tuple(classify_features(sample, base))
+
+
+@dataclass(frozen=True)
+class LutParityReport:
+    thresholds: Dict[str, Tuple[float, ...]]
+    edges: Dict[str, Tuple[float, ...]]
+    boundary_checks: int
+    random_checks: int
+    mismatches: Tuple[Tuple[ClimateSample, Outcome, Outcome], ...]
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+    def summary(self) -> str:
+        lines = []
+        for variable in RULE_VARIABLES:
+            lines.append(
+                f"{variable}: thresholds={list(self.thresholds[variable])} edges={[float(e) for e in self.edges[variable]]}"
+            )
+        lines.append(
+            f"boundary_checks={self.boundary_checks} random_checks={self.random_checks} mismatches={len(self.mismatches)}"
+        )
+        for sample, expected, actual in self.mismatches[:10]:
+            lines.append(f"  mismatch {sample}: reference={expected} lut={actual}")
+        return "\n".join(lines)
+
+
+def lut_parity_report(
+    lut: TerrainLookupTable,
+    reference: Callable[[ClimateSample], Outcome] = gnk_reference,
+    random_samples: int = 5000,
+    seed: int = 0,
+) -> LutParityReport:
+    """Compare the LUT against a reference classifier on both sides of every bin edge and at random points."""
+    samples: List[ClimateSample] = []
+    representatives = [_bin_representatives(axis_edges) for axis_edges in lut.edges]
+    for axis, axis_edges in enumerate(lut.edges):
+        probes = [value for edge in axis_edges for value in (float(np.nextafter(edge, -np.inf)), float(edge))]
+        others = [representatives[i] if i != axis else np.array(probes) for i in range(len(RULE_VARIABLES))]
+        for temp, precip, elev, abs_lat in itertools.product(*others):
+            for is_land, is_lake in ((True, False), (False, False), (False, True)):
+                samples.append(ClimateSample(is_land, is_lake, float(abs_lat), float(temp), float(precip), float(elev)))
+    boundary_checks = len(samples)
+
+    rng = np.random.default_rng(seed)
+    for _ in range(random_samples):
+        samples.append(
+            ClimateSample(
+                is_land=bool(rng.random() < 0.8),
+                is_lake=bool(rng.random() < 0.05),
+                latitude=float(rng.uniform(-90.0, 90.0)),
+                temperature_c=float(rng.uniform(-40.0, 40.0)) if rng.random() > 0.05 else None,
+                annual_precip_mm=float(rng.uniform(0.0, 4000.0)) if rng.random() > 0.05 else None,
+                elevation_m=float(rng.uniform(-400.0, 6000.0)) if rng.random() > 0.05 else None,
+            )
+        )
+
+    def column(getter: Callable[[ClimateSample], float | None]) -> np.ndarray:
+        return np.array([np.nan if getter(s) is None else getter(s) for s in samples], dtype=np.float64)
+
+    ids = lut.classify(
+        is_land=np.array([s.is_land for s in samples]),
+        is_lake=np.array([s.is_lake for s in samples]),
+        latitude=np.array([s.latitude for s in samples], dtype=np.float64),
+        temperature_c=column(lambda s: s.temperature_c),
+        annual_precip_mm=column(lambda s: s.annual_precip_mm),
+        elevation_m=column(lambda s: s.elevation_m),
+    )
+    mismatches = []
+    for sample, outcome_id in zip(samples, ids):
+        expected = reference(sample)
+        actual = lut.outcomes[int(outcome_id)]
+        if expected != actual:
+            mismatches.append((sample, expected, actual))
+
+    thresholds = lut.rules.thresholds()
+    return LutParityReport(
+        thresholds={v: tuple(sorted({t for _, t in thresholds[v]})) for v in RULE_VARIABLES},
+        edges={v: tuple(float(e) for e in edges) for v, edges in zip(RULE_VARIABLES, lut.edges)},
+        boundary_checks=boundary_checks,
+        random_checks=random_samples,
+        mismatches=tuple(mismatches),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile terrain rules into a lookup table and check parity")
+    parser.add_argument("--rules", default=str(DEFAULT_TERRAIN_RULES_PATH), help="Terrain rule file (JSON-in-YAML format)")
+    parser.add_argument(
+        "--reference",
+        choices=("gnk", "rules"),
+        default="gnk",
+        help="Compare against the built-in G&K Python rules or the rule file interpreter (default: gnk)",
+    )
+    parser.add_argument("--random-samples", type=int, default=5000, help="Random climate samples to compare")
+    args = parser.parse_args()
+
+    rules = load_terrain_rules(Path(args.rules))
+    lut = compile_terrain_lut(rules)
+    reference = gnk_reference if args.reference == "gnk" else rules.evaluate
+    report = lut_parity_report(lut, reference=reference, random_samples=int(args.random_samples))
+    print(f"LUT shape={lut.table.shape} outcomes={len(lut.outcomes)}")
+    print(report.summary())
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,6 +7,12 @@ from typing import List
 LAND_BASE_TERRAINS = {"Desert", "Plains", "Grassland", "Tundra", "Snow", "Mountain"}
 WATER_BASE_TERRAINS = {"Ocean", "Coast", "Lakes"}
 
+# Stable integer encodings for array-based passes over classified tiles.
+BASE_TERRAIN_ORDER = ("Ocean", "Coast", "Lakes", "Grassland", "Plains", "Desert", "Tundra", "Snow", "Mountain")
+FEATURE_ORDER = ("Hill", "Forest", "Jungle", "Marsh", "Ice")
+BASE_TERRAIN_CODES = {name: code for code, name in enumerate(BASE_TERRAIN_ORDER)}
+FEATURE_BITS = {name: 1 << bit for bit, name in enumerate(FEATURE_ORDER)}
+
 
 @dataclass(frozen=True)
 class ClimateSample:
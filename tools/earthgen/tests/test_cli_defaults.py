@@ -1,5 +1,7 @@
 import sys
 
+import pytest
+
 from tools.earthgen import generate_unciv_earth_map
 
 
@@ -17,6 +19,7 @@ def test_generate_cli_defaults_include_topology_pole_alignment(monkeypatch):
     assert args.enable_resources is True
     assert args.resource_density == "default"
     assert args.resource_seed == 1337
+    assert args.river_max_path_hops == 0
 
 
 def test_generate_cli_accepts_disable_resources_flag(monkeypatch):
@@ -47,3 +50,47 @@ def test_generate_cli_can_disable_topology_auto_generation(monkeypatch):
     )
     args = generate_unciv_earth_map.parse_args()
     assert args.auto_generate_topology is False
+
+
+def test_natural_earth_river_option_defaults_match_cli(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["generate_unciv_earth_map.py", "--output", "android/assets/maps/Earth-Icosa-Test"])
+    args = generate_unciv_earth_map.parse_args()
+    for _, name, default in generate_unciv_earth_map.NATURAL_EARTH_RIVER_OPTIONS:
+        assert getattr(args, name) == default
+
+
+def test_flow_river_source_rejects_natural_earth_options(monkeypatch):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "generate_unciv_earth_map.py",
+            "--output",
+            "android/assets/maps/Earth-Icosa-Test",
+            "--river-source",
+            "flow",
+            "--river-count",
+            "5",
+            "--river-workers",
+            "2",
+        ],
+    )
+    with pytest.raises(ValueError, match="--river-count, --river-workers"):
+        generate_unciv_earth_map.main()
+
+
+def test_resource_variants_require_resources(monkeypatch):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "generate_unciv_earth_map.py",
+            "--output",
+            "android/assets/maps/Earth-Icosa-Test",
+            "--disable-resources",
+            "--resource-variants",
+            "1:default",
+        ],
+    )
+    with pytest.raises(ValueError, match="--resource-variants requires --enable-resources"):
+        generate_unciv_earth_map.main()
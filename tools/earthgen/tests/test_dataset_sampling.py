@@ -4,7 +4,13 @@ import unittest
 
 import numpy as np
 
-from tools.earthgen.dataset_sampling import EarthDatasets, GeoRaster, _polygon_shape_from_coords
+from tools.earthgen.dataset_sampling import (
+    EarthDatasets,
+    GeoRaster,
+    _polygon_shape_from_coords,
+    geodesic_polyline_length_km,
+    polyline_lengths_km,
+)
 
 
 class DatasetSamplingTests(unittest.TestCase):
@@ -79,6 +85,37 @@ class DatasetSamplingTests(unittest.TestCase):
         self.assertEqual(25.0, datasets.sample_temperature(0.1, 0.1))
         self.assertEqual(100.0, datasets.sample_precipitation(0.1, 0.1))
 
+    def test_monthly_batch_aggregates_match_scalar(self) -> None:
+        def single(value: float) -> GeoRaster:
+            return GeoRaster(
+                data=np.array([[value, 4.0]], dtype=np.float32),
+                nodata=None,
+                width=2,
+                height=1,
+                origin_lon=0.0,
+                origin_lat=1.0,
+                pixel_lon=1.0,
+                pixel_lat=1.0,
+            )
+
+        datasets = EarthDatasets(
+            land_polygons=[],
+            lake_polygons=[],
+            river_lines=[],
+            elevation=single(-32768.0),
+            monthly_temperature=[single(-32768.0), single(21.5), single(18.25)],
+            monthly_precipitation=[single(-32768.0), single(-32768.0)],
+        )
+        lons = np.array([0.2, 1.2])
+        lats = np.array([0.5, 0.5])
+
+        self.assertEqual([19.875, 4.0], datasets.sample_temperature_batch(lons, lats).tolist())
+        self.assertEqual(datasets.sample_temperature(0.2, 0.5), datasets.sample_temperature_batch(lons, lats)[0])
+        precip = datasets.sample_precipitation_batch(lons, lats)
+        self.assertTrue(np.isnan(precip[0]))
+        self.assertEqual(8.0, precip[1])
+        self.assertTrue(np.isnan(datasets.sample_elevation_batch(lons, lats)[0]))
+
     def test_polygon_contains_handles_antimeridian_crossing(self) -> None:
         # Rectangle from lon 170..-170 (crosses antimeridian), lat -10..10.
         shape = _polygon_shape_from_coords(
@@ -98,6 +135,88 @@ class DatasetSamplingTests(unittest.TestCase):
         self.assertTrue(shape.contains(-179.0, 0.0))
         self.assertFalse(shape.contains(0.0, 0.0))
 
+    def test_bilinear_interpolates_between_pixel_centers(self) -> None:
+        raster = GeoRaster(
+            data=np.array([[0.0, 10.0], [20.0, 30.0]], dtype=np.float32),
+            nodata=None,
+            width=2,
+            height=2,
+            origin_lon=0.0,
+            origin_lat=2.0,
+            pixel_lon=1.0,
+            pixel_lat=1.0,
+        )
+        self.assertEqual(0.0, raster.sample(0.5, 1.5, interpolation="bilinear"))
+        self.assertAlmostEqual(15.0, raster.sample(1.0, 1.0, interpolation="bilinear"))
+        self.assertAlmostEqual(5.0, raster.sample(1.0, 1.5, interpolation="bilinear"))
+
+    def test_bilinear_wraps_across_antimeridian(self) -> None:
+        raster = GeoRaster(
+            data=np.array([[100.0, 0.0, 0.0, 200.0]], dtype=np.float32),
+            nodata=None,
+            width=4,
+            height=1,
+            origin_lon=-180.0,
+            origin_lat=90.0,
+            pixel_lon=90.0,
+            pixel_lat=180.0,
+        )
+        # Halfway between the last (135E) and first (135W) pixel centers.
+        self.assertAlmostEqual(150.0, raster.sample(180.0, 0.0, interpolation="bilinear"))
+        self.assertAlmostEqual(150.0, raster.sample(-180.0, 0.0, interpolation="bilinear"))
+
+    def test_bilinear_ignores_nodata_neighbors(self) -> None:
+        raster = GeoRaster(
+            data=np.array([[-32768.0, 10.0], [-3.4e38, 30.0]], dtype=np.float32),
+            nodata=None,
+            width=2,
+            height=2,
+            origin_lon=0.0,
+            origin_lat=2.0,
+            pixel_lon=1.0,
+            pixel_lat=1.0,
+        )
+        self.assertAlmostEqual(20.0, raster.sample(1.0, 1.0, interpolation="bilinear"))
+        self.assertIsNone(raster.sample(0.5, 1.5, interpolation="bilinear"))
+
+    def test_batched_sampling_matches_scalar_path(self) -> None:
+        rng = np.random.default_rng(7)
+        data = rng.uniform(-5.0, 30.0, size=(18, 36)).astype(np.float32)
+        data[3, 4] = -32768.0
+        raster = GeoRaster(
+            data=data,
+            nodata=None,
+            width=36,
+            height=18,
+            origin_lon=-180.0,
+            origin_lat=90.0,
+            pixel_lon=10.0,
+            pixel_lat=10.0,
+        )
+        lons = rng.uniform(-200.0, 200.0, size=200)
+        lats = rng.uniform(-90.0, 90.0, size=200)
+        for mode in ("nearest", "bilinear"):
+            with self.subTest(mode=mode):
+                batch = raster.sample_batch(lons, lats, interpolation=mode)
+                for lon, lat, value in zip(lons, lats, batch):
+                    scalar = raster.sample(float(lon), float(lat), interpolation=mode)
+                    if scalar is None:
+                        self.assertTrue(np.isnan(value))
+                    else:
+                        self.assertEqual(scalar, float(value))
+
+        with self.assertRaises(ValueError):
+            raster.sample(0.0, 0.0, interpolation="cubic")
+
+    def test_polyline_lengths_match_per_line_haversine(self) -> None:
+        rng = np.random.default_rng(11)
+        lines = [
+            [(float(lon), float(lat)) for lon, lat in zip(rng.uniform(-180, 180, n), rng.uniform(-89, 89, n))]
+            for n in (0, 1, 2, 5, 1, 9, 3)
+        ]
+        expected = [geodesic_polyline_length_km(line) for line in lines]
+        np.testing.assert_allclose(expected, polyline_lengths_km(lines), rtol=1e-12, atol=1e-9)
+
 
 if __name__ == "__main__":
     unittest.main()
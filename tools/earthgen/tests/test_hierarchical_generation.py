@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools.earthgen.generate_unciv_earth_map import (
+    EarthAlignment,
+    classification_cache_key,
+    classify_tiles,
+    classify_tiles_hierarchical,
+    load_cached_classification,
+    save_cached_classification,
+)
+from tools.earthgen.topology_io import TopologyDump, TopologyTile
+
+
+def grid_topology(rows: int, cols: int) -> TopologyDump:
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            neighbors = [row * cols + (col - 1) % cols, row * cols + (col + 1) % cols]
+            if row > 0:
+                neighbors.append((row - 1) * cols + col)
+            if row < rows - 1:
+                neighbors.append((row + 1) * cols + col)
+            # Stay clear of the polar ice belts so only the continent is heterogeneous.
+            lat = -60.0 + (row + 0.5) * 120.0 / rows
+            lon = -180.0 + (col + 0.5) * 360.0 / cols
+            tiles.append(TopologyTile(row * cols + col, col, row, lat, lon, tuple(sorted(neighbors))))
+    return TopologyDump(
+        frequency=rows,
+        layout_id="IcosaNetV2",
+        tile_count=len(tiles),
+        ruleset="Civ V - Gods & Kings",
+        tiles=tuple(tiles),
+        edges=tuple(),
+        map_parameters_template={},
+    )
+
+
+class ContinentDatasets:
+    def __init__(self) -> None:
+        self.land_queries = 0
+
+    def point_on_land(self, lon: float, lat: float) -> bool:
+        self.land_queries += 1
+        return 0.0 <= lon <= 90.0 and -30.0 <= lat <= 30.0
+
+    def point_in_lake(self, lon: float, lat: float) -> bool:
+        return False
+
+    def sample_elevation(self, lon: float, lat: float) -> float:
+        return 2000.0 if lon > 60.0 else 200.0
+
+    def sample_temperature(self, lon: float, lat: float) -> float:
+        return 22.0
+
+    def sample_precipitation(self, lon: float, lat: float) -> float:
+        return 1000.0
+
+
+class HierarchicalGenerationTests(unittest.TestCase):
+    def test_hierarchical_matches_full_classification_with_fewer_samples(self) -> None:
+        coarse = grid_topology(12, 24)
+        fine = grid_topology(36, 72)
+
+        full_datasets = ContinentDatasets()
+        full = classify_tiles(fine, cache_dir=Path("."), alignment=EarthAlignment(), datasets=full_datasets)  # type: ignore[arg-type]
+
+        hier_datasets = ContinentDatasets()
+        hierarchical = classify_tiles_hierarchical(
+            fine,
+            coarse,
+            cache_dir=Path("."),
+            alignment=EarthAlignment(),
+            datasets=hier_datasets,  # type: ignore[arg-type]
+        )
+
+        self.assertEqual(
+            [(t.base_terrain, t.features) for t in full],
+            [(t.base_terrain, t.features) for t in hierarchical],
+        )
+        self.assertEqual({"Ocean", "Coast", "Grassland"}, {t.base_terrain for t in hierarchical})
+        # Coarse pass plus the refined fine tiles stay well below sampling every fine tile.
+        self.assertLess(hier_datasets.land_queries, full_datasets.land_queries // 2)
+
+    def test_coast_flipped_inherited_tiles_are_resampled(self) -> None:
+        class RoundContinentWithoutClimate(ContinentDatasets):
+            def point_on_land(self, lon: float, lat: float) -> bool:
+                return (lon - 40.0) ** 2 + lat**2 < 33.0**2
+
+            def sample_temperature(self, lon: float, lat: float) -> None:
+                return None
+
+            def sample_precipitation(self, lon: float, lat: float) -> None:
+                return None
+
+        topology = grid_topology(12, 24)
+        options = dict(cache_dir=Path("."), alignment=EarthAlignment(), coast_supersample=8, coast_land_threshold=0.3)
+        center_only = classify_tiles(topology, cache_dir=Path("."), alignment=EarthAlignment(), datasets=RoundContinentWithoutClimate())  # type: ignore[arg-type]
+        full = classify_tiles(topology, datasets=RoundContinentWithoutClimate(), **options)  # type: ignore[arg-type]
+        inherited = classify_tiles(
+            topology,
+            datasets=RoundContinentWithoutClimate(),  # type: ignore[arg-type]
+            inherited={tile.index: tile for tile in center_only},
+            **options,
+        )
+
+        flipped = [i for i, (a, b) in enumerate(zip(center_only, full)) if a.base_terrain != b.base_terrain]
+        self.assertTrue(flipped)
+        # Missing climate falls back to latitude defaults instead of the stored 0.0 placeholders.
+        self.assertEqual(full, inherited)
+
+    def test_inherited_tiles_keep_fine_coordinates(self) -> None:
+        coarse = grid_topology(6, 12)
+        fine = grid_topology(12, 24)
+        tiles = classify_tiles_hierarchical(
+            fine,
+            coarse,
+            cache_dir=Path("."),
+            alignment=EarthAlignment(),
+            datasets=ContinentDatasets(),  # type: ignore[arg-type]
+            refine_margin=0,
+        )
+        for tile, source in zip(tiles, fine.tiles):
+            self.assertEqual(source.latitude, tile.latitude)
+            self.assertEqual(source.longitude, tile.longitude)
+
+
+class ClassificationCacheTests(unittest.TestCase):
+    def test_cached_classification_round_trips_and_checks_key(self) -> None:
+        topology = grid_topology(6, 12)
+        tiles = classify_tiles(
+            topology, cache_dir=Path("."), alignment=EarthAlignment(), datasets=ContinentDatasets()  # type: ignore[arg-type]
+        )
+        coordinates = [(tile.longitude, tile.latitude) for tile in topology.tiles]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = Path(tmp)
+            key = classification_cache_key(topology, coordinates, cache_dir, {"coast_supersample": 0})
+            cache_path = cache_dir / "classification.json"
+            save_cached_classification(cache_path, key, tiles)
+
+            self.assertEqual(tiles, load_cached_classification(cache_path, key, topology))
+            other_key = classification_cache_key(topology, coordinates, cache_dir, {"coast_supersample": 4})
+            self.assertNotEqual(key, other_key)
+            self.assertIsNone(load_cached_classification(cache_path, other_key, topology))
+
+            # Refetching a dataset changes its size/mtime and invalidates the cache key.
+            (cache_dir / "ne_110m_land.json").write_text("{}", encoding="utf-8")
+            self.assertNotEqual(key, classification_cache_key(topology, coordinates, cache_dir, {"coast_supersample": 0}))
+
+    def test_cache_key_depends_on_coarse_topology(self) -> None:
+        topology = grid_topology(6, 12)
+        coordinates = [(tile.longitude, tile.latitude) for tile in topology.tiles]
+        options = {"hierarchical_coarse_frequency": 2}
+        keys = {
+            classification_cache_key(topology, coordinates, Path("."), options, coarse_topology=coarse)
+            for coarse in (None, grid_topology(3, 6), grid_topology(2, 12))
+        }
+        self.assertEqual(3, len(keys))
+
+
+if __name__ == "__main__":
+    unittest.main()
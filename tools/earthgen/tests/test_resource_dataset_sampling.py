@@ -1,11 +1,43 @@
 from __future__ import annotations
 
 import unittest
+from collections import deque
 from types import SimpleNamespace
 
+import numpy as np
+
 from tools.earthgen.fetch_datasets import DEFAULT_DATASETS
-from tools.earthgen.resource_dataset_sampling import build_resource_dataset_layers, metric_value
-from tools.earthgen.topology_io import TopologyDump, TopologyEdge, TopologyTile
+from tools.earthgen.resource_dataset_sampling import (
+    METRIC_INDEX,
+    METRIC_NAMES,
+    UNREACHED_DISTANCE,
+    DistanceFieldSpec,
+    _bfs_distance_fields,
+    _bfs_distances,
+    build_resource_dataset_layers,
+    metric_value,
+)
+from tools.earthgen.tests.test_river_projection import river_grid_topology
+from tools.earthgen.topology_io import TopologyDump, TopologyEdge, TopologyTile, neighbor_csr
+
+
+def _queue_distances(topology, seeds, passable_mask, max_distance) -> list[int]:
+    distances = [UNREACHED_DISTANCE] * topology.tile_count
+    queue = deque()
+    for seed in seeds:
+        distances[seed] = 0
+        queue.append(seed)
+    while queue:
+        node = queue.popleft()
+        if distances[node] >= max_distance:
+            continue
+        for neighbor in topology.tiles[node].neighbors:
+            if passable_mask is not None and not passable_mask[neighbor]:
+                continue
+            if distances[node] + 1 < distances[neighbor]:
+                distances[neighbor] = distances[node] + 1
+                queue.append(neighbor)
+    return distances
 
 
 class ResourceDatasetSamplingTests(unittest.TestCase):
@@ -44,6 +76,58 @@ class ResourceDatasetSamplingTests(unittest.TestCase):
         self.assertGreater(metric_value("river_proximity", 0, layers), 0.8)
         self.assertGreater(metric_value("coast_proximity", 1, layers), 0.8)
 
+        matrix = layers.metric_matrix
+        self.assertEqual((len(METRIC_NAMES), 3), matrix.shape)
+        self.assertIs(matrix, layers.metric_matrix)
+        self.assertEqual([1.0, 1.0, 0.0], matrix[METRIC_INDEX["land"]].tolist())
+        self.assertAlmostEqual((20.0 + 20.0) / 55.0, metric_value("warmth", 0, layers))
+        self.assertEqual(0.0, metric_value("no_such_metric", 0, layers))
+
+    def test_layer_builder_slope_statistics_and_unknown_river_edges(self) -> None:
+        tiles = (
+            TopologyTile(index=0, x=0, y=0, latitude=10, longitude=10, neighbors=(1, 2)),
+            TopologyTile(index=1, x=1, y=0, latitude=10, longitude=20, neighbors=(0, 2)),
+            TopologyTile(index=2, x=0, y=1, latitude=5, longitude=15, neighbors=(0, 1)),
+        )
+        topology = TopologyDump(
+            frequency=1,
+            layout_id="IcosaNetV2",
+            tile_count=3,
+            ruleset="Civ V - Gods & Kings",
+            tiles=tiles,
+            edges=(TopologyEdge(a=0, b=1, representable=True, writer=None),),
+            map_parameters_template={},
+        )
+        classified = [
+            SimpleNamespace(index=i, latitude=tile.latitude, longitude=tile.longitude, base_terrain="Grassland", features=[], temperature_c=20.0, annual_precip_mm=700.0, elevation_m=elevation)
+            for i, (tile, elevation) in enumerate(zip(tiles, (200.0, 250.0, 0.0)))
+        ]
+        # Edges that are not topology neighbors (or name tiles outside the map) are ignored.
+        layers = build_resource_dataset_layers(topology, classified, river_edges=[(0, 7), (1, 9), (0, 2), (-1, 1)])
+        self.assertEqual(layers.on_river.tolist(), [True, False, True])
+        self.assertEqual(layers.slope.tolist(), [125.0, 150.0, 225.0])
+        self.assertEqual(layers.slope_max.tolist(), [200.0, 250.0, 250.0])
+        self.assertEqual(layers.slope_std.tolist(), [75.0, 100.0, 25.0])
+
+
+class DistanceFieldTests(unittest.TestCase):
+    def test_frontier_distances_match_queue_search(self) -> None:
+        topology = river_grid_topology(9, 13)
+        indptr, indices = neighbor_csr(topology)
+        rng = np.random.default_rng(11)
+        fields = [
+            DistanceFieldSpec(seeds=np.array([0, 50]), passable_mask=rng.random(topology.tile_count) < 0.7),
+            DistanceFieldSpec(seeds=np.flatnonzero(rng.random(topology.tile_count) < 0.05)),
+            DistanceFieldSpec(seeds=np.array([60]), max_distance=3),
+            DistanceFieldSpec(seeds=np.empty(0, dtype=np.int64)),
+        ]
+        combined = _bfs_distance_fields(indptr, indices, fields)
+        for row, field in zip(combined, fields):
+            expected = _queue_distances(topology, field.seeds.tolist(), field.passable_mask, field.max_distance)
+            self.assertEqual(row.tolist(), expected)
+            single = _bfs_distances(indptr, indices, field.seeds, field.passable_mask, field.max_distance)
+            self.assertEqual(single.tolist(), expected)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,33 @@
 from __future__ import annotations
 
+import json
+import tempfile
 import unittest
+from dataclasses import replace
+from pathlib import Path
 
-from tools.earthgen.generate_unciv_earth_map import TileClassification, build_map_payload, parse_resource_density
+from tools.earthgen.generate_unciv_earth_map import (
+    ResourceVariant,
+    ResourceVariantContext,
+    TileClassification,
+    build_map_payload,
+    parse_resource_density,
+    parse_resource_variants,
+    resource_variant_output_path,
+    write_resource_variants,
+)
+from tools.earthgen.resource_dataset_sampling import build_resource_dataset_layers
+from tools.earthgen.resource_rules_gnk import (
+    DEFAULT_RESOURCE_PROFILE_PATH,
+    RULESET_TILE_RESOURCES_PATH,
+    load_resource_profiles,
+    load_ruleset_resource_definitions,
+)
+from tools.earthgen.resource_scoring import rank_candidates_by_resource
+from tools.earthgen.tests.test_river_projection import river_grid_topology
 from tools.earthgen.topology_io import TopologyDump, TopologyTile
+from tools.earthgen.topology_rings import build_k_ring_table
+from tools.earthgen.unciv_map_io import read_map_file
 
 
 class ResourceIntegrationTests(unittest.TestCase):
@@ -53,6 +77,80 @@ class ResourceIntegrationTests(unittest.TestCase):
         self.assertEqual(tile["resource"], "Iron")
         self.assertEqual(tile["resourceAmount"], 6)
 
+    def test_parse_resource_variants(self) -> None:
+        variants = parse_resource_variants("1337:default, 42:abundant:fair,7:1.5:nofair", default_fairness=True)
+        self.assertEqual(
+            variants,
+            [
+                ResourceVariant(seed=1337, density="default", fairness=True),
+                ResourceVariant(seed=42, density="abundant", fairness=True),
+                ResourceVariant(seed=7, density="1.5", fairness=False),
+            ],
+        )
+        self.assertEqual(
+            resource_variant_output_path(Path("maps/Earth"), variants[2]),
+            Path("maps/Earth-seed7-1.5"),
+        )
+        for bad in ("1337", "x:default", "1:dense", "1:default:maybe", "1:default,1:DEFAULT"):
+            with self.subTest(spec=bad), self.assertRaises(ValueError):
+                parse_resource_variants(bad, default_fairness=False)
+
+    def test_parallel_variants_match_serial_output(self) -> None:
+        topology = river_grid_topology(8, 12)
+        terrains = ("Grassland", "Plains", "Desert", "Tundra", "Coast", "Ocean")
+        tiles = [
+            TileClassification(
+                index=tile.index,
+                x=tile.x,
+                y=tile.y,
+                latitude=tile.latitude,
+                longitude=tile.longitude,
+                neighbors=tile.neighbors,
+                base_terrain=terrains[(tile.index * 7) % len(terrains)],
+                features=["Hill"] if tile.index % 5 == 0 else [],
+                temperature_c=float(tile.index % 30),
+                annual_precip_mm=float(100 * (tile.index % 17)),
+                elevation_m=float(37 * (tile.index % 23)),
+            )
+            for tile in topology.tiles
+        ]
+        ruleset_resources = load_ruleset_resource_definitions(RULESET_TILE_RESOURCES_PATH)
+        profiles = load_resource_profiles(profile_path=DEFAULT_RESOURCE_PROFILE_PATH, ruleset_path=RULESET_TILE_RESOURCES_PATH)
+        layers = build_resource_dataset_layers(topology, tiles, river_edges=[(0, 1), (1, 2)])
+        context = ResourceVariantContext(
+            topology=topology,
+            tiles=tiles,
+            ruleset_resources=ruleset_resources,
+            profiles=profiles,
+            ranked=rank_candidates_by_resource(profiles, ruleset_resources, tiles, layers),
+            rings=build_k_ring_table(topology, max(profile.min_distance for profile in profiles.values())),
+            river_edges=((0, 1), (1, 2)),
+            ruleset_name="Civ V - Gods & Kings",
+            size_name=None,
+        )
+        variants = parse_resource_variants("1:default,2:abundant:fair,3:0.5", default_fairness=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = {}
+            for workers in (1, 2):
+                jobs = [
+                    (variant, Path(tmp) / str(workers) / f"Earth-{variant.suffix}", f"Earth-{variant.suffix}")
+                    for variant in variants
+                ]
+                summaries = write_resource_variants(context, jobs, workers=workers)
+                self.assertEqual(len(summaries), len(variants))
+                # Compare decoded payloads; the gzip header records each file's write time.
+                outputs[workers] = (summaries, [read_map_file(path) for _, path, _ in jobs])
+            self.assertEqual(outputs[1], outputs[2])
+            self.assertIn("seed=2 fairness=True", outputs[1][0][1])
+
+            heap_context = replace(context, placement_engine="heap", placement_report=True)
+            output = Path(tmp) / "heap" / "Earth"
+            summary = write_resource_variants(heap_context, [(variants[0], output, "Earth")])[0]
+            self.assertIn("engine=heap", summary)
+            report = json.loads(output.with_name("Earth-placement-report.json").read_text(encoding="utf-8"))
+            self.assertEqual(set(report["engines"]), {"greedy", "heap"})
+            self.assertIn(f"resources={report['engines']['heap']['placed']} ", summary)
+
 
 if __name__ == "__main__":
     unittest.main()
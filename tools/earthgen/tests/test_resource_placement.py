@@ -1,16 +1,29 @@
 from __future__ import annotations
 
+import random
 import unittest
+from itertools import islice
 from types import SimpleNamespace
+from unittest import mock
 
-from tools.earthgen.resource_placement import place_resources
+import numpy as np
+
+from tools.earthgen.resource_placement import (
+    PLACEMENT_ENGINES,
+    _seeded_candidate_order,
+    compare_placement_engines,
+    place_resources,
+    place_resources_heap,
+)
 from tools.earthgen.resource_rules_gnk import (
     ResourceProfile,
     RulesetResourceDefinition,
     StrategicDepositAmount,
 )
-from tools.earthgen.resource_scoring import RankedCandidate
+from tools.earthgen.resource_scoring import RankedCandidate, RankedCandidates
+from tools.earthgen.tests.test_river_projection import river_grid_topology
 from tools.earthgen.topology_io import TopologyDump, TopologyEdge, TopologyTile
+from tools.earthgen.topology_rings import build_k_ring_table
 
 
 def _topology() -> TopologyDump:
@@ -168,5 +181,161 @@ class ResourcePlacementTests(unittest.TestCase):
         self.assertGreater(len(placements_by_seed), 1)
 
 
+class SeededCandidateOrderTests(unittest.TestCase):
+    def test_matches_shuffle_then_stable_sort_with_ties(self) -> None:
+        rng = np.random.default_rng(3)
+        tile_indices = np.sort(rng.choice(500, size=200, replace=False))
+        scores = rng.integers(0, 6, size=200).astype(np.float64) / 2.0
+        candidates = RankedCandidates(tile_indices=tile_indices, scores=scores)
+
+        for seed in range(5):
+            for batch_size in (1, 7, 500):
+                with self.subTest(seed=seed, batch_size=batch_size):
+                    reference = list(candidates)
+                    reference_rng = random.Random(seed)
+                    reference_rng.shuffle(reference)
+                    reference.sort(key=lambda item: -item.score)
+
+                    order_rng = random.Random(seed)
+                    order = list(_seeded_candidate_order(candidates, order_rng, batch_size=batch_size))
+                    self.assertEqual(order, [item.tile_index for item in reference])
+                    self.assertEqual(order_rng.random(), reference_rng.random())
+
+                    listed = list(_seeded_candidate_order(list(candidates), random.Random(seed), batch_size))
+                    self.assertEqual(listed, order)
+
+    def test_shuffle_consumes_rng_before_iteration(self) -> None:
+        candidates = RankedCandidates(tile_indices=np.arange(10), scores=np.ones(10))
+        rng = random.Random(9)
+        order = _seeded_candidate_order(candidates, rng, batch_size=2)
+        expected = random.Random(9)
+        expected.shuffle(list(range(10)))
+        self.assertEqual(rng.random(), expected.random())
+        self.assertEqual(len(list(islice(order, 3))), 3)
+
+
+def _spaced_profile(name: str, resource_type: str, min_count: int) -> ResourceProfile:
+    return ResourceProfile(
+        name=name,
+        resource_type=resource_type,
+        enabled=True,
+        target_density_per_1000=0.0,
+        min_count=min_count,
+        min_distance=1,
+        major_ratio=0.0,
+        allowed_terrains=(),
+        required_features=(),
+        forbidden_features=(),
+        latitude_min=None,
+        latitude_max=None,
+        dataset_weights={},
+        region_boosts=(),
+        notes="",
+    )
+
+
+class HeapPlacementEngineTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.topology = river_grid_topology(6, 8)
+        self.tiles = [SimpleNamespace(index=i, base_terrain="Grassland", features=[]) for i in range(48)]
+        self.rules = {
+            "Iron": RulesetResourceDefinition(
+                name="Iron",
+                resource_type="Strategic",
+                terrains_can_be_found_on=(),
+                major_deposit_amount=StrategicDepositAmount(sparse=4, default=6, abundant=9),
+                minor_deposit_amount=StrategicDepositAmount(sparse=1, default=2, abundant=3),
+            ),
+            "Wheat": RulesetResourceDefinition(
+                name="Wheat",
+                resource_type="Bonus",
+                terrains_can_be_found_on=(),
+                major_deposit_amount=None,
+                minor_deposit_amount=None,
+            ),
+        }
+        self.profiles = {"Iron": _spaced_profile("Iron", "Strategic", 4), "Wheat": _spaced_profile("Wheat", "Bonus", 6)}
+        tiles = np.arange(48, dtype=np.int64)
+        # Both resources like the low tile indices best; Wheat scores higher everywhere.
+        self.ranked = {
+            "Iron": RankedCandidates(tile_indices=tiles, scores=1.0 - tiles / 100.0),
+            "Wheat": RankedCandidates(tile_indices=tiles, scores=2.0 - tiles / 100.0),
+        }
+
+    def _place(self, engine, seed: int = 5):
+        return engine(
+            topology=self.topology,
+            tiles=self.tiles,
+            ruleset_definitions=self.rules,
+            profiles=self.profiles,
+            ranked_candidates=self.ranked,
+            density_mode="default",
+            density_multiplier=1.0,
+            seed=seed,
+        )
+
+    def test_heap_engine_meets_targets_and_spacing(self) -> None:
+        greedy = self._place(place_resources)
+        heap = self._place(place_resources_heap)
+        self.assertEqual(heap.counts_by_resource, greedy.counts_by_resource)
+        self.assertEqual(heap.counts_by_resource, {"Iron": 4, "Wheat": 6})
+        self.assertEqual(heap.placements_by_tile, self._place(place_resources_heap).placements_by_tile)
+
+        rings = build_k_ring_table(self.topology, 1)
+        for tile_index, placed in heap.placements_by_tile.items():
+            for neighbor in rings.within(tile_index, 1):
+                other = heap.placements_by_tile.get(int(neighbor))
+                self.assertFalse(other is not None and other.resource == placed.resource)
+            if placed.resource == "Iron":
+                self.assertGreater(placed.amount, 0)
+
+        # Greedy hands the best tile to the strategic resource; the heap gives it to the higher score.
+        self.assertEqual(greedy.placements_by_tile[0].resource, "Iron")
+        self.assertEqual(heap.placements_by_tile[0].resource, "Wheat")
+
+    def test_comparison_report_summarizes_both_engines(self) -> None:
+        report = compare_placement_engines(
+            self.ranked,
+            self.rules,
+            topology=self.topology,
+            tiles=self.tiles,
+            profiles=self.profiles,
+            density_mode="default",
+            density_multiplier=1.0,
+            seed=5,
+        )
+        self.assertEqual(set(report["engines"]), {"greedy", "heap"})
+        for summary in report["engines"].values():
+            self.assertEqual(summary["placed"], 10)
+            self.assertEqual(summary["countsByType"], {"Strategic": 4, "Luxury": 0, "Bonus": 6})
+        self.assertEqual(report["countDifferences"], {})
+        self.assertLessEqual(report["sharedPlacements"], 10)
+
+    def test_comparison_report_reuses_precomputed_engine_results(self) -> None:
+        greedy = self._place(place_resources)
+        calls = []
+
+        def fail_greedy(**kwargs):
+            calls.append(kwargs)
+            raise AssertionError("precomputed engine was run again")
+
+        with mock.patch.dict(PLACEMENT_ENGINES, {"greedy": fail_greedy}):
+            report = compare_placement_engines(
+                self.ranked,
+                self.rules,
+                precomputed={"greedy": (greedy, 1.5)},
+                topology=self.topology,
+                tiles=self.tiles,
+                profiles=self.profiles,
+                density_mode="default",
+                density_multiplier=1.0,
+                seed=5,
+            )
+        self.assertEqual(calls, [])
+        self.assertEqual(report["engines"]["greedy"]["seconds"], 1.5)
+        self.assertEqual(report["engines"]["greedy"]["placed"], len(greedy.placements_by_tile))
+        self.assertEqual(set(report["engines"]), {"greedy", "heap"})
+
+
 if __name__ == "__main__":
     unittest.main()
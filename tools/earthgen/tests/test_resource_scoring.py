@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import unittest
+from dataclasses import replace
 from types import SimpleNamespace
 
 import numpy as np
 
 from tools.earthgen.resource_dataset_sampling import ResourceDatasetLayers
-from tools.earthgen.resource_rules_gnk import ResourceProfile, RulesetResourceDefinition
-from tools.earthgen.resource_scoring import is_tile_eligible, rank_candidates_for_resource
+from tools.earthgen.resource_rules_gnk import RegionBoost, ResourceProfile, RulesetResourceDefinition
+from tools.earthgen.resource_scoring import (
+    compile_resource_weights,
+    eligibility_mask,
+    is_tile_eligible,
+    rank_candidates_for_resource,
+    resource_score_matrix,
+    resource_scores,
+)
+from tools.earthgen.terrain_rules_gnk import BASE_TERRAIN_CODES
 
 
 def _layers() -> ResourceDatasetLayers:
@@ -32,6 +41,9 @@ def _layers() -> ResourceDatasetLayers:
         land_distance_to_coast=np.array([5.0, 2.0]),
         water_distance_to_land=np.array([999.0, 999.0]),
         river_distance=np.array([2.0, 0.0]),
+        base_terrain_code=np.array([BASE_TERRAIN_CODES["Plains"], BASE_TERRAIN_CODES["Grassland"]]),
+        slope_max=np.array([300.0, 45.0]),
+        slope_std=np.array([60.0, 10.0]),
     )
 
 
@@ -69,6 +81,53 @@ class ResourceScoringTests(unittest.TestCase):
         self.assertTrue(is_tile_eligible(profile, ruleset, tiles[0], layers, 0))
         self.assertFalse(is_tile_eligible(profile, ruleset, tiles[1], layers, 1))
 
+    def test_eligibility_mask_matches_per_tile_filter(self) -> None:
+        ruleset = RulesetResourceDefinition(
+            name="Wheat",
+            resource_type="Bonus",
+            terrains_can_be_found_on=("Flood plains", "Plains"),
+            major_deposit_amount=None,
+            minor_deposit_amount=None,
+        )
+        tiles = [
+            SimpleNamespace(index=0, latitude=40.0, longitude=10.0, base_terrain="Plains", features=["Hill"]),
+            SimpleNamespace(index=1, latitude=20.0, longitude=20.0, base_terrain="Grassland", features=["Forest", "Jungle"]),
+        ]
+        layers = _layers()
+        cases = [
+            dict(allowed_terrains=(), required_features=(), forbidden_features=()),
+            dict(allowed_terrains=("Grassland", "Hill"), required_features=(), forbidden_features=("Hill",)),
+            dict(allowed_terrains=("Jungle",), required_features=("Forest",), forbidden_features=()),
+            dict(allowed_terrains=("Atoll",), required_features=(), forbidden_features=()),
+            dict(allowed_terrains=(), required_features=("Oasis",), forbidden_features=()),
+            dict(allowed_terrains=(), required_features=(), forbidden_features=(), latitude_min=30.0),
+            dict(allowed_terrains=(), required_features=(), forbidden_features=(), enabled=False),
+        ]
+        for case in cases:
+            fields = dict(
+                name="Wheat",
+                resource_type="Bonus",
+                enabled=True,
+                target_density_per_1000=1.0,
+                min_count=0,
+                min_distance=1,
+                major_ratio=0.0,
+                latitude_min=None,
+                latitude_max=None,
+                dataset_weights={},
+                region_boosts=(),
+                notes="",
+            )
+            fields.update(case)
+            profile = ResourceProfile(**fields)
+            with self.subTest(case=case):
+                expected = [is_tile_eligible(profile, ruleset, tile, layers, tile.index) for tile in tiles]
+                self.assertEqual(eligibility_mask(profile, ruleset, layers).tolist(), expected)
+
+        desert = replace(_layers(), base_terrain_code=np.full(2, BASE_TERRAIN_CODES["Desert"]))
+        profile = replace(profile, enabled=True, allowed_terrains=("Flood plains",))
+        self.assertEqual(eligibility_mask(profile, ruleset, desert).tolist(), [False, True])
+
     def test_score_prefers_higher_weighted_tile(self) -> None:
         profile = ResourceProfile(
             name="Bananas",
@@ -102,6 +161,38 @@ class ResourceScoringTests(unittest.TestCase):
         self.assertEqual([entry.tile_index for entry in ranked], [1])
         self.assertGreater(ranked[0].score, 1.0)
 
+    def test_batched_score_matrix_matches_per_resource_scores(self) -> None:
+        def profile(name: str, weights: dict, boosts: tuple) -> ResourceProfile:
+            return ResourceProfile(
+                name=name,
+                resource_type="Bonus",
+                enabled=True,
+                target_density_per_1000=1.0,
+                min_count=0,
+                min_distance=1,
+                major_ratio=0.0,
+                allowed_terrains=(),
+                required_features=(),
+                forbidden_features=(),
+                latitude_min=None,
+                latitude_max=None,
+                dataset_weights=weights,
+                region_boosts=boosts,
+                notes="",
+            )
+
+        profiles = {
+            "A": profile("A", {"warmth": 0.3, "unknown": 5.0, "slope": 1.7, "hill": 0.1}, ()),
+            "B": profile("B", {"wetness": 0.9}, (RegionBoost(0.0, 15.0, 30.0, 50.0, 0.4), RegionBoost(-180.0, 180.0, -90.0, 90.0, 0.05))),
+            "C": profile("C", {}, (RegionBoost(15.0, 25.0, 10.0, 30.0, 1.1),)),
+        }
+        layers = _layers()
+        table = compile_resource_weights(profiles)
+        matrix = resource_score_matrix(table, layers)
+        self.assertEqual(table.names, ("A", "B", "C"))
+        for row, name in enumerate(table.names):
+            self.assertEqual(matrix[row].tolist(), resource_scores(profiles[name], layers).tolist())
+
 
 if __name__ == "__main__":
     unittest.main()
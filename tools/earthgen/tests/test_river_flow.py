@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+
+from tools.earthgen.river_flow import flow_accumulation, flow_receivers, priority_flood, synthesize_flow_rivers
+from tools.earthgen.river_projection import canonical_edge
+from tools.earthgen.tests.test_river_projection import river_grid_topology
+from tools.earthgen.topology_io import neighbor_csr
+
+
+class RiverFlowTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rows, self.cols = 8, 16
+        self.topology = river_grid_topology(self.rows, self.cols)
+        cols = np.array([tile.index % self.cols for tile in self.topology.tiles])
+        rows = np.array([tile.index // self.cols for tile in self.topology.tiles])
+        # Land rises away from an ocean strip in column 0, with a closed basin at (4, 8).
+        self.is_water = cols == 0
+        self.elevation = 100.0 * np.minimum(cols, self.cols - cols) + 5.0 * np.abs(rows - 4)
+        self.basin = 4 * self.cols + 8
+        self.elevation[self.basin] = 10.0
+
+    def test_every_land_tile_drains_to_water(self) -> None:
+        indptr, indices = neighbor_csr(self.topology)
+        filled, parent, order = priority_flood(indptr, indices, self.elevation, self.is_water)
+        receivers = flow_receivers(indptr, indices, filled, parent, self.is_water)
+
+        self.assertGreater(filled[self.basin], self.elevation[self.basin])
+        for tile in np.flatnonzero(~self.is_water):
+            seen = set()
+            while receivers[tile] >= 0:
+                self.assertNotIn(tile, seen)
+                seen.add(tile)
+                self.assertLessEqual(filled[receivers[tile]], filled[tile])
+                tile = receivers[tile]
+            self.assertTrue(self.is_water[tile])
+
+        weights = np.where(self.is_water, 0.0, 1.0)
+        accumulation = flow_accumulation(order, receivers, weights)
+        self.assertAlmostEqual(weights.sum(), accumulation[self.is_water].sum())
+
+    def test_rivers_follow_flow_and_end_at_the_coast(self) -> None:
+        precip = np.full(self.topology.tile_count, 1000.0)
+        result = synthesize_flow_rivers(
+            self.topology,
+            elevation_m=self.elevation,
+            annual_precip_mm=precip,
+            is_water=self.is_water,
+            threshold=5000.0,
+        )
+        self.assertGreater(len(result.chains), 0)
+        self.assertEqual(0, result.skipped_segments)
+        water_tiles = set(np.flatnonzero(self.is_water).tolist())
+        self.assertTrue(any(set(edge) & water_tiles for edge in result.edges))
+        neighbor_pairs = {canonical_edge(t.index, n) for t in self.topology.tiles for n in t.neighbors}
+        self.assertTrue(set(result.edges) <= neighbor_pairs)
+
+        dry = synthesize_flow_rivers(
+            self.topology,
+            elevation_m=self.elevation,
+            annual_precip_mm=precip,
+            is_water=self.is_water,
+            threshold=1e9,
+        )
+        self.assertEqual((), dry.edges)
+
+    def test_input_length_mismatch_is_rejected(self) -> None:
+        with self.assertRaisesRegex(ValueError, "one value per topology tile"):
+            synthesize_flow_rivers(self.topology, [0.0], [0.0], [False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,33 @@
 from __future__ import annotations
 
+import tempfile
 import unittest
+from collections import deque
+from pathlib import Path
+from unittest import mock
 
+import numpy as np
+
+from tools.earthgen.dataset_sampling import geodesic_polyline_length_km
 from tools.earthgen.generate_unciv_earth_map import TileClassification, build_map_payload
-from tools.earthgen.river_projection import _NeighborCycle, canonical_edge, project_river_lines_to_edges
-from tools.earthgen.topology_io import RiverWriter, TopologyDump, TopologyEdge, TopologyTile
+from tools.earthgen.river_projection import (
+    _NeighborCycle,
+    _NeighborWalkLocator,
+    _bridge_chain_for_corner_continuity,
+    _build_adjacency,
+    _shortest_path,
+    _TileLocator,
+    _UnitVectorIndex,
+    RiverChainCache,
+    RiverPathCache,
+    canonical_edge,
+    densify_line,
+    densify_line_vectors,
+    project_river_lines_to_edges,
+    select_longest_river_lines,
+)
+from tools.earthgen.tests.test_hierarchical_generation import grid_topology
+from tools.earthgen.topology_io import RiverWriter, TopologyDump, TopologyEdge, TopologyTile, neighbor_matrix
 
 
 class RiverProjectionTests(unittest.TestCase):
@@ -69,6 +92,33 @@ class RiverProjectionTests(unittest.TestCase):
                 next_other = nxt[0] if nxt[1] == tile else nxt[1]
                 self.assertEqual([], cycle.intermediate_neighbors(tile, prev_other, next_other))
 
+    def test_bridges_use_shorter_ring_arc_around_hex_tile(self) -> None:
+        # Tile 0 surrounded by six neighbors at bearings 0, 60, ..., 300 degrees.
+        tiles = [TopologyTile(0, 0, 0, 0.0, 0.0, (1, 2, 3, 4, 5, 6))]
+        for k in range(6):
+            bearing = np.radians(60.0 * k)
+            tiles.append(TopologyTile(k + 1, k + 1, 0, float(np.cos(bearing)), float(np.sin(bearing)), (0,)))
+        topology = TopologyDump(
+            frequency=1,
+            layout_id="IcosaNetV2",
+            tile_count=7,
+            ruleset="Civ V - Gods & Kings",
+            tiles=tuple(tiles),
+            edges=tuple(),
+            map_parameters_template={},
+        )
+        cycle = _NeighborCycle(topology)
+        self.assertEqual([2], cycle.intermediate_neighbors(0, 1, 3))
+        self.assertEqual([2, 3], cycle.intermediate_neighbors(0, 1, 4))
+        self.assertEqual([6], cycle.intermediate_neighbors(0, 1, 5))
+        self.assertEqual([], cycle.intermediate_neighbors(0, 1, 2))
+
+        writer_map = {(0, n): (0, "hasBottomRiver") for n in (1, 2, 3, 5)}
+        self.assertEqual(
+            [(0, 1), (0, 2), (0, 3), (0, 5)],
+            _bridge_chain_for_corner_continuity([(0, 1), (0, 3), (0, 3), (0, 5)], cycle, writer_map),
+        )
+
     def test_includes_coastal_mouth_endpoint(self) -> None:
         topology = self.build_chain_topology()
         line = [[(1.0, 0.0), (19.0, 0.0)]]
@@ -83,6 +133,18 @@ class RiverProjectionTests(unittest.TestCase):
         self.assertTrue((first_edge[0] in water_tiles) or (first_edge[1] in water_tiles))
         self.assertTrue((last_edge[0] in water_tiles) or (last_edge[1] in water_tiles))
 
+    def test_path_hop_limit_skips_distant_segments(self) -> None:
+        topology = self.build_chain_topology()
+        lines = [[(0.0, 0.0), (20.0, 0.0)]]
+
+        limited = project_river_lines_to_edges(topology, lines, max_rivers=1, max_segment_km=0.0, max_path_hops=3)
+        self.assertEqual((), limited.edges)
+        self.assertEqual(1, limited.skipped_segments)
+
+        unlimited = project_river_lines_to_edges(topology, lines, max_rivers=1, max_segment_km=0.0, max_path_hops=None)
+        self.assertEqual(((0, 1), (1, 2), (2, 3), (3, 4)), unlimited.edges)
+        self.assertEqual(0, unlimited.skipped_segments)
+
     def test_payload_serializes_only_supported_river_fields(self) -> None:
         topology = self.build_chain_topology()
         tiles = [
@@ -115,5 +177,283 @@ class RiverProjectionTests(unittest.TestCase):
                     self.assertIn(key, allowed)
 
 
+def river_grid_topology(rows: int, cols: int) -> TopologyDump:
+    grid = grid_topology(rows, cols)
+    edges = tuple(
+        TopologyEdge(tile.index, neighbor, True, RiverWriter(tile.index, "hasBottomRiver"))
+        for tile in grid.tiles
+        for neighbor in tile.neighbors
+        if tile.index < neighbor
+    )
+    return TopologyDump(
+        frequency=grid.frequency,
+        layout_id=grid.layout_id,
+        tile_count=grid.tile_count,
+        ruleset=grid.ruleset,
+        tiles=grid.tiles,
+        edges=edges,
+        map_parameters_template={},
+    )
+
+
+class ParallelProjectionTests(unittest.TestCase):
+    def test_worker_pool_matches_serial_projection(self) -> None:
+        topology = river_grid_topology(18, 36)
+        rng = np.random.default_rng(9)
+        lines = [
+            [(float(lon), float(lat)) for lon, lat in zip(rng.uniform(-180, 180, 4), rng.uniform(-55, 55, 4))]
+            for _ in range(12)
+        ]
+        serial = project_river_lines_to_edges(topology, lines, max_rivers=10, max_segment_km=300.0)
+        cache = RiverPathCache()
+        parallel = project_river_lines_to_edges(
+            topology, lines, max_rivers=10, max_segment_km=300.0, path_cache=cache, workers=3
+        )
+        self.assertGreater(len(serial.edges), 0)
+        self.assertEqual(serial, parallel)
+        # Paths found by the workers are folded back into the caller's cache.
+        self.assertGreater(len(cache), 0)
+
+
+class RiverChainCacheTests(unittest.TestCase):
+    def test_rerun_projects_only_new_lines(self) -> None:
+        topology = river_grid_topology(18, 36)
+        rng = np.random.default_rng(4)
+        lines = [
+            [(float(lon), float(lat)) for lon, lat in zip(rng.uniform(-180, 180, 3), rng.uniform(-55, 55, 3))]
+            for _ in range(8)
+        ]
+        cache = RiverChainCache()
+        first = project_river_lines_to_edges(topology, lines, max_rivers=3, chain_cache=cache)
+        self.assertEqual((0, 3), (cache.hits, cache.misses))
+
+        more = project_river_lines_to_edges(topology, lines, max_rivers=6, chain_cache=cache)
+        self.assertEqual((3, 6), (cache.hits, cache.misses))
+        self.assertEqual(project_river_lines_to_edges(topology, lines, max_rivers=6), more)
+        self.assertEqual(first.chains, more.chains[: len(first.chains)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = Path(tmp) / "chains.json"
+            cache.save(cache_path)
+            restored = RiverChainCache.load(cache_path)
+            self.assertEqual(more, project_river_lines_to_edges(topology, lines, max_rivers=6, chain_cache=restored))
+            self.assertEqual(0, restored.misses)
+
+            # Different densification is a different context, so every line is projected again.
+            project_river_lines_to_edges(topology, lines, max_rivers=6, max_segment_km=60.0, chain_cache=restored)
+            self.assertEqual(6, restored.misses)
+
+            # Only the current context is kept, in memory and on disk.
+            self.assertEqual(6, len(restored))
+            restored.save(cache_path)
+            self.assertEqual(6, len(RiverChainCache.load(cache_path)))
+
+
+class SelectLongestRiverLinesTests(unittest.TestCase):
+    def test_partial_selection_matches_stable_full_sort(self) -> None:
+        rng = np.random.default_rng(5)
+        lines = []
+        for _ in range(60):
+            size = int(rng.integers(1, 5))
+            lines.append([(float(rng.integers(-20, 20)), float(rng.integers(-20, 20))) for _ in range(size)])
+        lines += [list(line) for line in lines[:20]]  # duplicates create exact length ties
+
+        lengths = {id(line): geodesic_polyline_length_km(line) for line in lines}
+        reference = sorted((line for line in lines if len(line) >= 2), key=lambda line: lengths[id(line)], reverse=True)
+        for count in (1, 7, 30, 200):
+            with self.subTest(count=count):
+                self.assertEqual(reference[:count], select_longest_river_lines(lines, count))
+
+    def test_precomputed_lengths_are_used(self) -> None:
+        lines = [[(0.0, 0.0), (1.0, 0.0)], [(0.0, 0.0), (2.0, 0.0)]]
+        self.assertEqual([lines[0]], select_longest_river_lines(lines, 1, lengths_km=[9.0, 1.0]))
+        with self.assertRaisesRegex(ValueError, "length mismatch"):
+            select_longest_river_lines(lines, 1, lengths_km=[1.0])
+
+
+class DensifyLineTests(unittest.TestCase):
+    def test_points_follow_great_circle_with_bounded_spacing(self) -> None:
+        line = [(10.0, 20.0), (60.0, -10.0), (-150.0, 45.0)]
+        vectors = densify_line_vectors(line, max_segment_km=100.0)
+        np.testing.assert_allclose(1.0, np.linalg.norm(vectors, axis=1))
+        spacing_km = np.arccos(np.clip(np.einsum("ij,ij->i", vectors[:-1], vectors[1:]), -1.0, 1.0)) * 6371.0088
+        self.assertLessEqual(float(spacing_km.max()), 100.0 + 1e-6)
+
+        lonlat = densify_line(line, max_segment_km=100.0)
+        self.assertEqual(len(vectors), len(lonlat))
+        for (lon, lat), expected in zip((lonlat[0], lonlat[-1]), (line[0], line[-1])):
+            self.assertAlmostEqual(expected[0], lon, places=9)
+            self.assertAlmostEqual(expected[1], lat, places=9)
+
+    def test_polar_segment_crosses_the_pole(self) -> None:
+        lonlat = densify_line([(0.0, 80.0), (180.0, 80.0)], max_segment_km=50.0)
+        self.assertGreater(max(lat for _, lat in lonlat), 89.5)
+
+    def test_short_or_disabled_lines_are_returned_unchanged(self) -> None:
+        self.assertEqual(1, len(densify_line_vectors([(5.0, 5.0)], max_segment_km=10.0)))
+        self.assertEqual(2, len(densify_line_vectors([(0.0, 0.0), (90.0, 0.0)], max_segment_km=0.0)))
+
+
+def plain_bfs_path(start: int, end: int, adjacency) -> tuple | None:
+    """Unidirectional BFS the path search replaced; parents are first-discovered tiles."""
+    parents = {start: -1}
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        if current == end:
+            path = [end]
+            while path[-1] != start:
+                path.append(parents[path[-1]])
+            return tuple(reversed(path))
+        for neighbor in adjacency[current]:
+            if neighbor not in parents:
+                parents[neighbor] = current
+                queue.append(neighbor)
+    return None
+
+
+class ShortestPathTests(unittest.TestCase):
+    def test_ties_resolve_like_plain_bfs_from_lower_tile(self) -> None:
+        rng = np.random.default_rng(4)
+        grid = grid_topology(6, 8)
+        graphs = [{(min(t.index, n), max(t.index, n)) for t in grid.tiles for n in t.neighbors}]
+        # Sparse random graphs add uneven frontiers and disconnected pairs.
+        for _ in range(3):
+            pairs = rng.integers(0, 40, size=(60, 2))
+            graphs.append({canonical_edge(int(a), int(b)) for a, b in pairs if a != b})
+        for edges in graphs:
+            tile_count = 1 + max(max(edge) for edge in edges)
+            adjacency = _build_adjacency(tile_count, edges)
+            for start in range(tile_count):
+                for end in range(start + 1, tile_count):
+                    expected = plain_bfs_path(start, end, adjacency)
+                    self.assertEqual(expected, _shortest_path(start, end, adjacency, RiverPathCache()))
+                    reverse = None if expected is None else tuple(reversed(expected))
+                    self.assertEqual(reverse, _shortest_path(end, start, adjacency, RiverPathCache()))
+
+
+class RiverPathCacheTests(unittest.TestCase):
+    def test_lookups_are_symmetric_and_bounded(self) -> None:
+        cache = RiverPathCache(max_entries=2)
+        cache.store(3, 1, (3, 2, 1), max_hops=None)
+        self.assertEqual((True, (1, 2, 3)), cache.lookup(1, 3, None))
+        self.assertEqual((True, (3, 2, 1)), cache.lookup(3, 1, None))
+        self.assertEqual((True, None), cache.lookup(1, 3, 1))
+
+        cache.store(4, 9, None, max_hops=5)
+        self.assertEqual((True, None), cache.lookup(9, 4, 5))
+        self.assertEqual((False, None), cache.lookup(9, 4, 8))
+
+        cache.store(5, 6, (5, 6), max_hops=None)
+        self.assertEqual(2, len(cache))
+        self.assertEqual((False, None), cache.lookup(1, 3, None))
+        self.assertEqual((4, 2), (cache.hits, cache.misses))
+
+    def test_cached_paths_do_not_depend_on_query_direction(self) -> None:
+        # A grid has many equally short paths between distant tiles.
+        topology = grid_topology(6, 8)
+        adjacency = _build_adjacency(
+            topology.tile_count,
+            {(min(tile.index, n), max(tile.index, n)) for tile in topology.tiles for n in tile.neighbors},
+        )
+        pairs = [(a, b) for a in range(topology.tile_count) for b in range(topology.tile_count) if a != b]
+        for start, end in pairs:
+            forward_first = RiverPathCache()
+            forward = _shortest_path(start, end, adjacency, forward_first)
+            self.assertEqual(tuple(reversed(forward)), _shortest_path(end, start, adjacency, forward_first))
+
+            reverse_first = RiverPathCache()
+            reverse = _shortest_path(end, start, adjacency, reverse_first)
+            self.assertEqual(tuple(reversed(reverse)), forward)
+            self.assertEqual(forward, _shortest_path(start, end, adjacency, reverse_first))
+
+    def test_topology_is_fingerprinted_once(self) -> None:
+        topology = RiverProjectionTests().build_chain_topology()
+        cache = RiverPathCache()
+        lines = [[(0.0, 0.0), (20.0, 0.0)]]
+        with mock.patch("tools.earthgen.topology_io.neighbor_matrix", wraps=neighbor_matrix) as spy:
+            for _ in range(3):
+                project_river_lines_to_edges(topology, lines, max_rivers=1, path_cache=cache)
+        self.assertEqual(1, spy.call_count)
+
+    def test_cache_is_reused_across_projections_and_persisted(self) -> None:
+        topology = RiverProjectionTests().build_chain_topology()
+        lines = [[(0.0, 0.0), (20.0, 0.0)]]
+        cache = RiverPathCache()
+        first = project_river_lines_to_edges(topology, lines, max_rivers=1, path_cache=cache)
+        misses = cache.misses
+        second = project_river_lines_to_edges(topology, lines, max_rivers=1, path_cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(misses, cache.misses)
+        self.assertGreater(cache.hits, 0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = Path(tmp) / "paths.json"
+            cache.save(cache_path)
+            restored = RiverPathCache.load(cache_path, topology)
+            self.assertEqual(len(cache), len(restored))
+            self.assertEqual(first, project_river_lines_to_edges(topology, lines, max_rivers=1, path_cache=restored))
+            self.assertEqual(0, restored.misses)
+
+            other = grid_topology(4, 8)
+            self.assertEqual(0, len(RiverPathCache.load(cache_path, other)))
+            with self.assertRaisesRegex(ValueError, "different topology"):
+                project_river_lines_to_edges(other, [[(0.0, 0.0), (90.0, 0.0)]], max_rivers=1, path_cache=cache)
+
+
+class UnitVectorIndexTests(unittest.TestCase):
+    @staticmethod
+    def random_unit_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+        vectors = rng.normal(size=(count, 3))
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def test_matches_dense_argmax(self) -> None:
+        rng = np.random.default_rng(7)
+        queries = self.random_unit_vectors(rng, 3000)
+        for tile_count in (1, 5, 300, 5000):
+            with self.subTest(tile_count=tile_count):
+                tiles = self.random_unit_vectors(rng, tile_count)
+                expected = np.argmax(queries @ tiles.T, axis=1)
+                np.testing.assert_array_equal(expected, _UnitVectorIndex(tiles).nearest(queries, chunk_size=512))
+
+    def test_clustered_tiles_fall_back_to_exact_search(self) -> None:
+        rng = np.random.default_rng(3)
+        tiles = self.random_unit_vectors(rng, 2000)
+        tiles[:, 2] = np.abs(tiles[:, 2]) + 4.0
+        tiles /= np.linalg.norm(tiles, axis=1, keepdims=True)
+        queries = self.random_unit_vectors(rng, 500)
+        np.testing.assert_array_equal(np.argmax(queries @ tiles.T, axis=1), _UnitVectorIndex(tiles).nearest(queries))
+
+    def test_ties_resolve_to_lowest_index(self) -> None:
+        tiles = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 0.0, 0.0]])
+        queries = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [np.sqrt(0.5), np.sqrt(0.5), 0.0]])
+        self.assertEqual([0, 1, 0], _UnitVectorIndex(tiles).nearest(queries).tolist())
+
+
+class NeighborWalkLocatorTests(unittest.TestCase):
+    def test_walk_matches_global_index_along_densified_line(self) -> None:
+        topology = grid_topology(36, 72)
+        line = densify_line([(-170.0, -50.0), (-20.0, 10.0), (120.0, 55.0), (179.0, -40.0), (-175.0, 20.0)], 60.0)
+        walker = _NeighborWalkLocator(topology)
+        self.assertEqual(_TileLocator(topology).nearest_indices(line), walker.nearest_indices(line))
+        self.assertEqual(0, walker.fallbacks)
+
+    def test_exhausted_walk_falls_back_to_global_index(self) -> None:
+        topology = grid_topology(12, 24)
+        walker = _NeighborWalkLocator(topology, max_steps=1)
+        points = [(-170.0, -50.0), (170.0, 50.0)]
+        self.assertEqual(_TileLocator(topology).nearest_indices(points), walker.nearest_indices(points))
+        self.assertEqual(1, walker.fallbacks)
+
+    def test_projection_is_identical_with_either_locator(self) -> None:
+        topology = RiverProjectionTests().build_chain_topology()
+        lines = [[(0.0, 0.0), (20.0, 0.0)]]
+        by_index = project_river_lines_to_edges(topology, lines, max_rivers=1, locator="index")
+        by_walk = project_river_lines_to_edges(topology, lines, max_rivers=1, locator="walk")
+        self.assertEqual(by_index, by_walk)
+        with self.assertRaisesRegex(ValueError, "Unsupported river locator"):
+            project_river_lines_to_edges(topology, lines, max_rivers=1, locator="kdtree")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from tools.earthgen.generate_unciv_earth_map import EarthAlignment, classify_tiles
+from tools.earthgen.terrain_lut import (
+    compile_terrain_lut,
+    load_terrain_rules,
+    lut_parity_report,
+    parse_terrain_rules,
+)
+from tools.earthgen.topology_io import TopologyDump, TopologyTile
+
+
+class ClimateGridDatasets:
+    def point_on_land(self, lon: float, lat: float) -> bool:
+        return lon > -150.0
+
+    def point_in_lake(self, lon: float, lat: float) -> bool:
+        return -10.0 < lon < -5.0
+
+    def sample_elevation(self, lon: float, lat: float) -> float:
+        return (lon + 180.0) * 12.0
+
+    def sample_temperature(self, lon: float, lat: float) -> float | None:
+        return None if abs(lat) > 85.0 else 32.0 - abs(lat) * 0.7
+
+    def sample_precipitation(self, lon: float, lat: float) -> float:
+        return ((lon + 180.0) * 37.0) % 3200.0
+
+
+class TerrainLutTests(unittest.TestCase):
+    def test_default_rules_match_gnk_reference_at_every_boundary(self) -> None:
+        lut = compile_terrain_lut(load_terrain_rules())
+        report = lut_parity_report(lut, random_samples=2000)
+        self.assertTrue(report.ok, msg=report.summary())
+        self.assertGreater(report.boundary_checks, 0)
+        self.assertEqual((-9.0, -8.0, -6.0, -1.0, 18.0, 20.0, 24.0, 26.0), report.thresholds["temperature_c"])
+        # "<=" thresholds split just above the value so the threshold itself stays in the lower bin.
+        self.assertEqual(float(np.nextafter(-9.0, np.inf)), report.edges["temperature_c"][0])
+
+    def test_lut_classification_matches_rule_classification(self) -> None:
+        tiles = []
+        for idx in range(400):
+            lat = -89.0 + 178.0 * ((idx * 37) % 400) / 399.0
+            lon = -180.0 + 360.0 * idx / 400.0
+            tiles.append(TopologyTile(idx, idx, 0, lat, lon, tuple()))
+        topology = TopologyDump(
+            frequency=6,
+            layout_id="IcosaNetV2",
+            tile_count=len(tiles),
+            ruleset="Civ V - Gods & Kings",
+            tiles=tuple(tiles),
+            edges=tuple(),
+            map_parameters_template={},
+        )
+        kwargs = dict(cache_dir=Path("."), alignment=EarthAlignment(), datasets=ClimateGridDatasets())
+        reference = classify_tiles(topology, **kwargs)  # type: ignore[arg-type]
+        lut = compile_terrain_lut(load_terrain_rules())
+        compiled = classify_tiles(topology, terrain_lut=lut, **kwargs)  # type: ignore[arg-type]
+
+        self.assertEqual(
+            [(t.base_terrain, t.features) for t in reference],
+            [(t.base_terrain, t.features) for t in compiled],
+        )
+        self.assertGreater(len({t.base_terrain for t in compiled}), 5)
+
+    def test_alternative_rule_set_compiles_without_code_changes(self) -> None:
+        rules = parse_terrain_rules(
+            {
+                "base_terrain": [
+                    {"terrain": "Snow", "when": [{"temperature_c": ["<", 0]}]},
+                    {"terrain": "Desert", "when": [{"annual_precip_mm": ["<=", 250]}]},
+                    {"terrain": "Plains"},
+                ],
+                "features": [
+                    {"feature": "Forest", "on": ["Plains"], "when": [{"annual_precip_mm": [[">", 600], ["<", 2000]]}]},
+                ],
+            }
+        )
+        lut = compile_terrain_lut(rules)
+        self.assertTrue(lut_parity_report(lut, reference=rules.evaluate, random_samples=500).ok)
+
+        ids = lut.classify(
+            is_land=np.array([True, True, True, True, False]),
+            is_lake=np.array([False, False, False, False, False]),
+            latitude=np.array([10.0, 10.0, 10.0, 10.0, 10.0]),
+            temperature_c=np.array([-0.5, 15.0, 15.0, 15.0, 15.0]),
+            annual_precip_mm=np.array([900.0, 250.0, 600.0, 600.5, 900.0]),
+            elevation_m=np.array([0.0, 0.0, 0.0, 0.0, 0.0]),
+        )
+        self.assertEqual(
+            [("Snow", ()), ("Desert", ()), ("Plains", ()), ("Plains", ("Forest",)), ("Ocean", ())],
+            [lut.outcomes[int(i)] for i in ids],
+        )
+
+    def test_invalid_rule_definitions_are_rejected(self) -> None:
+        with self.assertRaisesRegex(ValueError, "unknown variable"):
+            parse_terrain_rules({"base_terrain": [{"terrain": "Plains", "when": [{"humidity": [">", 1]}]}]})
+        with self.assertRaisesRegex(ValueError, "unsupported operator"):
+            parse_terrain_rules({"base_terrain": [{"terrain": "Plains", "when": [{"elevation_m": ["==", 1]}]}]})
+        with self.assertRaisesRegex(ValueError, "unsupported land base terrain"):
+            parse_terrain_rules({"base_terrain": [{"terrain": "Coast"}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
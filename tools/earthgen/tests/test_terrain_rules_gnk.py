@@ -3,14 +3,18 @@ from __future__ import annotations
 import unittest
 from pathlib import Path
 
+import numpy as np
+
 from tools.earthgen.generate_unciv_earth_map import (
     EarthAlignment,
     TileClassification,
     build_map_payload,
     classify_tiles,
+    find_classification_errors,
     validate_classification,
 )
 from tools.earthgen.terrain_rules_gnk import ClimateSample, classify_base_terrain, classify_features
+from tools.earthgen.tests.test_hierarchical_generation import grid_topology
 from tools.earthgen.topology_io import RiverWriter, TopologyDump, TopologyEdge, TopologyTile
 from tools.earthgen.unciv_map_io import decode_map_payload, encode_map_payload
 
@@ -51,6 +55,41 @@ class TerrainRuleTests(unittest.TestCase):
                 ]
             )
 
+    def test_validate_classification_reports_all_offending_tiles(self) -> None:
+        def tile(index: int, base: str, features: list[str]) -> TileClassification:
+            return TileClassification(
+                index=index,
+                x=index,
+                y=0,
+                latitude=0.0,
+                longitude=0.0,
+                neighbors=tuple(),
+                base_terrain=base,
+                features=features,
+            )
+
+        tiles = [
+            tile(0, "Ocean", ["Hill"]),
+            tile(1, "Grassland", ["Hill", "Forest"]),
+            tile(2, "Coast", ["Ice", "Hill"]),
+            tile(3, "Mountain", ["Forest"]),
+            tile(4, "Volcano", []),
+            tile(5, "Plains", ["Oasis"]),
+            tile(6, "Mountain", ["Oasis"]),
+        ]
+        errors = find_classification_errors(tiles)
+        self.assertEqual([0, 2], errors["Invalid water+hill combination"].tolist())
+        self.assertEqual([3, 6], errors["Mountain tile should not have extra features in v1"].tolist())
+        self.assertEqual([4], errors["Unknown base terrain"].tolist())
+        self.assertEqual([5, 6], errors["Unknown terrain feature"].tolist())
+        self.assertEqual({}, find_classification_errors(tiles[1:2]))
+
+        with self.assertRaises(ValueError) as ctx:
+            validate_classification(tiles)
+        message = str(ctx.exception)
+        self.assertIn("water+hill combination on 2 tile(s): [0, 2]", message)
+        self.assertIn("Unknown base terrain on 1 tile(s): [4]", message)
+
     def test_smoke_generation_payload_roundtrip(self) -> None:
         class FakeDatasets:
             def point_on_land(self, lon: float, lat: float) -> bool:
@@ -108,6 +147,106 @@ class TerrainRuleTests(unittest.TestCase):
             for feature in tile.get("terrainFeatures", []):
                 self.assertIn(feature, {"Hill", "Forest", "Jungle", "Marsh", "Ice"})
 
+    def test_batched_climate_sampling_matches_per_point_sampling(self) -> None:
+        class ClimateBandDatasets:
+            def point_on_land(self, lon: float, lat: float) -> bool:
+                return 0.0 <= lon <= 120.0
+
+            def point_in_lake(self, lon: float, lat: float) -> bool:
+                return False
+
+            def sample_elevation(self, lon: float, lat: float) -> float:
+                return 3500.0 if lon > 100.0 else 1500.0 if lon > 60.0 else 200.0
+
+            def sample_temperature(self, lon: float, lat: float) -> float | None:
+                return None if lon < -150.0 else 30.0 - abs(lat) * 0.6
+
+            def sample_precipitation(self, lon: float, lat: float) -> float:
+                return 200.0 + (30.0 * abs(lon)) % 2400.0
+
+        class BatchedClimateBandDatasets(ClimateBandDatasets):
+            def __init__(self) -> None:
+                super().__init__()
+                self.batch_calls = 0
+
+            def _batch(self, sample, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+                self.batch_calls += 1
+                values = [sample(lon, lat) for lon, lat in zip(lons, lats)]
+                return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+            def sample_elevation_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+                return self._batch(self.sample_elevation, lons, lats)
+
+            def sample_temperature_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+                return self._batch(self.sample_temperature, lons, lats)
+
+            def sample_precipitation_batch(self, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+                return self._batch(self.sample_precipitation, lons, lats)
+
+        topology = grid_topology(12, 24)
+        per_point = classify_tiles(topology, cache_dir=Path("."), alignment=EarthAlignment(), datasets=ClimateBandDatasets())  # type: ignore[arg-type]
+        datasets = BatchedClimateBandDatasets()
+        batched = classify_tiles(topology, cache_dir=Path("."), alignment=EarthAlignment(), datasets=datasets)  # type: ignore[arg-type]
+
+        self.assertEqual(3, datasets.batch_calls)
+        self.assertGreater(len({(t.base_terrain, tuple(t.features)) for t in per_point}), 4)
+        self.assertEqual(per_point, batched)
+
+    def test_coast_supersampling_only_resamples_coastline_tiles(self) -> None:
+        class InletDatasets:
+            def __init__(self) -> None:
+                self.land_queries = 0
+
+            def point_on_land(self, lon: float, lat: float) -> bool:
+                self.land_queries += 1
+                # Land east of -4.5, cut by a thin water inlet running through tile 1's center.
+                in_inlet = -4.5 <= lon <= -1.5 and abs(lat) < 0.05
+                return lon >= -4.5 and not in_inlet
+
+            def point_in_lake(self, lon: float, lat: float) -> bool:
+                return False
+
+            def sample_elevation(self, lon: float, lat: float) -> float:
+                return 100.0
+
+            def sample_temperature(self, lon: float, lat: float) -> float:
+                return 15.0
+
+            def sample_precipitation(self, lon: float, lat: float) -> float:
+                return 700.0
+
+        topology = TopologyDump(
+            frequency=1,
+            layout_id="IcosaNetV2",
+            tile_count=4,
+            ruleset="Civ V - Gods & Kings",
+            tiles=(
+                TopologyTile(0, 0, 0, 0.0, -6.0, (1,)),
+                TopologyTile(1, 1, 0, 0.0, -3.0, (0, 2)),
+                TopologyTile(2, 2, 0, 0.0, 0.0, (1, 3)),
+                TopologyTile(3, 3, 0, 0.0, 3.0, (2,)),
+            ),
+            edges=tuple(),
+            map_parameters_template={},
+        )
+
+        center_only = classify_tiles(
+            topology, cache_dir=Path("."), alignment=EarthAlignment(), datasets=InletDatasets()
+        )  # type: ignore[arg-type]
+        self.assertEqual(["Ocean", "Coast", "Plains", "Plains"], [t.base_terrain for t in center_only])
+
+        datasets = InletDatasets()
+        supersampled = classify_tiles(
+            topology,
+            cache_dir=Path("."),
+            alignment=EarthAlignment(),
+            datasets=datasets,
+            coast_supersample=8,
+        )  # type: ignore[arg-type]
+        self.assertEqual(["Coast", "Plains", "Plains", "Plains"], [t.base_terrain for t in supersampled])
+        # Four center samples plus eight sub-points for each of the two coastline tiles.
+        self.assertEqual(4 + 2 * 8, datasets.land_queries)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from collections import deque
+from pathlib import Path
+
+from tools.earthgen.tests.test_river_projection import river_grid_topology
+from tools.earthgen.topology_rings import build_k_ring_table, load_k_ring_table, load_or_build_k_ring_table
+
+
+def _bfs_rings(topology, start: int, max_k: int) -> list[list[int]]:
+    depth = {start: 0}
+    queue = deque([start])
+    while queue:
+        tile = queue.popleft()
+        if depth[tile] == max_k:
+            continue
+        for neighbor in topology.tiles[tile].neighbors:
+            if neighbor not in depth:
+                depth[neighbor] = depth[tile] + 1
+                queue.append(neighbor)
+    return [sorted(t for t, d in depth.items() if d == k) for k in range(1, max_k + 1)]
+
+
+class KRingTableTests(unittest.TestCase):
+    def test_rings_match_breadth_first_search(self) -> None:
+        topology = river_grid_topology(6, 9)
+        table = build_k_ring_table(topology, 3)
+        for tile in range(topology.tile_count):
+            expected = _bfs_rings(topology, tile, 3)
+            self.assertEqual([table.ring(tile, k).tolist() for k in (1, 2, 3)], expected)
+            self.assertEqual(sorted(table.within(tile, 2).tolist()), sorted(expected[0] + expected[1]))
+        self.assertEqual(table.within(0, 0).tolist(), [])
+        with self.assertRaises(ValueError):
+            table.within(0, 4)
+
+    def test_disk_cache_is_keyed_by_topology_and_k(self) -> None:
+        topology = river_grid_topology(4, 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rings.npz"
+            built = load_or_build_k_ring_table(topology, 2, cache_path=path)
+            cached = load_k_ring_table(path, topology, 1)
+            self.assertIsNotNone(cached)
+            self.assertEqual(cached.ring_tiles.tolist(), built.ring_tiles.tolist())
+            self.assertIsNone(load_k_ring_table(path, topology, 3))
+            self.assertIsNone(load_k_ring_table(path, river_grid_topology(5, 4), 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import json
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
 from typing import Dict, List, Any, Tuple
 
+import numpy as np
 
 ALLOWED_RIVER_FIELDS = {"hasBottomRiver", "hasBottomLeftRiver", "hasBottomRightRiver"}
 DEFAULT_LAYOUT_ID = "IcosaNetV2"
@@ -45,6 +48,17 @@ class TopologyDump:
     edges: Tuple[TopologyEdge, ...]
     map_parameters_template: Dict[str, Any]
 
+    @cached_property
+    def fingerprint(self) -> str:
+        """Stable hash of the tile graph and river writers, used to key caches across runs."""
+        digest = hashlib.sha256()
+        digest.update(f"{self.layout_id}:{self.frequency}:{self.tile_count}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(neighbor_matrix(self), dtype="<i8").tobytes())
+        for edge in self.edges:
+            writer = "" if edge.writer is None else f"{edge.writer.tile_index}/{edge.writer.field}"
+            digest.update(f"|{edge.a},{edge.b},{int(edge.representable)},{writer}".encode("utf-8"))
+        return digest.hexdigest()
+
 
 def load_topology_dump(path: Path) -> TopologyDump:
     data = json.loads(path.read_text(encoding="utf-8"))
@@ -177,3 +191,38 @@ def build_edge_writer_index_from_dump(dump: TopologyDump) -> Dict[Tuple[int, int
         pair = (edge.a, edge.b) if edge.a < edge.b else (edge.b, edge.a)
         mapping[pair] = (edge.writer.tile_index, edge.writer.field)
     return mapping
+
+
+def neighbor_matrix(dump: TopologyDump) -> np.ndarray:
+    """Return a (tileCount, maxDegree) neighbor index matrix padded with -1."""
+    width = max((len(tile.neighbors) for tile in dump.tiles), default=0)
+    matrix = np.full((dump.tile_count, width), -1, dtype=np.int64)
+    for tile in dump.tiles:
+        matrix[tile.index, : len(tile.neighbors)] = tile.neighbors
+    return matrix
+
+
+def topology_fingerprint(dump: TopologyDump) -> str:
+    """Return the dump's cache key; it is hashed once per dump and then reused."""
+    return dump.fingerprint
+
+
+def neighbor_csr(dump: TopologyDump) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (indptr, indices) so tile i's neighbors are indices[indptr[i]:indptr[i + 1]]."""
+    degrees = np.zeros(dump.tile_count + 1, dtype=np.int64)
+    for tile in dump.tiles:
+        degrees[tile.index + 1] = len(tile.neighbors)
+    indptr = np.cumsum(degrees)
+    indices = np.empty(int(indptr[-1]), dtype=np.int64)
+    for tile in dump.tiles:
+        indices[indptr[tile.index] : indptr[tile.index + 1]] = tile.neighbors
+    return indptr, indices
+
+
+def csr_gather(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Concatenate the CSR neighbor lists of `rows`, in row order."""
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(int(lengths.sum()), dtype=np.int64)]
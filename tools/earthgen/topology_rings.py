@@ -0,0 +1,111 @@
+"""Per-tile k-ring neighborhoods ("tiles exactly k hops away") for k = 1..K, in CSR form."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from tools.earthgen.topology_io import TopologyDump, csr_gather, neighbor_csr, topology_fingerprint
+
+K_RING_CACHE_VERSION = 1
+
+
+@dataclass(frozen=True, eq=False)
+class KRingTable:
+    """Ring k of tile t is ring_tiles[ring_ptr[t, k - 1] : ring_ptr[t, k]], sorted by tile index.
+
+    Rows are laid out back to back, so ring_ptr[t, K] == ring_ptr[t + 1, 0] and the tiles
+    within 1..k hops of t form one contiguous slice.
+    """
+
+    max_k: int
+    ring_ptr: np.ndarray
+    ring_tiles: np.ndarray
+
+    def ring(self, tile: int, k: int) -> np.ndarray:
+        if not 1 <= k <= self.max_k:
+            raise ValueError(f"Ring {k} outside table range 1..{self.max_k}")
+        return self.ring_tiles[self.ring_ptr[tile, k - 1] : self.ring_ptr[tile, k]]
+
+    def within(self, tile: int, k: int) -> np.ndarray:
+        """Tiles within `k` hops of `tile`, excluding the tile itself."""
+        if k > self.max_k:
+            raise ValueError(f"Distance {k} exceeds table range {self.max_k}")
+        if k <= 0:
+            return self.ring_tiles[:0]
+        return self.ring_tiles[self.ring_ptr[tile, 0] : self.ring_ptr[tile, k]]
+
+
+def build_k_ring_table(topology: TopologyDump, max_k: int) -> KRingTable:
+    """Expand every tile's ring frontier at once, as sorted (source, tile) keys.
+
+    On an undirected graph the neighbors of ring k lie in rings k - 1, k and k + 1,
+    so each step only has to drop the previous two rings.
+    """
+    count = topology.tile_count
+    indptr, indices = neighbor_csr(topology)
+    sources = np.arange(count, dtype=np.int64)
+
+    previous = sources * count + sources
+    current = previous
+    rings = []
+    for _ in range(max(max_k, 0)):
+        frontier_sources, frontier_tiles = np.divmod(current, count)
+        degrees = indptr[frontier_tiles + 1] - indptr[frontier_tiles]
+        neighbors = csr_gather(indptr, indices, frontier_tiles)
+        keys = np.unique(np.repeat(frontier_sources, degrees) * count + neighbors)
+        keys = keys[~np.isin(keys, current, assume_unique=True) & ~np.isin(keys, previous, assume_unique=True)]
+        rings.append(keys)
+        previous, current = current, keys
+
+    ring_counts = np.zeros((count, max(max_k, 0) + 1), dtype=np.int64)
+    for k, keys in enumerate(rings, start=1):
+        ring_counts[:, k] = np.bincount(keys // count, minlength=count)
+    ring_ptr = np.cumsum(ring_counts.reshape(-1)).reshape(count, -1)
+
+    if rings:
+        keys = np.concatenate(rings)
+        ring_index = np.repeat(np.arange(len(rings)), [len(r) for r in rings])
+        keys = keys[np.lexsort((keys % count, ring_index, keys // count))]
+        ring_tiles = keys % count
+    else:
+        ring_tiles = np.empty(0, dtype=np.int64)
+    return KRingTable(max_k=max(max_k, 0), ring_ptr=ring_ptr, ring_tiles=ring_tiles)
+
+
+def save_k_ring_table(path: Path, table: KRingTable, topology: TopologyDump) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as handle:
+        np.savez_compressed(
+            handle,
+            version=np.int64(K_RING_CACHE_VERSION),
+            topology=np.array(topology_fingerprint(topology)),
+            max_k=np.int64(table.max_k),
+            ring_ptr=table.ring_ptr,
+            ring_tiles=table.ring_tiles,
+        )
+
+
+def load_k_ring_table(path: Path, topology: TopologyDump, max_k: int) -> KRingTable | None:
+    """Return the cached table if it matches the topology and covers `max_k` rings."""
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        if int(data["version"]) != K_RING_CACHE_VERSION or str(data["topology"]) != topology_fingerprint(topology):
+            return None
+        if int(data["max_k"]) < max_k:
+            return None
+        return KRingTable(max_k=int(data["max_k"]), ring_ptr=data["ring_ptr"], ring_tiles=data["ring_tiles"])
+
+
+def load_or_build_k_ring_table(topology: TopologyDump, max_k: int, cache_path: Path | None = None) -> KRingTable:
+    if cache_path is not None:
+        cached = load_k_ring_table(cache_path, topology, max_k)
+        if cached is not None:
+            return cached
+    table = build_k_ring_table(topology, max_k)
+    if cache_path is not None:
+        save_k_ring_table(cache_path, table, topology)
+    return table